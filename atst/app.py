@@ -23,6 +23,7 @@ from atst.routes.ccpo import bp as ccpo_routes
 from atst.domain.authnid.crl import CRLCache, NoOpCRLCache
 from atst.domain.auth import apply_authentication
 from atst.domain.authz import Authorization
+from atst.domain.cost_exports import CostExportReportingProvider
 from atst.domain.csp import make_csp_provider
 from atst.domain.portfolios import Portfolios
 from atst.models.permissions import Permissions
@@ -66,6 +67,8 @@ def make_app(config):
     register_filters(app)
     register_jinja_globals(app)
     make_csp_provider(app, config.get("CSP", "mock"))
+    if config.get("SPEND_DATA_SOURCE") == "cost_exports":
+        app.csp.reports = CostExportReportingProvider()
     make_crl_validator(app)
     make_mailer(app)
     make_notification_sender(app)
@@ -166,6 +169,9 @@ def map_config(config):
         "SQLALCHEMY_TRACK_MODIFICATIONS": False,
         "SQLALCHEMY_ENGINE_OPTIONS": {
             "json_serializer": sqlalchemy_dumps,
+            # send executemany inserts as one multi-row INSERT and other
+            # executemany statements in batches
+            "executemany_mode": "values",
             "connect_args": {
                 "sslmode": config["default"]["PGSSLMODE"],
                 "sslrootcert": config["default"]["PGSSLROOTCERT"],
@@ -176,6 +182,7 @@ def map_config(config):
             "default", "PERMANENT_SESSION_LIFETIME"
         ),
         "DISABLE_CRL_CHECK": config.getboolean("default", "DISABLE_CRL_CHECK"),
+        "ENQUEUE_ON_COMMIT": config.getboolean("default", "ENQUEUE_ON_COMMIT"),
         "CRL_FAIL_OPEN": config.getboolean("default", "CRL_FAIL_OPEN"),
         "LOG_JSON": config.getboolean("default", "LOG_JSON"),
         "LIMIT_CONCURRENT_SESSIONS": config.getboolean(
@@ -1,6 +1,8 @@
+from collections import defaultdict
 from flask import g
+import pendulum
 from sqlalchemy import func, or_
-from typing import List
+from typing import Dict, List
 from uuid import UUID
 
 from . import BaseDomainClass
@@ -18,8 +20,13 @@ from atst.models import (
     PortfolioStateMachine,
 )
 from atst.models.mixins.state_machines import FSMStates
+from atst.queue import enqueue_after_commit
 from atst.utils import first_or_none, commit_or_raise_already_exists_error
 
+# How long past its `poll_after` time a pending management group creation may
+# go unpolled before the dispatcher assumes the polling task was lost.
+OPERATION_POLL_GRACE = pendulum.duration(minutes=5)
+
 
 class Applications(BaseDomainClass):
     model = Application
@@ -35,6 +42,9 @@ class Applications(BaseDomainClass):
         if environment_names:
             Environments.create_many(user, application, environment_names)
 
+        enqueue_after_commit(
+            "atst.jobs.dispatch_create_application", application_id=application
+        )
         commit_or_raise_already_exists_error(message="application")
         return application
 
@@ -127,9 +137,18 @@ class Applications(BaseDomainClass):
         return invitation
 
     @classmethod
-    def get_applications_pending_creation(cls) -> List[UUID]:
-        results = (
-            db.session.query(Application.id)
+    def _pending_creation(cls, application_id=None):
+        """
+        Applications whose management group has not been created yet, as
+        (id, portfolio_id) rows. While a creation is under way its `csp_data`
+        records when to poll it next (`poll_after`); those applications are
+        left to the task polling them unless the poll is more than
+        OPERATION_POLL_GRACE overdue.
+        """
+        query = (
+            db.session.query(
+                Application.id, Application.portfolio_id, Application.csp_data
+            )
             .join(Portfolio)
             .join(PortfolioStateMachine)
             .filter(PortfolioStateMachine.state == FSMStates.COMPLETED)
@@ -141,5 +160,28 @@ class Applications(BaseDomainClass):
                     Application.claimed_until <= func.now(),
                 )
             )
-        ).all()
-        return [id_ for id_, in results]
+        )
+        if application_id is not None:
+            query = query.filter(Application.id == application_id)
+
+        overdue = pendulum.now() - OPERATION_POLL_GRACE
+        return [
+            (id_, portfolio_id)
+            for id_, portfolio_id, csp_data in query.all()
+            if not (csp_data or {}).get("poll_after")
+            or pendulum.parse(csp_data["poll_after"]) < overdue
+        ]
+
+    @classmethod
+    def get_applications_pending_creation(cls, application_id=None) -> List[UUID]:
+        return [id_ for id_, _ in cls._pending_creation(application_id)]
+
+    @classmethod
+    def get_applications_pending_creation_by_portfolio(
+        cls, application_id=None
+    ) -> Dict[UUID, List[UUID]]:
+        pending = defaultdict(list)
+        for id_, portfolio_id in cls._pending_creation(application_id):
+            pending[portfolio_id].append(id_)
+
+        return dict(pending)
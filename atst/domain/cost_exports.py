@@ -0,0 +1,206 @@
+import csv
+import json
+from collections import namedtuple
+from decimal import Decimal
+
+from flask import current_app as app
+import pendulum
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+
+from atst.database import db
+from atst.domain.csp.reports import ColumnarReportingProvider
+from atst.domain.csp.spend_store import ColumnarSpendStore, SpendRecord
+from atst.domain.reports import ReportCache
+from atst.models import Application, DailySpend, Environment, JEDICLINType
+
+
+IngestionResult = namedtuple("IngestionResult", ["rows", "skipped"])
+
+# Column of the cost export each field is read from. Costs are attributed to
+# an environment by its cloud_id and to a JEDI CLIN, e.g. through the tags
+# applied to the environment's resources.
+EXPORT_COLUMNS = {
+    "date": "Date",
+    "environment": "EnvironmentId",
+    "clin": "JEDICLIN",
+    "cost": "CostInBillingCurrency",
+}
+
+
+class CostExports(object):
+    """
+    Spend data imported from CSP cost exports, stored as daily totals per
+    environment and JEDI CLIN in `DailySpend`.
+    """
+
+    FORMATS = ("csv", "jsonl")
+
+    @classmethod
+    def ingest(
+        cls, export, period_start, period_end, format="csv", columns=EXPORT_COLUMNS
+    ):
+        """
+        Load a cost export covering `period_start` to `period_end` (inclusive)
+        from the text file object `export`. Spend already recorded for the
+        period is replaced for the environments that appear in the export,
+        so ingesting an export again is idempotent and exports covering
+        other environments (e.g. other tenants) are left alone.
+
+        The export is read one row at a time. Daily totals are accumulated
+        and upserted with multi-row inserts of at most
+        `COST_EXPORT_BATCH_SIZE` rows, so memory use does not depend on the
+        size of the export. Rows outside the period, or for unknown
+        environments or CLINs, are skipped; a row that cannot be parsed
+        aborts the ingestion and nothing is written.
+        """
+        if format not in cls.FORMATS:
+            raise ValueError("Unknown cost export format {}".format(format))
+
+        batch_size = int(app.config.get("COST_EXPORT_BATCH_SIZE", 1000))
+        environments = dict(
+            db.session.query(Environment.cloud_id, Environment.id).filter(
+                Environment.cloud_id.isnot(None)
+            )
+        )
+
+        rows = skipped = 0
+        batch = {}
+        # environments whose previously recorded spend has been deleted, and
+        # those to delete before the next batch is written
+        replaced = set()
+        to_replace = set()
+        try:
+            for row in cls._read(export, format):
+                rows += 1
+                date = pendulum.parse(row[columns["date"]], strict=False).date()
+                environment_id = environments.get(row[columns["environment"]])
+                clin = row[columns["clin"]]
+                if (
+                    environment_id is None
+                    or clin not in JEDICLINType.__members__
+                    or not period_start <= date <= period_end
+                ):
+                    skipped += 1
+                    continue
+
+                if environment_id not in replaced:
+                    replaced.add(environment_id)
+                    to_replace.add(environment_id)
+
+                key = (environment_id, clin, date)
+                batch[key] = batch.get(key, 0) + Decimal(str(row[columns["cost"]]))
+                if len(batch) >= batch_size:
+                    cls._delete(to_replace, period_start, period_end)
+                    cls._upsert(batch)
+                    batch = {}
+                    to_replace = set()
+
+            cls._delete(to_replace, period_start, period_end)
+            cls._upsert(batch)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        ReportCache.from_app().invalidate()
+
+        return IngestionResult(rows=rows, skipped=skipped)
+
+    @classmethod
+    def spend_records(cls, portfolio, as_of=None):
+        """
+        Yield the portfolio's spend as SpendRecords for the "this_month",
+        "last_month" and "total" periods used by the reporting providers.
+        """
+        this_month = (as_of or pendulum.today()).start_of("month")
+        last_month = this_month.subtract(months=1)
+
+        rows = (
+            db.session.query(
+                Application.name,
+                Environment.name,
+                DailySpend.jedi_clin_type,
+                func.sum(DailySpend.amount).filter(DailySpend.date >= this_month),
+                func.sum(DailySpend.amount).filter(
+                    DailySpend.date >= last_month, DailySpend.date < this_month
+                ),
+                func.sum(DailySpend.amount),
+            )
+            .join(Environment, DailySpend.environment_id == Environment.id)
+            .join(Application, Environment.application_id == Application.id)
+            .filter(Application.portfolio_id == portfolio.id)
+            .group_by(Application.name, Environment.name, DailySpend.jedi_clin_type)
+        )
+
+        for application, environment, clin, *amounts in rows:
+            for period, amount in zip(
+                ColumnarReportingProvider.MONTHLY_PERIODS, amounts
+            ):
+                if amount is not None:
+                    yield SpendRecord(
+                        portfolio.name,
+                        application,
+                        environment,
+                        clin.name,
+                        period,
+                        amount,
+                    )
+
+    @classmethod
+    def _read(cls, export, format):
+        if format == "csv":
+            yield from csv.DictReader(export)
+        else:
+            for line in export:
+                if line.strip():
+                    yield json.loads(line)
+
+    @classmethod
+    def _delete(cls, environment_ids, period_start, period_end):
+        if not environment_ids:
+            return
+
+        db.session.query(DailySpend).filter(
+            DailySpend.environment_id.in_(environment_ids),
+            DailySpend.date.between(period_start, period_end),
+        ).delete(synchronize_session=False)
+
+    @classmethod
+    def _upsert(cls, batch):
+        if not batch:
+            return
+
+        table = DailySpend.__table__
+        statement = insert(table).values(
+            [
+                {
+                    "environment_id": environment_id,
+                    "jedi_clin_type": JEDICLINType[clin],
+                    "date": date,
+                    "amount": amount,
+                }
+                for (environment_id, clin, date), amount in batch.items()
+            ]
+        )
+        db.session.execute(
+            statement.on_conflict_do_update(
+                constraint="daily_spend_environment_id_jedi_clin_type_date_key",
+                set_={
+                    "amount": table.c.amount + statement.excluded.amount,
+                    "time_updated": func.now(),
+                },
+            )
+        )
+
+
+class CostExportReportingProvider(ColumnarReportingProvider):
+    """
+    Reporting provider that reads the spend ingested by CostExports.
+    """
+
+    def __init__(self):
+        super().__init__(None)
+
+    def store_for(self, portfolio):
+        return ColumnarSpendStore(CostExports.spend_records(portfolio))
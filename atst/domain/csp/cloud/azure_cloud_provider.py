@@ -1,14 +1,26 @@
+from concurrent.futures import ThreadPoolExecutor
 import json
 import re
+from importlib import import_module
 from secrets import token_urlsafe
-from typing import Dict
+from typing import Dict, List
 from uuid import uuid4
 
+from flask import current_app as app, has_app_context
+
 from .cloud_provider_interface import CloudProviderInterface
-from .exceptions import AuthenticationException
+from .credential_cache import CredentialCache
+from .exceptions import (
+    AuthenticationException,
+    GeneralCSPException,
+    UnknownServerException,
+)
 from .models import (
+    AZURE_MGMNT_PATH,
     ApplicationCSPPayload,
     ApplicationCSPResult,
+    ApplicationOperationCSPResult,
+    ApplicationVerificationCSPPayload,
     BillingInstructionCSPPayload,
     BillingInstructionCSPResult,
     BillingProfileCreationCSPPayload,
@@ -19,6 +31,7 @@ from .models import (
     BillingProfileVerificationCSPResult,
     KeyVaultCredentials,
     ManagementGroupCSPResponse,
+    PortfolioPoliciesCSPPayload,
     TaskOrderBillingCreationCSPPayload,
     TaskOrderBillingCreationCSPResult,
     TaskOrderBillingVerificationCSPPayload,
@@ -27,6 +40,8 @@ from .models import (
     TenantCSPResult,
 )
 from .policy import AzurePolicyManager
+from .polling import DeferredPolling
+from .secret_cache import SecretCache
 from atst.utils import sha256_hex
 
 AZURE_ENVIRONMENT = "AZURE_PUBLIC_CLOUD"  # TBD
@@ -42,32 +57,45 @@ AZURE_MANAGEMENT_API = "https://management.azure.com"
 
 
 class AzureSDKProvider(object):
-    def __init__(self):
-        from azure.mgmt import subscription, authorization, managementgroups
-        from azure.mgmt.resource import policy
-        import azure.graphrbac as graphrbac
-        import azure.common.credentials as credentials
-        import azure.identity as identity
-        from azure.keyvault import secrets
-        from azure.core import exceptions
-
-        from msrestazure.azure_cloud import AZURE_PUBLIC_CLOUD
-        import adal
-        import requests
-
-        self.subscription = subscription
-        self.policy = policy
-        self.managementgroups = managementgroups
-        self.authorization = authorization
-        self.adal = adal
-        self.graphrbac = graphrbac
-        self.credentials = credentials
-        self.identity = identity
-        self.exceptions = exceptions
-        self.secrets = secrets
-        self.requests = requests
+    """
+    Exposes the Azure SDK modules used by AzureCloudProvider. Each module is
+    imported the first time it is accessed, so processes that construct the
+    provider only pay the import cost for the services they actually call.
+    """
+
+    # attribute name -> (module, attribute of that module or None)
+    MODULES = {
+        "subscription": ("azure.mgmt.subscription", None),
+        "authorization": ("azure.mgmt.authorization", None),
+        "managementgroups": ("azure.mgmt.managementgroups", None),
+        "policy": ("azure.mgmt.resource.policy", None),
+        "graphrbac": ("azure.graphrbac", None),
+        "credentials": ("azure.common.credentials", None),
+        "identity": ("azure.identity", None),
+        "secrets": ("azure.keyvault.secrets", None),
+        "exceptions": ("azure.core.exceptions", None),
+        "adal": ("adal", None),
         # may change to a JEDI cloud
-        self.cloud = AZURE_PUBLIC_CLOUD
+        "cloud": ("msrestazure.azure_cloud", "AZURE_PUBLIC_CLOUD"),
+    }
+
+    def __getattr__(self, name):
+        if name == "requests":
+            import requests
+
+            # a shared session keeps HTTP connections to the Azure APIs pooled
+            value = requests.Session()
+        elif name in self.MODULES:
+            module_name, attr = self.MODULES[name]
+            value = import_module(module_name)
+            if attr is not None:
+                value = getattr(value, attr)
+        else:
+            raise AttributeError(name)
+
+        # cache on the instance so __getattr__ is not consulted again
+        setattr(self, name, value)
+        return value
 
 
 class AzureCloudProvider(CloudProviderInterface):
@@ -85,28 +113,63 @@ class AzureCloudProvider(CloudProviderInterface):
             self.sdk = azure_sdk_provider
 
         self.policy_manager = AzurePolicyManager(config["AZURE_POLICY_LOCATION"])
+        # upper bound on concurrent requests made by the bulk provisioning calls
+        self.provisioning_concurrency = int(
+            config.get("AZURE_PROVISIONING_CONCURRENCY", 8)
+        )
+
+        # Credential objects, SDK clients and access tokens are kept for the
+        # lifetime of the provider (one per worker process) instead of being
+        # rebuilt per call; tokens are refreshed shortly before they expire.
+        # Each cache keeps the most recently used AZURE_CREDENTIAL_CACHE_SIZE
+        # entries.
+        cache_size = int(config.get("AZURE_CREDENTIAL_CACHE_SIZE", 256))
+        self._credentials = CredentialCache(max_entries=cache_size)
+        self._clients = CredentialCache(max_entries=cache_size)
+        self._tokens = CredentialCache(max_entries=cache_size)
+        # Tenant credentials read from KeyVault, encrypted while cached.
+        self._secrets = SecretCache(ttl=int(config.get("AZURE_SECRET_CACHE_TTL", 300)))
 
     def set_secret(self, secret_key, secret_value):
         credential = self._get_client_secret_credential_obj({})
-        secret_client = self.sdk.secrets.SecretClient(
-            vault_url=self.vault_url, credential=credential,
+        secret_client = self._get_client(
+            self.sdk.secrets.SecretClient,
+            vault_url=self.vault_url,
+            credential=credential,
         )
         try:
-            return secret_client.set_secret(secret_key, secret_value)
-        except self.exceptions.HttpResponseError:
+            result = secret_client.set_secret(secret_key, secret_value)
+        except self.sdk.exceptions.HttpResponseError:
+            # the vault may or may not hold the new value now
+            self._secrets.invalidate(secret_key)
             app.logger.error(
                 f"Could not SET secret in Azure keyvault for key {secret_key}.",
                 exc_info=1,
             )
+        else:
+            self._secrets.set(secret_key, secret_value)
+            return result
 
     def get_secret(self, secret_key):
+        return self._secrets.get(secret_key, lambda: self._fetch_secret(secret_key))
+
+    def invalidate_secret(self, secret_key=None):
+        """
+        Drop a cached secret, or every cached secret when no key is given, so
+        the next read goes to KeyVault.
+        """
+        self._secrets.invalidate(secret_key)
+
+    def _fetch_secret(self, secret_key):
         credential = self._get_client_secret_credential_obj({})
-        secret_client = self.sdk.secrets.SecretClient(
-            vault_url=self.vault_url, credential=credential,
+        secret_client = self._get_client(
+            self.sdk.secrets.SecretClient,
+            vault_url=self.vault_url,
+            credential=credential,
         )
         try:
             return secret_client.get_secret(secret_key).value
-        except self.exceptions.HttpResponseError:
+        except self.sdk.exceptions.HttpResponseError:
             app.logger.error(
                 f"Could not GET secret in Azure keyvault for key {secret_key}.",
                 exc_info=1,
@@ -137,12 +200,15 @@ class AzureCloudProvider(CloudProviderInterface):
         root_creds = self._root_creds
         credentials = self._get_credential_obj(root_creds)
 
-        sub_client = self.sdk.subscription.SubscriptionClient(credentials)
+        sub_client = self._get_client(
+            self.sdk.subscription.SubscriptionClient, credentials
+        )
         subscription = sub_client.subscriptions.get(csp_environment_id)
 
         managment_principal = self._get_management_service_principal()
 
-        auth_client = self.sdk.authorization.AuthorizationManagementClient(
+        auth_client = self._get_client(
+            self.sdk.authorization.AuthorizationManagementClient,
             credentials,
             # TODO: Determine which subscription this needs to point at
             # Once we're in a multi-sub environment
@@ -184,14 +250,127 @@ class AzureCloudProvider(CloudProviderInterface):
             payload.management_group_name,
             payload.display_name,
             payload.parent_id,
+            wait=False,
         )
 
-        return ApplicationCSPResult(**response)
+        if response.status() == DeferredPolling.ACCEPTED:
+            return ApplicationOperationCSPResult.from_headers(response.result())
+
+        return ApplicationCSPResult(**response.result())
+
+    def create_applications(self, payloads: List[ApplicationCSPPayload]):
+        """
+        Create several management groups at once, making at most
+        `provisioning_concurrency` requests at a time.
+
+        Returns one entry per payload, in the order given: whatever
+        `create_application` returned for it, or the exception it raised.
+        """
+        return self._map_concurrently(self.create_application, payloads)
+
+    def create_portfolio_policies(self, payload: PortfolioPoliciesCSPPayload):
+        """
+        Define every portfolio-level policy on the portfolio's management
+        group and assign it there, making at most `provisioning_concurrency`
+        requests at a time.
+
+        Returns one entry per policy in `policy_manager.portfolio_definitions`:
+        the PolicyAssignment created for it, or the exception raised while
+        defining or assigning it.
+        """
+        creds = self._source_creds(payload.tenant_id)
+        credentials = self._get_credential_obj(
+            {
+                "client_id": creds.root_sp_client_id,
+                "secret_key": creds.root_sp_key,
+                "tenant_id": creds.root_tenant_id,
+            },
+            resource=AZURE_MANAGEMENT_API,
+        )
+
+        def create_policy(policy):
+            definition = self._create_policy_definition(
+                credentials,
+                payload.subscription_id,
+                payload.management_group_id,
+                policy.definition["properties"],
+            )
+            return self._create_policy_assignment(
+                credentials,
+                payload.subscription_id,
+                payload.management_group_id,
+                definition,
+                policy.parameters,
+            )
+
+        return self._map_concurrently(
+            create_policy, self.policy_manager.portfolio_definitions
+        )
+
+    def _map_concurrently(self, fn, items):
+        """
+        Call `fn` on every item from a bounded thread pool. CSP exceptions
+        are returned in place of the item's result so that one failure does
+        not hide the outcome of the others; anything else is a bug and is
+        raised.
+        """
+        flask_app = app._get_current_object() if has_app_context() else None
+
+        def call(item):
+            try:
+                if flask_app is None:
+                    return fn(item)
+                with flask_app.app_context():
+                    return fn(item)
+            except GeneralCSPException as exc:
+                return exc
+
+        with ThreadPoolExecutor(max_workers=self.provisioning_concurrency) as pool:
+            return list(pool.map(call, items))
+
+    def create_application_verification(
+        self, payload: ApplicationVerificationCSPPayload
+    ):
+        creds = self._source_creds(payload.tenant_id)
+        sp_token = self._get_sp_token(
+            {
+                "home_tenant_id": creds.root_tenant_id,
+                "client_id": creds.root_sp_client_id,
+                "secret_key": creds.root_sp_key,
+            }
+        )
+        if sp_token is None:
+            raise AuthenticationException(
+                "Could not resolve token for management group verification"
+            )
+
+        auth_header = {
+            "Authorization": f"Bearer {sp_token}",
+        }
+
+        result = self.sdk.requests.get(payload.operation_url, headers=auth_header)
+
+        if result.status_code == 202:
+            # 202 has location/retry after headers
+            return ApplicationOperationCSPResult.from_headers(
+                result.headers, operation_url=payload.operation_url
+            )
+        elif result.status_code == 200:
+            return ApplicationCSPResult(**result.json())
+        else:
+            raise UnknownServerException(result.text)
 
     def _create_management_group(
-        self, credentials, management_group_id, display_name, parent_id=None,
+        self, credentials, management_group_id, display_name, parent_id=None, wait=True,
     ):
-        mgmgt_group_client = self.sdk.managementgroups.ManagementGroupsAPI(credentials)
+        """
+        With `wait=False`, return the poller as soon as Azure accepts the
+        request; its status is DeferredPolling.ACCEPTED while the management
+        group is still being created.
+        """
+        mgmgt_group_client = self._get_client(
+            self.sdk.managementgroups.ManagementGroupsAPI, credentials
+        )
         create_parent_grp_info = self.sdk.managementgroups.models.CreateParentGroupInfo(
             id=parent_id
         )
@@ -203,6 +382,11 @@ class AzureCloudProvider(CloudProviderInterface):
             display_name=display_name,
             details=create_mgmt_grp_details,
         )
+        if not wait:
+            return mgmgt_group_client.management_groups.create_or_update(
+                management_group_id, mgmt_grp_create, polling=DeferredPolling()
+            )
+
         create_request = mgmgt_group_client.management_groups.create_or_update(
             management_group_id, mgmt_grp_create
         )
@@ -224,7 +408,9 @@ class AzureCloudProvider(CloudProviderInterface):
         billing_account_name,
         invoice_section_name,
     ):
-        sub_client = self.sdk.subscription.SubscriptionClient(credentials)
+        sub_client = self._get_client(
+            self.sdk.subscription.SubscriptionClient, credentials
+        )
 
         billing_profile_id = "?"  # where do we source this?
         sku_id = AZURE_SKU_ID
@@ -247,6 +433,9 @@ class AzureCloudProvider(CloudProviderInterface):
 
         # the resulting object from this process is a link to the new subscription
         # not a subscription model, so we'll have to unpack the ID
+        # TODO: this still waits for the subscription to be created. Move it
+        # onto DeferredPolling and a verification step, like create_application,
+        # once something calls it with a real billing profile and invoice section.
         new_sub = sub_creation_operation.result()
 
         subscription_id = self._extract_subscription_id(new_sub.subscription_link)
@@ -281,7 +470,9 @@ class AzureCloudProvider(CloudProviderInterface):
             TBD
         """
         # TODO: which subscription would this be?
-        client = self.sdk.policy.PolicyClient(credentials, subscription_id)
+        client = self._get_client(
+            self.sdk.policy.PolicyClient, credentials, subscription_id
+        )
 
         definition = client.policy_definitions.models.PolicyDefinition(
             policy_type=properties.get("policyType"),
@@ -300,6 +491,42 @@ class AzureCloudProvider(CloudProviderInterface):
             management_group_id=management_group_id,
         )
 
+    def _create_policy_assignment(
+        self, credentials, subscription_id, management_group_id, definition, parameters
+    ):
+        """
+        Assign a policy definition, with the given parameter values, at the
+        scope of a management group.
+
+        Arguments:
+            credentials -- ServicePrincipalCredentials
+            subscription_id -- str, ID of the subscription (just the UUID, not the path)
+            management_group_id -- str, ID of the management group (just the UUID, not the path)
+            definition -- PolicyDefinition, as returned by _create_policy_definition
+            parameters -- dictionary, the values for the definition's parameters
+
+        Returns:
+            azure.mgmt.resource.policy.[api version].models.PolicyAssignment: the PolicyAssignment created in Azure
+        """
+        client = self._get_client(
+            self.sdk.policy.PolicyClient, credentials, subscription_id
+        )
+
+        assignment = client.policy_assignments.models.PolicyAssignment(
+            display_name=definition.display_name,
+            policy_definition_id=definition.id,
+            parameters=parameters,
+        )
+
+        # assignment names are limited to 24 characters at management group scope
+        name = sha256_hex(f"{management_group_id}/{definition.name}")[:24]
+
+        return client.policy_assignments.create(
+            scope=f"{AZURE_MGMNT_PATH}{management_group_id}",
+            policy_assignment_name=name,
+            parameters=assignment,
+        )
+
     def create_tenant(self, payload: TenantCSPPayload):
         sp_token = self._get_sp_token(payload.creds)
         if sp_token is None:
@@ -539,8 +766,10 @@ class AzureCloudProvider(CloudProviderInterface):
 
         # how do we scope the graph client to the new subscription rather than
         # the cloud0 subscription? tenant id seems to be separate from subscription id
-        graph_client = self.sdk.graphrbac.GraphRbacManagementClient(
-            graph_creds, self._root_creds.get("tenant_id")
+        graph_client = self._get_client(
+            self.sdk.graphrbac.GraphRbacManagementClient,
+            graph_creds,
+            self._root_creds.get("tenant_id"),
         )
 
         # do we need to create a new application to manage each subscripition
@@ -586,31 +815,102 @@ class AzureCloudProvider(CloudProviderInterface):
         authentication_endpoint = "https://login.microsoftonline.com/"
         resource = "https://management.azure.com/"
 
-        context = self.sdk.adal.AuthenticationContext(
-            authentication_endpoint + home_tenant_id
-        )
+        def acquire_token():
+            context = self.sdk.adal.AuthenticationContext(
+                authentication_endpoint + home_tenant_id
+            )
+
+            # TODO: handle failure states here
+            token_response = context.acquire_token_with_client_credentials(
+                resource, client_id, secret_key
+            )
 
-        # TODO: handle failure states here
-        token_response = context.acquire_token_with_client_credentials(
-            resource, client_id, secret_key
+            return (
+                token_response.get("accessToken", None),
+                self._token_lifetime(token_response),
+            )
+
+        return self._tokens.get_expiring(
+            self._credential_key(
+                "token", home_tenant_id, client_id, secret_key, resource
+            ),
+            acquire_token,
         )
 
-        return token_response.get("accessToken", None)
+    def _token_lifetime(self, token_response):
+        """
+        Number of seconds the token in an ADAL response is valid for. Responses
+        without a token or a usable lifetime are not reused.
+        """
+        if token_response.get("accessToken", None) is None:
+            return 0
+
+        try:
+            return float(token_response.get("expiresIn"))
+        except (TypeError, ValueError):
+            return 0
+
+    def _get_client(self, client_cls, *args, **kwargs):
+        """
+        Return an SDK client for the given arguments, constructing it on first
+        use. Credential objects are cached too, so the same credentials always
+        map to the same client while both are among the most recently used.
+        """
+        key = (client_cls, args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            return client_cls(*args, **kwargs)
+
+        return self._clients.get(key, lambda: client_cls(*args, **kwargs))
+
+    def _get_cached_credential(self, key, factory):
+        return self._credentials.get(key, factory)
+
+    def _credential_key(self, kind, tenant_id, client_id, secret, *extra):
+        """
+        Cache key for credentials: a hash, so that secrets are not kept in
+        the caches' keys, and one that changes when a secret is rotated.
+        """
+        return sha256_hex(
+            "\n".join(
+                str(part) for part in (kind, tenant_id, client_id, secret, *extra)
+            )
+        )
 
     def _get_credential_obj(self, creds, resource=None):
-        return self.sdk.credentials.ServicePrincipalCredentials(
-            client_id=creds.get("client_id"),
-            secret=creds.get("secret_key"),
-            tenant=creds.get("tenant_id"),
-            resource=resource,
-            cloud_environment=self.sdk.cloud,
+        key = self._credential_key(
+            "service_principal",
+            creds.get("tenant_id"),
+            creds.get("client_id"),
+            creds.get("secret_key"),
+            resource,
+        )
+        return self._get_cached_credential(
+            key,
+            lambda: self.sdk.credentials.ServicePrincipalCredentials(
+                client_id=creds.get("client_id"),
+                secret=creds.get("secret_key"),
+                tenant=creds.get("tenant_id"),
+                resource=resource,
+                cloud_environment=self.sdk.cloud,
+            ),
         )
 
     def _get_client_secret_credential_obj(self, creds):
-        return self.sdk.identity.ClientSecretCredential(
-            tenant_id=creds.get("tenant_id"),
-            client_id=creds.get("client_id"),
-            client_secret=creds.get("secret_key"),
+        key = self._credential_key(
+            "client_secret",
+            creds.get("tenant_id"),
+            creds.get("client_id"),
+            creds.get("secret_key"),
+        )
+        return self._get_cached_credential(
+            key,
+            lambda: self.sdk.identity.ClientSecretCredential(
+                tenant_id=creds.get("tenant_id"),
+                client_id=creds.get("client_id"),
+                client_secret=creds.get("secret_key"),
+            ),
         )
 
     def _make_tenant_admin_cred_obj(self, username, password):
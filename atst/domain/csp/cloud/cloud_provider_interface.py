@@ -1,4 +1,4 @@
-from typing import Dict
+from typing import Dict, List, Tuple, Union
 
 
 class CloudProviderInterface:
@@ -81,6 +81,29 @@ class CloudProviderInterface:
         """
         raise NotImplementedError()
 
+    def create_or_update_users(
+        self, auth_credentials: Dict, users: List[Tuple]
+    ) -> List[Union[str, Exception]]:
+        """Creates or updates several users in the same environment at once.
+
+        Arguments:
+            auth_credentials -- Object containing CSP account credentials
+            users -- list of (user_info, csp_role_id) pairs, as they would be
+                     passed to `create_or_update_user`
+
+        Returns:
+            list: One entry per user, in the order given. Each entry is either
+                  the internal csp_user_id of the created/updated user account
+                  or the exception raised while provisioning that user.
+
+        Raises:
+            AuthenticationException: Problem with the credentials
+            AuthorizationException: Credentials not authorized for current action(s)
+            ConnectionException: Issue with the CSP API connection
+            UnknownServerException: Unknown issue on the CSP side
+        """
+        raise NotImplementedError()
+
     def disable_user(self, auth_credentials: Dict, csp_user_id: str) -> bool:
         """Revoke all privileges for a user. Used to prevent user access while a full
         delete is being processed.
@@ -118,3 +141,31 @@ class CloudProviderInterface:
         exception if an error occurs while creating a subscription.
         """
         raise NotImplementedError()
+
+    def create_applications(self, payloads: List) -> List:
+        """Creates the management groups of several applications at once.
+
+        Arguments:
+            payloads -- list of ApplicationCSPPayload, as they would be passed
+                        to `create_application`
+
+        Returns:
+            list: One entry per payload, in the order given. Each entry is
+                  whatever `create_application` returned for it or the
+                  CSP exception raised while creating it.
+        """
+        raise NotImplementedError()
+
+    def create_portfolio_policies(self, payload) -> List:
+        """Defines every portfolio-level policy on the portfolio's management
+        group and assigns it there.
+
+        Arguments:
+            payload -- PortfolioPoliciesCSPPayload
+
+        Returns:
+            list: One entry per portfolio policy. Each entry is either the
+                  policy assignment created for it or the CSP exception
+                  raised while defining or assigning it.
+        """
+        raise NotImplementedError()
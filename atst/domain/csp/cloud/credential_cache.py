@@ -0,0 +1,109 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Tokens are refreshed this many seconds before AAD says they expire, so a
+# token handed out by the cache is still valid for the request it is used in.
+TOKEN_REFRESH_MARGIN = 300
+# Entries kept per cache; the least recently used entry is evicted first.
+MAX_ENTRIES = 256
+
+
+class CredentialCache(object):
+    """
+    Thread-safe cache for Azure credential objects, SDK clients and access
+    tokens.
+
+    Each value is built at most once per key: concurrent callers asking for
+    the same key wait for the first caller instead of each going out to AAD.
+    Values built with `get_expiring` are reused until `refresh_margin`
+    seconds before they expire. At most `max_entries` values are kept, so
+    credentials for tenants that are no longer used are eventually dropped.
+    """
+
+    def __init__(
+        self,
+        refresh_margin=TOKEN_REFRESH_MARGIN,
+        clock=time.monotonic,
+        max_entries=MAX_ENTRIES,
+    ):
+        self.refresh_margin = refresh_margin
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._entries = OrderedDict()
+
+    def get(self, key, factory):
+        """
+        Return the value cached under `key`, calling `factory()` to build it
+        on first use. The value never expires.
+        """
+        return self._get(key, lambda: (factory(), None))
+
+    def get_expiring(self, key, factory):
+        """
+        Return the value cached under `key`. `factory()` must return a tuple
+        of (value, lifetime in seconds); it is called again once the cached
+        value is within `refresh_margin` of the end of its lifetime.
+        """
+        return self._get(key, factory)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __contains__(self, key):
+        return self._is_fresh(self._entries.get(key))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _get(self, key, factory):
+        entry = self._lookup(key)
+        if self._is_fresh(entry):
+            return entry[0]
+
+        with self._key_lock(key):
+            # another thread may have filled the entry while we waited
+            entry = self._lookup(key)
+            if self._is_fresh(entry):
+                return entry[0]
+
+            value, lifetime = factory()
+            expires_at = None
+            if lifetime is not None:
+                expires_at = self._clock() + lifetime - self.refresh_margin
+            self._store(key, (value, expires_at))
+
+            return value
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _store(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self._key_locks.pop(evicted, None)
+
+    def _is_fresh(self, entry):
+        if entry is None:
+            return False
+
+        _, expires_at = entry
+        return expires_at is None or self._clock() < expires_at
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
@@ -1,4 +1,8 @@
-from uuid import uuid4
+from collections import defaultdict
+import random
+import threading
+import time
+from uuid import UUID
 
 from atst.domain.csp.cloud.exceptions import (
     BaselineProvisionException,
@@ -20,12 +24,14 @@ from .models import (
     AZURE_MGMNT_PATH,
     ApplicationCSPPayload,
     ApplicationCSPResult,
+    ApplicationVerificationCSPPayload,
     BillingInstructionCSPPayload,
     BillingInstructionCSPResult,
     BillingProfileCreationCSPPayload,
     BillingProfileCreationCSPResult,
     BillingProfileVerificationCSPPayload,
     BillingProfileVerificationCSPResult,
+    PortfolioPoliciesCSPPayload,
     TaskOrderBillingCreationCSPPayload,
     TaskOrderBillingCreationCSPResult,
     TaskOrderBillingVerificationCSPPayload,
@@ -35,6 +41,58 @@ from .models import (
 )
 
 
+class VirtualClock(object):
+    """
+    Stand-in for `time.sleep` that adds the requested duration to `now`
+    instead of waiting, so simulated CSP latency costs no wall-clock time.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self._lock = threading.Lock()
+
+    def sleep(self, seconds):
+        with self._lock:
+            self.now += seconds
+
+
+class MockCloudProfile(object):
+    """
+    Latency and failure behaviour for a MockCloudProvider.
+
+    Arguments:
+        seed -- seeds the provider's random number generator, so that the
+            same sequence of calls sees the same delays and failures
+        latencies -- maps operation names (e.g. "create_environment",
+            "authorize") to their latency in seconds: a number, a
+            (min, max) tuple for a uniform distribution, or a callable that
+            takes a `random.Random` and returns a number
+        failure_rates -- overrides for the provider's failure percentages,
+            keyed by attribute name (e.g. {"NETWORK_FAILURE_PCT": 0})
+        virtual_time -- when True, delays advance a VirtualClock instead
+            of sleeping
+    """
+
+    def __init__(
+        self, seed=None, latencies=None, failure_rates=None, virtual_time=False
+    ):
+        self.seed = seed
+        self.latencies = latencies or {}
+        self.failure_rates = failure_rates or {}
+        self.virtual_time = virtual_time
+
+    def latency(self, operation, rng):
+        latency = self.latencies.get(operation)
+        if latency is None:
+            return None
+        elif callable(latency):
+            return latency(rng)
+        elif isinstance(latency, tuple):
+            return rng.uniform(*latency)
+        else:
+            return latency
+
+
 class MockCloudProvider(CloudProviderInterface):
 
     # TODO: All of these constants
@@ -48,18 +106,37 @@ class MockCloudProvider(CloudProviderInterface):
     ENV_CREATE_FAILURE_PCT = 12
     ATAT_ADMIN_CREATE_FAILURE_PCT = 12
     UNAUTHORIZED_RATE = 2
+    PORTFOLIO_POLICY_COUNT = 2
 
     def __init__(
-        self, config, with_delay=True, with_failure=True, with_authorization=True
+        self,
+        config,
+        with_delay=True,
+        with_failure=True,
+        with_authorization=True,
+        profile=None,
     ):
-        from time import sleep
-        import random
-
         self._with_delay = with_delay
         self._with_failure = with_failure
         self._with_authorization = with_authorization
-        self._sleep = sleep
-        self._random = random
+        self.profile = profile or MockCloudProfile()
+
+        for name, pct in self.profile.failure_rates.items():
+            if not hasattr(self, name):
+                raise ValueError(f"Unknown failure rate {name}")
+            setattr(self, name, pct)
+
+        self._random = random.Random(self.profile.seed)
+        if self.profile.virtual_time:
+            self.clock = VirtualClock()
+            self._sleep = self.clock.sleep
+        else:
+            self.clock = None
+            self._sleep = time.sleep
+
+        # simulated latency per operation, for throughput measurements
+        self.operation_calls = defaultdict(int)
+        self.operation_seconds = defaultdict(float)
 
     def root_creds(self):
         return self._auth_credentials
@@ -73,7 +150,7 @@ class MockCloudProvider(CloudProviderInterface):
     def create_environment(self, auth_credentials, user, environment):
         self._authorize(auth_credentials)
 
-        self._delay(1, 5)
+        self._delay(1, 5, "create_environment")
         self._maybe_raise(self.NETWORK_FAILURE_PCT, self.NETWORK_EXCEPTION)
         self._maybe_raise(self.SERVER_FAILURE_PCT, self.SERVER_EXCEPTION)
         self._maybe_raise(
@@ -85,7 +162,7 @@ class MockCloudProvider(CloudProviderInterface):
 
         csp_environment_id = self._id()
 
-        self._delay(1, 5)
+        self._delay(1, 5, "create_environment_baseline")
         self._maybe_raise(self.NETWORK_FAILURE_PCT, self.NETWORK_EXCEPTION)
         self._maybe_raise(self.SERVER_FAILURE_PCT, self.SERVER_EXCEPTION)
         self._maybe_raise(
@@ -101,7 +178,7 @@ class MockCloudProvider(CloudProviderInterface):
     def create_atat_admin_user(self, auth_credentials, csp_environment_id):
         self._authorize(auth_credentials)
 
-        self._delay(1, 5)
+        self._delay(1, 5, "create_atat_admin_user")
         self._maybe_raise(self.NETWORK_FAILURE_PCT, self.NETWORK_EXCEPTION)
         self._maybe_raise(self.SERVER_FAILURE_PCT, self.SERVER_EXCEPTION)
         self._maybe_raise(
@@ -122,7 +199,7 @@ class MockCloudProvider(CloudProviderInterface):
 
         self._authorize(payload.creds)
 
-        self._delay(1, 5)
+        self._delay(1, 5, "create_tenant")
 
         self._maybe_raise(self.NETWORK_FAILURE_PCT, self.NETWORK_EXCEPTION)
         self._maybe_raise(self.SERVER_FAILURE_PCT, self.SERVER_EXCEPTION)
@@ -141,6 +218,7 @@ class MockCloudProvider(CloudProviderInterface):
     def create_billing_profile_creation(
         self, payload: BillingProfileCreationCSPPayload
     ):
+        self._delay(0, 0, "create_billing_profile_creation")
         # response will be mostly the same as the body, but we only really care about the id
         self._maybe_raise(self.NETWORK_FAILURE_PCT, self.NETWORK_EXCEPTION)
         self._maybe_raise(self.SERVER_FAILURE_PCT, self.SERVER_EXCEPTION)
@@ -156,6 +234,7 @@ class MockCloudProvider(CloudProviderInterface):
     def create_billing_profile_verification(
         self, payload: BillingProfileVerificationCSPPayload
     ):
+        self._delay(0, 0, "create_billing_profile_verification")
         self._maybe_raise(self.NETWORK_FAILURE_PCT, self.NETWORK_EXCEPTION)
         self._maybe_raise(self.SERVER_FAILURE_PCT, self.SERVER_EXCEPTION)
         self._maybe_raise(self.UNAUTHORIZED_RATE, self.AUTHORIZATION_EXCEPTION)
@@ -192,6 +271,7 @@ class MockCloudProvider(CloudProviderInterface):
         )
 
     def create_billing_profile_tenant_access(self, payload):
+        self._delay(0, 0, "create_billing_profile_tenant_access")
         self._maybe_raise(self.NETWORK_FAILURE_PCT, self.NETWORK_EXCEPTION)
         self._maybe_raise(self.SERVER_FAILURE_PCT, self.SERVER_EXCEPTION)
         self._maybe_raise(self.UNAUTHORIZED_RATE, self.AUTHORIZATION_EXCEPTION)
@@ -215,6 +295,7 @@ class MockCloudProvider(CloudProviderInterface):
     def create_task_order_billing_creation(
         self, payload: TaskOrderBillingCreationCSPPayload
     ):
+        self._delay(0, 0, "create_task_order_billing_creation")
         self._maybe_raise(self.NETWORK_FAILURE_PCT, self.NETWORK_EXCEPTION)
         self._maybe_raise(self.SERVER_FAILURE_PCT, self.SERVER_EXCEPTION)
         self._maybe_raise(self.UNAUTHORIZED_RATE, self.AUTHORIZATION_EXCEPTION)
@@ -226,6 +307,7 @@ class MockCloudProvider(CloudProviderInterface):
     def create_task_order_billing_verification(
         self, payload: TaskOrderBillingVerificationCSPPayload
     ):
+        self._delay(0, 0, "create_task_order_billing_verification")
         self._maybe_raise(self.NETWORK_FAILURE_PCT, self.NETWORK_EXCEPTION)
         self._maybe_raise(self.SERVER_FAILURE_PCT, self.SERVER_EXCEPTION)
         self._maybe_raise(self.UNAUTHORIZED_RATE, self.AUTHORIZATION_EXCEPTION)
@@ -261,6 +343,7 @@ class MockCloudProvider(CloudProviderInterface):
         )
 
     def create_billing_instruction(self, payload: BillingInstructionCSPPayload):
+        self._delay(0, 0, "create_billing_instruction")
         self._maybe_raise(self.NETWORK_FAILURE_PCT, self.NETWORK_EXCEPTION)
         self._maybe_raise(self.SERVER_FAILURE_PCT, self.SERVER_EXCEPTION)
         self._maybe_raise(self.UNAUTHORIZED_RATE, self.AUTHORIZATION_EXCEPTION)
@@ -280,7 +363,7 @@ class MockCloudProvider(CloudProviderInterface):
     def create_or_update_user(self, auth_credentials, user_info, csp_role_id):
         self._authorize(auth_credentials)
 
-        self._delay(1, 5)
+        self._delay(1, 5, "create_or_update_user")
         self._maybe_raise(self.NETWORK_FAILURE_PCT, self.NETWORK_EXCEPTION)
         self._maybe_raise(self.SERVER_FAILURE_PCT, self.SERVER_EXCEPTION)
         self._maybe_raise(
@@ -295,6 +378,31 @@ class MockCloudProvider(CloudProviderInterface):
         self._maybe_raise(self.UNAUTHORIZED_RATE, self.AUTHORIZATION_EXCEPTION)
         return self._id()
 
+    def create_or_update_users(self, auth_credentials, users):
+        self._authorize(auth_credentials)
+
+        self._delay(1, 5, "create_or_update_users")
+        self._maybe_raise(self.NETWORK_FAILURE_PCT, self.NETWORK_EXCEPTION)
+        self._maybe_raise(self.SERVER_FAILURE_PCT, self.SERVER_EXCEPTION)
+
+        results = []
+        for user_info, csp_role_id in users:
+            try:
+                self._maybe_raise(
+                    self.ATAT_ADMIN_CREATE_FAILURE_PCT,
+                    UserProvisioningException(
+                        user_info.environment.id,
+                        user_info.application_role.user_id,
+                        "Could not create user.",
+                    ),
+                )
+                self._maybe_raise(self.UNAUTHORIZED_RATE, self.AUTHORIZATION_EXCEPTION)
+                results.append(self._id())
+            except GeneralCSPException as exc:
+                results.append(exc)
+
+        return results
+
     def disable_user(self, auth_credentials, csp_user_id):
         self._authorize(auth_credentials)
         self._maybe_raise(self.NETWORK_FAILURE_PCT, self.NETWORK_EXCEPTION)
@@ -321,11 +429,24 @@ class MockCloudProvider(CloudProviderInterface):
         return "https://www.mycloud.com/my-env-login"
 
     def _id(self):
-        return uuid4().hex
+        # drawn from the seeded generator so that ids repeat between runs too
+        return UUID(int=self._random.getrandbits(128), version=4).hex
+
+    def _delay(self, min_secs, max_secs, operation=None):
+        if not self._with_delay:
+            return
+
+        duration = self.profile.latency(operation, self._random)
+        if duration is None:
+            duration = (
+                self._random.randrange(min_secs, max_secs)
+                if max_secs > min_secs
+                else min_secs
+            )
 
-    def _delay(self, min_secs, max_secs):
-        if self._with_delay:
-            duration = self._random.randrange(min_secs, max_secs)
+        self.operation_calls[operation] += 1
+        self.operation_seconds[operation] += duration
+        if duration:
             self._sleep(duration)
 
     def _maybe(self, pct):
@@ -340,17 +461,49 @@ class MockCloudProvider(CloudProviderInterface):
         return {"username": "mock-cloud", "password": "shh"}  # pragma: allowlist secret
 
     def _authorize(self, credentials):
-        self._delay(1, 5)
+        self._delay(1, 5, "authorize")
         if self._with_authorization and credentials != self._auth_credentials:
             raise self.AUTHENTICATION_EXCEPTION
 
     def create_application(self, payload: ApplicationCSPPayload):
+        self._delay(0, 0, "create_application")
         self._maybe_raise(self.UNAUTHORIZED_RATE, GeneralCSPException)
 
         return ApplicationCSPResult(
             id=f"{AZURE_MGMNT_PATH}{payload.management_group_name}"
         )
 
+    def create_applications(self, payloads):
+        results = []
+        for payload in payloads:
+            try:
+                results.append(self.create_application(payload))
+            except GeneralCSPException as exc:
+                results.append(exc)
+
+        return results
+
+    def create_portfolio_policies(self, payload: PortfolioPoliciesCSPPayload):
+        results = []
+        for _ in range(self.PORTFOLIO_POLICY_COUNT):
+            self._delay(0, 0, "create_portfolio_policy")
+            try:
+                self._maybe_raise(self.UNAUTHORIZED_RATE, GeneralCSPException)
+                results.append({"id": self._id()})
+            except GeneralCSPException as exc:
+                results.append(exc)
+
+        return results
+
+    def create_application_verification(
+        self, payload: ApplicationVerificationCSPPayload
+    ):
+        self._delay(0, 0, "create_application_verification")
+        self._maybe_raise(self.UNAUTHORIZED_RATE, GeneralCSPException)
+
+        management_group_name = payload.operation_url.rstrip("/").split("/")[-1]
+        return ApplicationCSPResult(id=f"{AZURE_MGMNT_PATH}{management_group_name}")
+
     def get_credentials(self, scope="portfolio", tenant_id=None):
         return self.root_creds()
 
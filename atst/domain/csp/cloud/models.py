@@ -3,6 +3,7 @@ import re
 from uuid import uuid4
 
 from pydantic import BaseModel, validator, root_validator
+from requests.structures import CaseInsensitiveDict
 
 from atst.utils import snake_to_camel
 
@@ -291,6 +292,43 @@ class ApplicationCSPResult(ManagementGroupCSPResponse):
     pass
 
 
+class ApplicationOperationCSPResult(AliasModel):
+    """
+    Returned instead of an ApplicationCSPResult when the CSP has accepted the
+    management group creation but not finished it. Check on it again with
+    an ApplicationVerificationCSPPayload after `retry_after` seconds.
+    """
+
+    operation_url: str
+    retry_after: int = 10
+
+    @classmethod
+    def from_headers(cls, headers, operation_url=None):
+        """
+        Build the result from the headers of a 202 response. HTTP header
+        names are case-insensitive, so they are looked up through a
+        case-insensitive mapping. `operation_url` is used when the response
+        has no `Location`, as when polling the operation itself.
+        """
+        headers = CaseInsensitiveDict(headers)
+        values = {"operation_url": headers.get("Location") or operation_url}
+        if headers.get("Retry-After") is not None:
+            values["retry_after"] = headers.get("Retry-After")
+
+        return cls(**values)
+
+
+class ApplicationVerificationCSPPayload(AliasModel):
+    tenant_id: str
+    operation_url: str
+
+
+class PortfolioPoliciesCSPPayload(AliasModel):
+    tenant_id: str
+    management_group_id: str
+    subscription_id: Optional[str]
+
+
 class KeyVaultCredentials(BaseModel):
     root_sp_client_id: Optional[str]
     root_sp_key: Optional[str]
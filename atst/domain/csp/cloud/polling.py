@@ -0,0 +1,39 @@
+from requests.structures import CaseInsensitiveDict
+
+
+class DeferredPolling(object):
+    """
+    msrest polling strategy for long-running operations that returns as soon
+    as Azure has accepted the request instead of polling it to completion.
+
+    Pass an instance as the `polling` argument of an SDK operation. If the
+    operation finished immediately, the poller's result is the deserialized
+    resource as usual; otherwise it is the headers of the 202 response, as a
+    case-insensitive mapping, which include the `Location` to poll and the
+    `Retry-After` interval.
+    """
+
+    ACCEPTED = "Accepted"
+    SUCCEEDED = "Succeeded"
+
+    def initialize(self, client, initial_response, deserialization_callback):
+        self._response = initial_response
+        self._deserialize = deserialization_callback
+
+    def run(self):
+        pass
+
+    def finished(self):
+        return True
+
+    def status(self):
+        if self._response.status_code == 202:
+            return self.ACCEPTED
+
+        return self.SUCCEEDED
+
+    def resource(self):
+        if self.status() == self.ACCEPTED:
+            return CaseInsensitiveDict(self._response.headers)
+
+        return self._deserialize(self._response)
@@ -0,0 +1,89 @@
+import threading
+import time
+from collections import namedtuple
+
+from cryptography.fernet import Fernet
+
+SecretCacheStats = namedtuple(
+    "SecretCacheStats", ["hits", "misses", "writes", "invalidations", "size"]
+)
+
+
+class SecretCache(object):
+    """
+    Read-through cache for KeyVault secrets.
+
+    Values are held encrypted with a key generated for this process, so
+    plaintext credentials are only in memory while a caller is using them.
+    Entries expire `ttl` seconds after they were fetched or written; a `ttl`
+    of 0 disables caching. Hit and miss counts are available from `stats`.
+    """
+
+    def __init__(self, ttl=300, clock=time.monotonic):
+        self.ttl = ttl
+        self._clock = clock
+        self._fernet = Fernet(Fernet.generate_key())
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._hits = 0
+        self._misses = 0
+        self._writes = 0
+        self._invalidations = 0
+
+    def get(self, key, fetch):
+        """
+        Return the secret stored under `key`, calling `fetch()` on a miss.
+        Missing secrets (`None`) are not cached.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._clock() < entry[1]:
+                self._hits += 1
+                token = entry[0]
+            else:
+                self._misses += 1
+                token = None
+
+        if token is not None:
+            return self._fernet.decrypt(token).decode()
+
+        value = fetch()
+        if value is not None:
+            self._store(key, value)
+
+        return value
+
+    def set(self, key, value):
+        self._store(key, value)
+        with self._lock:
+            self._writes += 1
+
+    def invalidate(self, key=None):
+        """
+        Drop the entry for `key`, or every entry when no key is given.
+        """
+        with self._lock:
+            if key is None:
+                self._invalidations += len(self._entries)
+                self._entries.clear()
+            elif self._entries.pop(key, None) is not None:
+                self._invalidations += 1
+
+    @property
+    def stats(self):
+        with self._lock:
+            return SecretCacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                writes=self._writes,
+                invalidations=self._invalidations,
+                size=len(self._entries),
+            )
+
+    def _store(self, key, value):
+        if not self.ttl:
+            return
+
+        token = self._fernet.encrypt(value.encode())
+        with self._lock:
+            self._entries[key] = (token, self._clock() + self.ttl)
@@ -2,6 +2,8 @@ from collections import defaultdict
 import json
 from decimal import Decimal
 
+from .spend_store import ColumnarSpendStore
+
 
 def load_fixture_data():
     with open("fixtures/fixture_spend_data.json") as json_file:
@@ -35,20 +37,27 @@ class MockReportingProvider:
         ]
         """
 
-        fixture_apps = cls.FIXTURE_SPEND_DATA.get(portfolio.name, {}).get(
-            "applications", []
-        )
+        # index the fixture data by name instead of copying it into the
+        # shared FIXTURE_SPEND_DATA, which would grow with every request
+        fixture_apps = {
+            app["name"]: app
+            for app in cls.FIXTURE_SPEND_DATA.get(portfolio.name, {}).get(
+                "applications", []
+            )
+        }
 
+        environment_names = defaultdict(list)
         for application in portfolio.applications:
-            if application.name not in [app["name"] for app in fixture_apps]:
-                fixture_apps.append({"name": application.name, "environments": []})
+            environment_names[application.name].extend(
+                env.name for env in application.environments
+            )
 
         return sorted(
             [
-                cls._get_application_monthly_totals(portfolio, fixture_app)
-                for fixture_app in fixture_apps
-                if fixture_app["name"]
-                in [application.name for application in portfolio.applications]
+                cls._get_application_monthly_totals(
+                    name, fixture_apps.get(name, {}).get("environments", []), env_names,
+                )
+                for name, env_names in environment_names.items()
             ],
             key=lambda app: app["name"],
         )
@@ -72,10 +81,13 @@ class MockReportingProvider:
         }
 
     @classmethod
-    def _get_application_monthly_totals(cls, portfolio, fixture_app):
+    def _get_application_monthly_totals(
+        cls, name, fixture_environments, environment_names
+    ):
         """
-        returns a dictionary that represents spending totals for an application 
-        and its environments e.g. 
+        returns a dictionary that represents spending totals for the application
+        `name` and the environments in `environment_names`. Environments
+        without fixture spending data are listed without totals. e.g.
             {
                 name
                 this_month
@@ -91,28 +103,29 @@ class MockReportingProvider:
                 ]
             }
         """
-        application_envs = [
-            env
-            for env in portfolio.all_environments
-            if env.application.name == fixture_app["name"]
-        ]
+        fixture_envs = {env["name"]: env for env in fixture_environments}
 
-        environments = [
-            cls._get_environment_monthly_totals(env)
-            for env in fixture_app["environments"]
-            if env["name"] in [e.name for e in application_envs]
-        ]
-
-        for env in application_envs:
-            if env.name not in [env["name"] for env in environments]:
-                environments.append({"name": env.name})
+        environments = {}
+        for env_name in environment_names:
+            if env_name in environments:
+                continue
+            if env_name in fixture_envs:
+                environments[env_name] = cls._get_environment_monthly_totals(
+                    fixture_envs[env_name]
+                )
+            else:
+                environments[env_name] = {"name": env_name}
 
         return {
-            "name": fixture_app["name"],
-            "this_month": sum(env.get("this_month", 0) for env in environments),
-            "last_month": sum(env.get("last_month", 0) for env in environments),
-            "total": sum(env.get("total", 0) for env in environments),
-            "environments": sorted(environments, key=lambda env: env["name"]),
+            "name": name,
+            "this_month": sum(
+                env.get("this_month", 0) for env in environments.values()
+            ),
+            "last_month": sum(
+                env.get("last_month", 0) for env in environments.values()
+            ),
+            "total": sum(env.get("total", 0) for env in environments.values()),
+            "environments": sorted(environments.values(), key=lambda env: env["name"]),
         }
 
     @classmethod
@@ -136,3 +149,92 @@ class MockReportingProvider:
                         CLIN_spend_dict[clin]["invoiced"] += Decimal(spend)
             return CLIN_spend_dict
         return {}
+
+
+class ColumnarReportingProvider:
+    """
+    Reporting provider with the same interface as MockReportingProvider,
+    backed by a ColumnarSpendStore. Any source of spend records, such as a
+    CSP cost export, can be loaded into the store.
+    """
+
+    MONTHLY_PERIODS = ("this_month", "last_month", "total")
+
+    def __init__(self, store):
+        self.store = store
+
+    @classmethod
+    def from_fixture(cls):
+        return cls(
+            ColumnarSpendStore.from_spend_data(MockReportingProvider.FIXTURE_SPEND_DATA)
+        )
+
+    def store_for(self, portfolio):
+        """
+        returns the store holding the portfolio's spend records
+        """
+        return self.store
+
+    def get_portfolio_monthly_spending(self, portfolio):
+        """
+        returns the same structure as
+        MockReportingProvider.get_portfolio_monthly_spending
+        """
+        totals = self.store_for(portfolio).totals(
+            ("application", "environment", "period"), portfolio=portfolio.name
+        )
+
+        applications = {}
+        for application in portfolio.applications:
+            environments = applications.setdefault(application.name, {})
+            for env in application.environments:
+                environment = {"name": env.name}
+                for period in self.MONTHLY_PERIODS:
+                    amount = totals.get((application.name, env.name, period))
+                    if amount is not None:
+                        environment[period] = self._number(amount)
+                if len(environment) > 1:
+                    for period in self.MONTHLY_PERIODS:
+                        environment.setdefault(period, 0)
+                environments.setdefault(env.name, environment)
+
+        return sorted(
+            [
+                {
+                    "name": name,
+                    **{
+                        period: sum(env.get(period, 0) for env in environments.values())
+                        for period in self.MONTHLY_PERIODS
+                    },
+                    "environments": sorted(
+                        environments.values(), key=lambda env: env["name"]
+                    ),
+                }
+                for name, environments in applications.items()
+            ],
+            key=lambda app: app["name"],
+        )
+
+    def get_spending_by_JEDI_clin(self, portfolio):
+        """
+        returns the same structure as
+        MockReportingProvider.get_spending_by_JEDI_clin
+        """
+        totals = self.store_for(portfolio).totals(
+            ("clin", "period"), portfolio=portfolio.name
+        )
+
+        CLIN_spend_dict = defaultdict(lambda: defaultdict(Decimal))
+        for (clin, period), amount in totals.items():
+            if period == "this_month":
+                CLIN_spend_dict[clin]["estimated"] += amount
+            elif period == "total":
+                CLIN_spend_dict[clin]["invoiced"] += amount
+
+        return CLIN_spend_dict
+
+    @staticmethod
+    def _number(amount):
+        # monthly spending is rendered with the tojson filter, which does not
+        # accept Decimals
+        return int(amount) if amount == amount.to_integral_value() else float(amount)
@@ -0,0 +1,175 @@
+from array import array
+from collections import namedtuple
+from decimal import Decimal
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+
+# Largest group key the NumPy path can build in an int64.
+MAX_GROUP_KEY = 2 ** 63 - 1
+
+
+SpendRecord = namedtuple(
+    "SpendRecord",
+    ["portfolio", "application", "environment", "clin", "period", "amount"],
+)
+
+
+class Categories(object):
+    """
+    Assigns a dense integer code to each distinct value of a column, in the
+    order the values are first seen.
+    """
+
+    def __init__(self):
+        self.values = []
+        self._codes = {}
+
+    def encode(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+
+        return code
+
+    def code(self, value):
+        return self._codes.get(value)
+
+    def __len__(self):
+        return len(self.values)
+
+
+class ColumnarSpendStore(object):
+    """
+    Spend records held column by column: one array of categorical codes for
+    each of portfolio, application, environment, CLIN and period, and one of
+    amounts in whole cents so that sums are exact.
+
+    `totals` groups and sums the records. When NumPy is installed the group-by
+    is vectorized; otherwise it falls back to a single pass in Python.
+    """
+
+    COLUMNS = SpendRecord._fields[:-1]
+
+    def __init__(self, records=()):
+        self.categories = {column: Categories() for column in self.COLUMNS}
+        self._codes = {column: array("q") for column in self.COLUMNS}
+        self._cents = array("q")
+        self.extend(records)
+
+    @classmethod
+    def from_spend_data(cls, spend_data):
+        """
+        Build a store from spend data in the nested format of
+        `fixtures/fixture_spend_data.json`.
+        """
+        return cls(
+            SpendRecord(portfolio, app["name"], env["name"], clin, period, amount)
+            for portfolio, data in spend_data.items()
+            for app in data.get("applications", [])
+            for env in app["environments"]
+            for period, amounts in env["spending"].items()
+            for clin, amount in amounts.items()
+        )
+
+    def extend(self, records):
+        for record in records:
+            for column in self.COLUMNS:
+                self._codes[column].append(
+                    self.categories[column].encode(getattr(record, column))
+                )
+            self._cents.append(int(round(Decimal(str(record.amount)) * 100)))
+
+    def __len__(self):
+        return len(self._cents)
+
+    def totals(self, by, **filters):
+        """
+        Return a dictionary mapping each distinct tuple of values of the
+        columns in `by` to the sum of the matching amounts, as a Decimal.
+        Only records whose columns equal the keyword arguments are included,
+        e.g. `totals(("clin",), portfolio="A-Wing")`.
+        """
+        filter_codes = {}
+        for column, value in filters.items():
+            code = self.categories[column].code(value)
+            if code is None:
+                return {}
+            filter_codes[column] = code
+
+        if not self._cents:
+            return {}
+        elif numpy is not None:
+            sums = self._numpy_totals(by, filter_codes)
+        else:
+            sums = self._python_totals(by, filter_codes)
+
+        totals = {}
+        for codes, cents in sums:
+            values = tuple(
+                self.categories[column].values[code] for column, code in zip(by, codes)
+            )
+            totals[values] = Decimal(cents) / 100
+
+        return totals
+
+    def _python_totals(self, by, filter_codes):
+        filter_columns = [
+            (self._codes[column], code) for column, code in filter_codes.items()
+        ]
+        by_columns = [self._codes[column] for column in by]
+
+        sums = {}
+        for row, cents in enumerate(self._cents):
+            if all(column[row] == code for column, code in filter_columns):
+                key = tuple(column[row] for column in by_columns)
+                sums[key] = sums.get(key, 0) + cents
+
+        return sums.items()
+
+    def _numpy_totals(self, by, filter_codes):
+        cents = numpy.frombuffer(self._cents, dtype=numpy.int64)
+        mask = numpy.ones(len(cents), dtype=bool)
+        for column, code in filter_codes.items():
+            mask &= numpy.frombuffer(self._codes[column], dtype=numpy.int64) == code
+
+        columns = [
+            numpy.frombuffer(self._codes[column], dtype=numpy.int64)[mask]
+            for column in by
+        ]
+        radices = [len(self.categories[column]) for column in by]
+
+        key_range = 1
+        for radix in radices:
+            key_range *= radix
+
+        if key_range > MAX_GROUP_KEY:
+            # the mixed-radix key would overflow, so find the distinct rows of
+            # the codes themselves instead
+            groups, inverse = numpy.unique(
+                numpy.stack(columns, axis=1), axis=0, return_inverse=True
+            )
+            group_codes = [tuple(codes) for codes in groups.tolist()]
+        else:
+            # combine the group-by columns into a single mixed-radix key
+            keys = numpy.zeros(int(mask.sum()), dtype=numpy.int64)
+            for codes, radix in zip(columns, radices):
+                keys = keys * radix + codes
+
+            groups, inverse = numpy.unique(keys, return_inverse=True)
+            group_codes = []
+            for key in groups.tolist():
+                codes = []
+                for radix in reversed(radices):
+                    key, code = divmod(key, radix)
+                    codes.append(code)
+                group_codes.append(tuple(reversed(codes)))
+
+        sums = numpy.zeros(len(groups), dtype=numpy.int64)
+        numpy.add.at(sums, inverse.reshape(-1), cents[mask])
+
+        return list(zip(group_codes, sums.tolist()))
@@ -90,17 +90,33 @@ class EnvironmentRoles(object):
         )
 
     @classmethod
-    def get_environment_roles_pending_creation(cls) -> List[UUID]:
-        results = (
-            db.session.query(EnvironmentRole.id)
+    def _pending_creation_query(cls, column, environment_id=None):
+        query = (
+            db.session.query(column)
             .join(Environment)
             .join(ApplicationRole)
             .filter(Environment.deleted == False)
             .filter(EnvironmentRole.status == EnvironmentRole.Status.PENDING)
             .filter(ApplicationRole.status == ApplicationRoleStatus.ACTIVE)
-            .all()
         )
-        return [id_ for id_, in results]
+        if environment_id is not None:
+            query = query.filter(EnvironmentRole.environment_id == environment_id)
+
+        return query
+
+    @classmethod
+    def get_environment_roles_pending_creation(cls, environment_id=None) -> List[UUID]:
+        query = cls._pending_creation_query(EnvironmentRole.id, environment_id)
+        return [id_ for id_, in query.all()]
+
+    @classmethod
+    def get_environments_with_roles_pending_creation(
+        cls, environment_id=None
+    ) -> List[UUID]:
+        query = cls._pending_creation_query(
+            EnvironmentRole.environment_id, environment_id
+        ).distinct()
+        return [id_ for id_, in query.all()]
 
     @classmethod
     def disable(cls, environment_role_id):
@@ -12,6 +12,7 @@ from atst.models import (
     CLIN,
 )
 from atst.domain.environment_roles import EnvironmentRoles
+from atst.queue import enqueue_after_commit
 from atst.utils import commit_or_raise_already_exists_error
 
 from .exceptions import NotFoundError, DisabledError
@@ -22,6 +23,9 @@ class Environments(object):
     def create(cls, user, application, name):
         environment = Environment(application=application, name=name, creator=user)
         db.session.add(environment)
+        enqueue_after_commit(
+            "atst.jobs.dispatch_create_environment", environment_id=environment
+        )
         commit_or_raise_already_exists_error(message="environment")
         return environment
 
@@ -100,8 +104,8 @@ class Environments(object):
         return environment
 
     @classmethod
-    def base_provision_query(cls, now):
-        return (
+    def base_provision_query(cls, now, environment_id=None):
+        query = (
             db.session.query(Environment.id)
             .join(Application)
             .join(Portfolio)
@@ -117,24 +121,32 @@ class Environments(object):
                 )
             )
         )
+        if environment_id is not None:
+            query = query.filter(Environment.id == environment_id)
+
+        return query
 
     @classmethod
-    def get_environments_pending_creation(cls, now) -> List[UUID]:
+    def get_environments_pending_creation(cls, now, environment_id=None) -> List[UUID]:
         """
         Any environment with an active CLIN that doesn't yet have a `cloud_id`.
         """
         results = (
-            cls.base_provision_query(now).filter(Environment.cloud_id == None).all()
+            cls.base_provision_query(now, environment_id)
+            .filter(Environment.cloud_id == None)
+            .all()
         )
         return [id_ for id_, in results]
 
     @classmethod
-    def get_environments_pending_atat_user_creation(cls, now) -> List[UUID]:
+    def get_environments_pending_atat_user_creation(
+        cls, now, environment_id=None
+    ) -> List[UUID]:
         """
         Any environment with an active CLIN that has a cloud_id but no `root_user_info`.
         """
         results = (
-            cls.base_provision_query(now)
+            cls.base_provision_query(now, environment_id)
             .filter(Environment.cloud_id != None)
             .filter(Environment.root_user_info == None)
         ).all()
@@ -0,0 +1,203 @@
+from collections import namedtuple
+import threading
+
+from flask import current_app as app
+from sqlalchemy import func
+
+from atst.database import db
+from atst.models import JobAttempt, JobAttemptStatus, JobFailure
+
+
+TaskFailureRate = namedtuple(
+    "TaskFailureRate",
+    [
+        "task_name",
+        "attempts",
+        "succeeded",
+        "retried",
+        "failed",
+        "failure_rate",
+        "average_duration",
+        "max_duration",
+    ],
+)
+
+OperationFailures = namedtuple(
+    "OperationFailures", ["csp_operation", "retried", "failed", "average_duration"]
+)
+
+HotEntity = namedtuple(
+    "HotEntity", ["entity", "entity_id", "failures", "task_names", "last_failure"]
+)
+
+
+def write_telemetry(statement, rows):
+    """
+    Execute `statement` for `rows` in a transaction of its own. Telemetry is
+    written while a task is failing, when the task's session may be unusable
+    or hold changes that must not be committed, so it is kept out of
+    `db.session`.
+    """
+    with db.session.get_bind().connect() as connection:
+        with connection.begin():
+            connection.execute(statement, rows)
+
+
+class JobFailures(object):
+    """
+    Telemetry for `atst.jobs` tasks. Every attempt is recorded as a
+    `JobAttempt`; attempts are buffered per worker process and written with
+    a single multi-row insert once `JOB_ATTEMPT_BATCH_SIZE` of them have
+    accumulated, `JOB_ATTEMPT_FLUSH_INTERVAL` seconds after the oldest of
+    them was recorded, or when the worker process shuts down.
+    """
+
+    _pending_attempts = []
+    _lock = threading.Lock()
+    _flush_timer = None
+
+    @classmethod
+    def record_attempt(cls, **attempt):
+        batch_size = int(app.config.get("JOB_ATTEMPT_BATCH_SIZE", 50))
+        with cls._lock:
+            cls._pending_attempts.append(attempt)
+            full = len(cls._pending_attempts) >= batch_size
+            if not full and cls._flush_timer is None:
+                cls._flush_timer = cls._start_flush_timer(
+                    float(app.config.get("JOB_ATTEMPT_FLUSH_INTERVAL", 10))
+                )
+
+        if full:
+            cls.flush_attempts()
+
+    @classmethod
+    def _start_flush_timer(cls, interval):
+        flask_app = app._get_current_object()
+
+        def flush():
+            with flask_app.app_context():
+                try:
+                    cls.flush_attempts()
+                finally:
+                    db.session.remove()
+
+        timer = threading.Timer(interval, flush)
+        timer.daemon = True
+        timer.start()
+        return timer
+
+    @classmethod
+    def flush_attempts(cls):
+        with cls._lock:
+            attempts, cls._pending_attempts = cls._pending_attempts, []
+            if cls._flush_timer is not None:
+                cls._flush_timer.cancel()
+                cls._flush_timer = None
+
+        if not attempts:
+            return
+
+        try:
+            write_telemetry(JobAttempt.__table__.insert(), attempts)
+        except Exception:
+            # keep the attempts for the next flush rather than losing them
+            with cls._lock:
+                cls._pending_attempts[:0] = attempts
+            app.logger.warning(
+                "Could not write {} job attempts".format(len(attempts)), exc_info=1
+            )
+
+    @classmethod
+    def failure_rates(cls, since):
+        def count_status(status):
+            return func.count(JobAttempt.id).filter(JobAttempt.status == status)
+
+        rows = (
+            db.session.query(
+                JobAttempt.task_name,
+                func.count(JobAttempt.id),
+                count_status(JobAttemptStatus.SUCCEEDED),
+                count_status(JobAttemptStatus.RETRIED),
+                count_status(JobAttemptStatus.FAILED),
+                func.avg(JobAttempt.duration),
+                func.max(JobAttempt.duration),
+            )
+            .filter(JobAttempt.time_created >= since)
+            .group_by(JobAttempt.task_name)
+            .all()
+        )
+
+        rates = []
+        for (task_name, attempts, succeeded, retried, failed, avg, max_) in rows:
+            runs = succeeded + failed
+            rates.append(
+                TaskFailureRate(
+                    task_name=task_name,
+                    attempts=attempts,
+                    succeeded=succeeded,
+                    retried=retried,
+                    failed=failed,
+                    failure_rate=failed / runs if runs else 0.0,
+                    average_duration=avg,
+                    max_duration=max_,
+                )
+            )
+
+        return sorted(rates, key=lambda r: (r.failure_rate, r.failed), reverse=True)
+
+    @classmethod
+    def operation_failures(cls, since):
+        """
+        Retried and failed attempts per CSP operation, i.e. the last cloud
+        provider call the task made before it gave up, most failures first.
+        """
+        failures = func.count(JobAttempt.id).filter(
+            JobAttempt.status == JobAttemptStatus.FAILED
+        )
+        rows = (
+            db.session.query(
+                JobAttempt.csp_operation,
+                func.count(JobAttempt.id).filter(
+                    JobAttempt.status == JobAttemptStatus.RETRIED
+                ),
+                failures,
+                func.avg(JobAttempt.duration),
+            )
+            .filter(JobAttempt.time_created >= since)
+            .filter(JobAttempt.csp_operation.isnot(None))
+            .filter(JobAttempt.status != JobAttemptStatus.SUCCEEDED)
+            .group_by(JobAttempt.csp_operation)
+            .order_by(failures.desc(), JobAttempt.csp_operation)
+            .all()
+        )
+
+        return [OperationFailures(*row) for row in rows]
+
+    @classmethod
+    def hot_entities(cls, since, limit=20):
+        failures = func.count(JobFailure.id)
+        rows = (
+            db.session.query(
+                JobFailure.entity,
+                JobFailure.entity_id,
+                failures,
+                func.array_agg(func.distinct(JobFailure.task_name)),
+                func.max(JobFailure.time_created),
+            )
+            .filter(JobFailure.time_created >= since)
+            .group_by(JobFailure.entity, JobFailure.entity_id)
+            .order_by(failures.desc(), func.max(JobFailure.time_created).desc())
+            .limit(limit)
+            .all()
+        )
+
+        return [
+            HotEntity(
+                entity=entity,
+                entity_id=entity_id,
+                failures=count,
+                task_names=[name for name in task_names if name],
+                last_failure=last_failure,
+            )
+            for (entity, entity_id, count, task_names, last_failure) in rows
+        ]
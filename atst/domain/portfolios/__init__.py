@@ -4,3 +4,4 @@ from .portfolios import (
     PortfolioDeletionApplicationsExistError,
     PortfolioStateMachines,
 )
+from .funding_summaries import PortfolioFundingSummaries
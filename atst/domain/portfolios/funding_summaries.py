@@ -0,0 +1,187 @@
+from flask import has_app_context
+from pendulum import today
+from sqlalchemy import event, func, or_, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session, joinedload, object_session, selectinload
+
+from atst.database import db
+from atst.domain.reports import invalidate_after_commit
+from atst.models import CLIN, Portfolio, PortfolioFundingSummary, TaskOrder
+from atst.queue import enqueue_after_commit
+
+
+FUNDING_CHANGES_KEY = "portfolio_funding_changes"
+
+
+class PortfolioFundingSummaries(object):
+    """
+    Summaries are written by the `refresh_funding_summary` job, which runs
+    after every commit that changes a portfolio's task orders or CLINs, and
+    daily once the previous day's summaries have gone stale. Reading a
+    summary never writes one.
+    """
+
+    @classmethod
+    def get(cls, portfolio):
+        """
+        Return the portfolio's funding summary for today, or compute it
+        without saving it if it has not been refreshed yet today.
+        """
+        summary = (
+            db.session.query(PortfolioFundingSummary)
+            .populate_existing()
+            .filter(
+                PortfolioFundingSummary.portfolio_id == portfolio.id,
+                PortfolioFundingSummary.computed_on == today(tz="UTC").date(),
+            )
+            .one_or_none()
+        )
+
+        return summary or PortfolioFundingSummary(
+            portfolio=portfolio, **cls._compute(portfolio)
+        )
+
+    @classmethod
+    def refresh(cls, portfolio):
+        values = cls._compute(portfolio)
+        statement = insert(PortfolioFundingSummary.__table__).values(
+            portfolio_id=portfolio.id, **values
+        )
+        db.session.execute(
+            statement.on_conflict_do_update(
+                index_elements=["portfolio_id"], set_=values
+            )
+        )
+        db.session.commit()
+
+    @classmethod
+    def get_portfolios_pending_refresh(cls):
+        """
+        Portfolios without a summary computed today.
+        """
+        results = (
+            db.session.query(Portfolio.id)
+            .outerjoin(
+                PortfolioFundingSummary,
+                PortfolioFundingSummary.portfolio_id == Portfolio.id,
+            )
+            .filter(Portfolio.deleted == False)
+            .filter(
+                or_(
+                    PortfolioFundingSummary.computed_on.is_(None),
+                    PortfolioFundingSummary.computed_on < today(tz="UTC").date(),
+                )
+            )
+        )
+        return [id_ for id_, in results]
+
+    @classmethod
+    def _compute(cls, portfolio):
+        task_orders = (
+            db.session.query(TaskOrder)
+            .options(selectinload(TaskOrder.clins), joinedload(TaskOrder._pdf))
+            .filter(TaskOrder.portfolio_id == portfolio.id)
+            .all()
+        )
+        active_task_orders = [
+            task_order for task_order in task_orders if task_order.is_active
+        ]
+
+        return {
+            "computed_on": today(tz="UTC").date(),
+            "obligated_funds": sum(
+                task_order.total_obligated_funds for task_order in active_task_orders
+            ),
+            "total_funds": sum(
+                task_order.total_contract_amount for task_order in active_task_orders
+            ),
+            "active_task_orders": len(active_task_orders),
+            "active_clins": sum(
+                1
+                for task_order in task_orders
+                for clin in task_order.clins
+                if clin.is_active
+            ),
+            "funding_start_date": min(
+                (task_order.start_date for task_order in active_task_orders),
+                default=None,
+            ),
+        }
+
+
+# Task order and CLIN writes only note what changed. Once per flush, the
+# funding end date of the affected portfolios is recomputed with a single
+# UPDATE, which also returns their ids; their summaries are deleted, a
+# refresh is enqueued for after the commit, and their cached reports are
+# invalidated.
+
+
+def _funding_changes(target):
+    return object_session(target).info.setdefault(
+        FUNDING_CHANGES_KEY, {"portfolio_ids": set(), "task_order_ids": set()}
+    )
+
+
+def _task_order_changed(mapper, connection, target):
+    _funding_changes(target)["portfolio_ids"].add(target.portfolio_id)
+
+
+def _clin_changed(mapper, connection, target):
+    _funding_changes(target)["task_order_ids"].add(target.task_order_id)
+
+
+for mapper_event in ["after_insert", "after_update", "after_delete"]:
+    event.listen(TaskOrder, mapper_event, _task_order_changed)
+    event.listen(CLIN, mapper_event, _clin_changed)
+
+
+def _changed_portfolios(portfolios, changes):
+    conditions = []
+    if changes["portfolio_ids"]:
+        conditions.append(portfolios.c.id.in_(changes["portfolio_ids"]))
+    if changes["task_order_ids"]:
+        conditions.append(
+            portfolios.c.id.in_(
+                select([TaskOrder.portfolio_id]).where(
+                    TaskOrder.id.in_(changes["task_order_ids"])
+                )
+            )
+        )
+    return or_(*conditions)
+
+
+@event.listens_for(Session, "after_flush")
+def _update_funding(session, flush_context):
+    changes = session.info.pop(FUNDING_CHANGES_KEY, None)
+    if not changes:
+        return
+
+    portfolios = Portfolio.__table__
+    portfolio_ids = [
+        id_
+        for id_, in session.execute(
+            portfolios.update()
+            .where(_changed_portfolios(portfolios, changes))
+            .values(
+                funding_end_date=select([func.max(CLIN.end_date)])
+                .where(CLIN.task_order_id == TaskOrder.id)
+                .where(TaskOrder.portfolio_id == portfolios.c.id)
+                .where(TaskOrder.signed_at.isnot(None))
+                .as_scalar()
+            )
+            .returning(portfolios.c.id)
+        )
+    ]
+    if not portfolio_ids:
+        return
+
+    summaries = PortfolioFundingSummary.__table__
+    session.execute(
+        summaries.delete().where(summaries.c.portfolio_id.in_(portfolio_ids))
+    )
+    invalidate_after_commit(session, portfolio_ids)
+    if has_app_context():
+        for portfolio_id in portfolio_ids:
+            enqueue_after_commit(
+                "atst.jobs.refresh_funding_summary", portfolio_id=portfolio_id
+            )
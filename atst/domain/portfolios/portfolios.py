@@ -1,4 +1,9 @@
-from sqlalchemy import or_
+from collections import namedtuple
+from datetime import timedelta
+import pendulum
+from sqlalchemy import and_, case, func, or_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import joinedload, selectinload
 from typing import List
 from uuid import UUID
 
@@ -8,7 +13,9 @@ from atst.domain.authz import Authorization
 from atst.domain.portfolio_roles import PortfolioRoles
 
 from atst.domain.invitations import PortfolioInvitations
+from atst.queue import enqueue_after_commit
 from atst.models import (
+    FundingExpirationNotice,
     Portfolio,
     PortfolioStateMachine,
     FSMStates,
@@ -21,6 +28,20 @@ from .query import PortfoliosQuery, PortfolioStateMachinesQuery
 from .scopes import ScopedPortfolio
 
 
+StateDuration = namedtuple(
+    "StateDuration", ["state", "transitions", "average_duration", "percentile_duration"]
+)
+
+
+# States in which a State Machine is not being worked on
+PROVISIONING_IDLE_STATES = [
+    state
+    for state in FSMStates
+    if state in (FSMStates.UNSTARTED, FSMStates.COMPLETED, FSMStates.FAILED)
+    or state.name.endswith("_FAILED")
+]
+
+
 class PortfolioError(Exception):
     pass
 
@@ -34,8 +55,33 @@ class PortfolioStateMachines(object):
     def create(cls, portfolio, **sm_attrs):
         sm_attrs.update({"portfolio": portfolio})
         sm = PortfolioStateMachinesQuery.create(**sm_attrs)
+        enqueue_after_commit(
+            "atst.jobs.dispatch_provision_portfolio", portfolio_id=portfolio
+        )
         return sm
 
+    @classmethod
+    def get_state_durations(cls, since, percentile=0.95):
+        """
+        How long state machines stayed in each state before leaving it, over
+        the transitions made since `since`. Durations are in seconds.
+        """
+        return [
+            StateDuration(*row)
+            for row in PortfolioStateMachinesQuery.get_state_durations(
+                since, percentile
+            )
+        ]
+
+    @classmethod
+    def get_stuck(cls, state, minutes):
+        """
+        State machines that have been in `state` for more than `minutes`
+        minutes, as (state machine, time it entered the state) pairs.
+        """
+        before = pendulum.now("UTC").subtract(minutes=minutes)
+        return PortfolioStateMachinesQuery.get_in_state_since(state, before)
+
 
 class Portfolios(object):
     @classmethod
@@ -144,31 +190,148 @@ class Portfolios(object):
         return db.session.query(Portfolio.id)
 
     @classmethod
-    def get_portfolios_pending_provisioning(cls) -> List[UUID]:
+    def get_portfolios_pending_provisioning(
+        cls, portfolio_id=None, limit=None, stalled_before=None
+    ) -> List[UUID]:
         """
-        Any portfolio with a corresponding State Machine that is either:
-            not started yet,
-            failed in creating a tenant
-            failed
+        Portfolios whose State Machine has not started yet, oldest first.
+        When `stalled_before` is given, State Machines that are being worked
+        on but have not changed state since then are included too, so that a
+        portfolio whose next step was lost is picked up again. Failed State
+        Machines cannot advance until they are reset, which puts them back in
+        this set.
         """
+        pending = PortfolioStateMachine.state == FSMStates.UNSTARTED
+        if stalled_before is not None:
+            pending = or_(
+                pending,
+                and_(
+                    PortfolioStateMachine.state.notin_(PROVISIONING_IDLE_STATES),
+                    PortfolioStateMachine.time_updated < stalled_before,
+                ),
+            )
 
         results = (
             cls.base_provision_query()
             .join(PortfolioStateMachine)
+            .filter(pending)
+            .order_by(PortfolioStateMachine.time_created, Portfolio.id)
+        )
+        if portfolio_id is not None:
+            results = results.filter(Portfolio.id == portfolio_id)
+        if limit is not None:
+            results = results.limit(limit)
+
+        return [id_ for id_, in results]
+
+    @classmethod
+    def get_portfolios_pending_policies(cls, portfolio_id=None) -> List[UUID]:
+        """
+        Provisioned portfolios whose portfolio policies have not yet been
+        assigned to their root management group.
+        """
+        results = (
+            db.session.query(Portfolio.id, Portfolio.csp_data)
+            .join(PortfolioStateMachine)
+            .filter(PortfolioStateMachine.state == FSMStates.COMPLETED)
+            .filter(Portfolio.deleted == False)
+        )
+        if portfolio_id is not None:
+            results = results.filter(Portfolio.id == portfolio_id)
+
+        return [
+            id_
+            for id_, csp_data in results
+            if (csp_data or {}).get("root_management_group_id")
+            and not csp_data.get("policies_assigned")
+        ]
+
+    @classmethod
+    def count_portfolios_provisioning(cls, updated_since):
+        """
+        The number of State Machines between UNSTARTED and a terminal state
+        that changed state after `updated_since`. Older ones are considered
+        stalled and are reported by `PortfolioStateMachines.get_stuck`.
+        """
+        return (
+            db.session.query(PortfolioStateMachine)
+            .filter(PortfolioStateMachine.state.notin_(PROVISIONING_IDLE_STATES))
+            .filter(PortfolioStateMachine.time_updated >= updated_since)
+            .count()
+        )
+
+    @classmethod
+    def get_portfolios_pending_funding_expiration_notice(
+        cls, notice_days, today, portfolio_id=None, lock=False
+    ) -> List[UUID]:
+        """
+        Portfolios whose funding ends within the largest of `notice_days`
+        and whose owner has not yet been notified for the threshold it is
+        now within. A notice is due again when the funding end date changes.
+
+        With `lock`, the portfolio rows are locked until the transaction ends
+        and rows locked by another transaction are skipped, so that only one
+        sender notifies each owner.
+        """
+        # the smallest of `notice_days` the funding end date is within
+        threshold = case(
+            [
+                (Portfolio.funding_end_date <= today + timedelta(days=days), days)
+                for days in sorted(notice_days)
+            ]
+        )
+        results = (
+            db.session.query(Portfolio.id)
+            .outerjoin(
+                FundingExpirationNotice,
+                FundingExpirationNotice.portfolio_id == Portfolio.id,
+            )
+            .filter(Portfolio.deleted == False)
+            .filter(
+                Portfolio.funding_end_date.between(
+                    today, today + timedelta(days=max(notice_days))
+                )
+            )
             .filter(
                 or_(
-                    PortfolioStateMachine.state == FSMStates.UNSTARTED,
-                    PortfolioStateMachine.state == FSMStates.FAILED,
-                    PortfolioStateMachine.state == FSMStates.TENANT_FAILED,
+                    FundingExpirationNotice.funding_end_date.is_distinct_from(
+                        Portfolio.funding_end_date
+                    ),
+                    FundingExpirationNotice.days > threshold,
                 )
             )
+            .order_by(Portfolio.funding_end_date, Portfolio.id)
         )
+        if portfolio_id is not None:
+            results = results.filter(Portfolio.id == portfolio_id)
+        if lock:
+            results = results.with_for_update(skip_locked=True, of=Portfolio)
+
         return [id_ for id_, in results]
 
-        # db.session.query(PortfolioStateMachine).\
-        #        filter(
-        #            or_(
-        #                PortfolioStateMachine.state==FSMStates.UNSTARTED,
-        #                PortfolioStateMachine.state==FSMStates.UNSTARTED,
-        #            )
-        #        ).all()
+    @classmethod
+    def record_funding_expiration_notice(cls, portfolio, days):
+        values = {"funding_end_date": portfolio.funding_end_date, "days": days}
+        statement = insert(FundingExpirationNotice.__table__).values(
+            portfolio_id=portfolio.id, **values
+        )
+        db.session.execute(
+            statement.on_conflict_do_update(
+                index_elements=["portfolio_id"],
+                set_={**values, "time_updated": func.now()},
+            )
+        )
+
+    @classmethod
+    def get_with_owners(cls, portfolio_ids):
+        return (
+            db.session.query(Portfolio)
+            .options(
+                selectinload(Portfolio.roles).selectinload(
+                    PortfolioRole.permission_sets
+                ),
+                selectinload(Portfolio.roles).joinedload(PortfolioRole.user),
+            )
+            .filter(Portfolio.id.in_(portfolio_ids))
+            .all()
+        )
@@ -1,4 +1,4 @@
-from sqlalchemy import or_
+from sqlalchemy import func, or_
 from atst.database import db
 from atst.domain.common import Query
 from atst.models.portfolio import Portfolio
@@ -9,6 +9,7 @@ from atst.models.application_role import (
 )
 from atst.models.application import Application
 from atst.models.portfolio_state_machine import PortfolioStateMachine
+from atst.models.portfolio_state_transition import PortfolioStateTransition
 
 # from atst.models.application import Application
 
@@ -16,6 +17,54 @@ from atst.models.portfolio_state_machine import PortfolioStateMachine
 class PortfolioStateMachinesQuery(Query):
     model = PortfolioStateMachine
 
+    @classmethod
+    def get_state_durations(cls, since, percentile):
+        return (
+            db.session.query(
+                PortfolioStateTransition.source,
+                func.count(PortfolioStateTransition.id),
+                func.avg(PortfolioStateTransition.duration),
+                func.percentile_cont(percentile).within_group(
+                    PortfolioStateTransition.duration.asc()
+                ),
+            )
+            .filter(PortfolioStateTransition.transitioned_at >= since)
+            .filter(PortfolioStateTransition.duration != None)
+            .group_by(PortfolioStateTransition.source)
+            .order_by(PortfolioStateTransition.source)
+            .all()
+        )
+
+    @classmethod
+    def get_in_state_since(cls, state, before):
+        """
+        State Machines in `state` that entered it before `before`, with the
+        time they entered it, longest waiting first. A State Machine with no
+        recorded transition is taken to have entered its state when it was
+        last updated.
+        """
+        in_state = db.session.query(cls.model.id).filter(cls.model.state == state)
+        entered = (
+            db.session.query(
+                PortfolioStateTransition.portfolio_state_machine_id,
+                func.max(PortfolioStateTransition.transitioned_at).label("entered_at"),
+            )
+            .filter(PortfolioStateTransition.portfolio_state_machine_id.in_(in_state))
+            .group_by(PortfolioStateTransition.portfolio_state_machine_id)
+            .subquery()
+        )
+        entered_at = func.coalesce(
+            entered.c.entered_at, cls.model.time_updated, cls.model.time_created
+        )
+        return (
+            db.session.query(cls.model, entered_at)
+            .outerjoin(entered, entered.c.portfolio_state_machine_id == cls.model.id)
+            .filter(cls.model.state == state)
+            .filter(entered_at < before)
+            .order_by(entered_at)
+            .all()
+        )
+
 
 class PortfoliosQuery(Query):
     model = Portfolio
@@ -1,11 +1,133 @@
-from flask import current_app
-from itertools import groupby
+from decimal import Decimal
+import json
+import time
+
+from flask import current_app, has_app_context
+from redis.exceptions import RedisError
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session, object_session
+
+from atst.database import db
+from atst.models import Application, CLIN, Environment, Portfolio, TaskOrder
+from atst.utils import sha256_hex
+
+INVALIDATED_PORTFOLIOS_KEY = "report_cache_invalidated_portfolios"
+
+
+def _encode(obj):
+    if isinstance(obj, Decimal):
+        return {"__decimal__": str(obj)}
+    raise TypeError("{} is not JSON serializable".format(type(obj).__name__))
+
+
+def _decode(dct):
+    if "__decimal__" in dct:
+        return Decimal(dct["__decimal__"])
+    return dct
+
+
+class ReportCache(object):
+    """
+    Caches report results in Redis. A cached report is keyed by:
+
+    - the portfolio's epoch, which is bumped when the portfolio, its task
+      orders, CLINs, applications or environments change,
+    - the data epoch, which is bumped when new cost data is ingested,
+    - the current `bucket_seconds` time bucket, so that reports are
+      recomputed at least that often.
+
+    Superseded entries are never read again and expire after
+    `bucket_seconds`. A `bucket_seconds` of 0 disables the cache.
+    """
+
+    PREFIX = "reports"
+
+    def __init__(self, redis, bucket_seconds, clock=time.time):
+        self.redis = redis
+        self.bucket_seconds = bucket_seconds
+        self._clock = clock
+
+    @classmethod
+    def from_app(cls):
+        return cls(
+            current_app.redis, int(current_app.config.get("REPORT_CACHE_BUCKET", 0))
+        )
+
+    def get(self, portfolio_id, name, compute):
+        """
+        Return the report `name` for the portfolio, calling `compute()` if it
+        is not cached. Results must be JSON serializable or Decimals.
+        """
+        if not self.bucket_seconds:
+            return compute()
+
+        try:
+            key = self._key(portfolio_id, name)
+            cached = self.redis.get(key)
+        except RedisError:
+            current_app.logger.exception("Could not read the report cache")
+            return compute()
+
+        if cached is not None:
+            return json.loads(cached, object_hook=_decode)
+
+        value = compute()
+        try:
+            self.redis.setex(
+                key, self.bucket_seconds, json.dumps(value, default=_encode)
+            )
+        except RedisError:
+            current_app.logger.exception("Could not write the report cache")
+
+        return value
+
+    def invalidate(self, portfolio_id=None):
+        """
+        Invalidate the cached reports of one portfolio, or of every portfolio
+        when no id is given.
+        """
+        if not self.bucket_seconds:
+            return
+
+        try:
+            self.redis.incr(self._epoch_key(portfolio_id))
+        except RedisError:
+            current_app.logger.exception("Could not invalidate the report cache")
+
+    def _key(self, portfolio_id, name):
+        portfolio_epoch, data_epoch = self.redis.mget(
+            self._epoch_key(portfolio_id), self._epoch_key()
+        )
+        bucket = int(self._clock() // self.bucket_seconds)
+        return "{}:{}:{}:{}.{}.{}".format(
+            self.PREFIX,
+            portfolio_id,
+            name,
+            int(data_epoch or 0),
+            int(portfolio_epoch or 0),
+            bucket,
+        )
+
+    def _epoch_key(self, portfolio_id=None):
+        if portfolio_id is None:
+            return "{}:epoch".format(self.PREFIX)
+        return "{}:epoch:{}".format(self.PREFIX, portfolio_id)
 
 
 class Reports:
     @classmethod
     def monthly_spending(cls, portfolio):
-        return current_app.csp.reports.get_portfolio_monthly_spending(portfolio)
+        # `portfolio` may be scoped to the applications the user can see
+        scope = sha256_hex(
+            ",".join(
+                sorted(str(application.id) for application in portfolio.applications)
+            )
+        )[:16]
+        return ReportCache.from_app().get(
+            portfolio.id,
+            "monthly_spending:{}".format(scope),
+            lambda: current_app.csp.reports.get_portfolio_monthly_spending(portfolio),
+        )
 
     @classmethod
     def expired_task_orders(cls, portfolio):
@@ -15,22 +137,30 @@ class Reports:
 
     @classmethod
     def obligated_funds_by_JEDI_clin(cls, portfolio):
+        return ReportCache.from_app().get(
+            portfolio.id,
+            "obligated_funds_by_JEDI_clin",
+            lambda: cls._obligated_funds_by_JEDI_clin(portfolio),
+        )
+
+    @classmethod
+    def _obligated_funds_by_JEDI_clin(cls, portfolio):
         clin_spending = current_app.csp.reports.get_spending_by_JEDI_clin(portfolio)
-        active_clins = portfolio.active_clins
-        for jedi_clin, clins in groupby(
-            active_clins, key=lambda clin: clin.jedi_clin_type
-        ):
-            if not clin_spending.get(jedi_clin.name):
-                clin_spending[jedi_clin.name] = {}
-            clin_spending[jedi_clin.name]["obligated"] = sum(
-                clin.obligated_amount for clin in clins
+        obligated_funds = {
+            jedi_clin.name: obligated
+            for jedi_clin, obligated in (
+                db.session.query(CLIN.jedi_clin_type, func.sum(CLIN.obligated_amount))
+                .join(TaskOrder, CLIN.task_order_id == TaskOrder.id)
+                .filter(TaskOrder.portfolio_id == portfolio.id, CLIN.is_active)
+                .group_by(CLIN.jedi_clin_type)
             )
+        }
 
         output = []
-        for clin in clin_spending.keys():
-            invoiced = clin_spending[clin].get("invoiced", 0)
-            estimated = clin_spending[clin].get("estimated", 0)
-            obligated = clin_spending[clin].get("obligated", 0)
+        for clin in sorted(set(clin_spending) | set(obligated_funds)):
+            invoiced = clin_spending.get(clin, {}).get("invoiced", 0)
+            estimated = clin_spending.get(clin, {}).get("estimated", 0)
+            obligated = obligated_funds.get(clin, 0)
             remaining = obligated - (invoiced + estimated)
             output.append(
                 {
@@ -42,3 +172,59 @@ class Reports:
                 }
             )
         return output
+
+
+def invalidate_after_commit(session, portfolio_ids):
+    """
+    Invalidate the cached reports of the given portfolios once the session's
+    transaction commits. Task order and CLIN writes are reported here by
+    `atst.domain.portfolios.funding_summaries`, which already resolves the
+    portfolios they belong to.
+    """
+    session.info.setdefault(INVALIDATED_PORTFOLIOS_KEY, set()).update(portfolio_ids)
+
+
+def _invalidate_after_commit(target, portfolio_id):
+    if portfolio_id is None:
+        return
+
+    invalidate_after_commit(object_session(target), [portfolio_id])
+
+
+def _portfolio_changed(mapper, connection, target):
+    _invalidate_after_commit(target, target.id)
+
+
+def _portfolio_child_changed(mapper, connection, target):
+    _invalidate_after_commit(target, target.portfolio_id)
+
+
+def _environment_changed(mapper, connection, target):
+    _invalidate_after_commit(
+        target,
+        connection.scalar(
+            select([Application.portfolio_id]).where(
+                Application.id == target.application_id
+            )
+        ),
+    )
+
+
+for mapper_event in ["after_insert", "after_update", "after_delete"]:
+    event.listen(Portfolio, mapper_event, _portfolio_changed)
+    event.listen(Application, mapper_event, _portfolio_child_changed)
+    event.listen(Environment, mapper_event, _environment_changed)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_report_cache(session):
+    portfolio_ids = session.info.pop(INVALIDATED_PORTFOLIOS_KEY, set())
+    if portfolio_ids and has_app_context():
+        cache = ReportCache.from_app()
+        for portfolio_id in portfolio_ids:
+            cache.invalidate(portfolio_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_report_cache_invalidations(session):
+    session.info.pop(INVALIDATED_PORTFOLIOS_KEY, None)
@@ -0,0 +1,125 @@
+from datetime import timedelta
+
+from pendulum import today
+from sqlalchemy import func
+from sqlalchemy.orm import aliased
+
+from atst.database import db
+from atst.models import (
+    Application,
+    CLIN,
+    DailySpend,
+    Environment,
+    Portfolio,
+    TaskOrder,
+)
+from atst.models.task_order import Status as TaskOrderStatus
+
+
+class SpendAnalytics(object):
+    """
+    Funding and spend figures for every portfolio, for CCPO. All figures,
+    including the derived ones, are computed by a single grouped query so
+    that sorting and pagination happen in the database:
+
+    - obligated_funds and total_funds: summed over the CLINs of the
+      portfolio's active task orders, as on the portfolio's reports page
+    - funding_end_date: `Portfolio.funding_end_date`
+    - total_spend: all spend recorded in DailySpend
+    - burn_rate: average spend per day over the last `BURN_RATE_DAYS` days
+    - remaining_funds: obligated funds less total spend
+    - days_to_funding_expiration: days until funding_end_date
+    - days_of_funding_remaining: days until the remaining funds run out at
+      the current burn rate, or None when nothing is being spent
+    """
+
+    BURN_RATE_DAYS = 30
+    COLUMNS = [
+        "portfolio_id",
+        "name",
+        "obligated_funds",
+        "total_funds",
+        "total_spend",
+        "burn_rate",
+        "remaining_funds",
+        "funding_end_date",
+        "days_to_funding_expiration",
+        "days_of_funding_remaining",
+    ]
+    SORTS = [
+        "burn_rate",
+        "remaining_funds",
+        "days_to_funding_expiration",
+        "days_of_funding_remaining",
+        "name",
+    ]
+
+    @classmethod
+    def portfolio_spend(cls, sort="burn_rate", descending=True, as_of=None):
+        """
+        Return a query of one row per portfolio with the attributes in
+        `COLUMNS`, ordered by `sort`, one of `SORTS`. Portfolios without a
+        value for the sort column come last.
+        """
+        if sort not in cls.SORTS:
+            raise ValueError("Cannot sort spend analytics by {}".format(sort))
+
+        as_of = as_of or today(tz="UTC").date()
+        burn_rate_start = as_of - timedelta(days=cls.BURN_RATE_DAYS)
+
+        # TaskOrder.status has subqueries on clins correlated to task_orders
+        clin = aliased(CLIN)
+        funding = (
+            db.session.query(
+                TaskOrder.portfolio_id.label("portfolio_id"),
+                func.sum(clin.obligated_amount).label("obligated_funds"),
+                func.sum(clin.total_amount).label("total_funds"),
+            )
+            .join(clin, clin.task_order_id == TaskOrder.id)
+            .filter(TaskOrder.status == TaskOrderStatus.ACTIVE)
+            .group_by(TaskOrder.portfolio_id)
+            .subquery()
+        )
+
+        spend = (
+            db.session.query(
+                Application.portfolio_id.label("portfolio_id"),
+                func.sum(DailySpend.amount).label("total_spend"),
+                func.sum(DailySpend.amount)
+                .filter(DailySpend.date > burn_rate_start, DailySpend.date <= as_of)
+                .label("recent_spend"),
+            )
+            .join(Environment, DailySpend.environment_id == Environment.id)
+            .join(Application, Environment.application_id == Application.id)
+            .group_by(Application.portfolio_id)
+            .subquery()
+        )
+
+        obligated_funds = func.coalesce(funding.c.obligated_funds, 0)
+        total_spend = func.coalesce(spend.c.total_spend, 0)
+        burn_rate = func.coalesce(spend.c.recent_spend, 0) / cls.BURN_RATE_DAYS
+        remaining_funds = obligated_funds - total_spend
+        columns = {
+            "portfolio_id": Portfolio.id,
+            "name": Portfolio.name,
+            "obligated_funds": obligated_funds,
+            "total_funds": func.coalesce(funding.c.total_funds, 0),
+            "total_spend": total_spend,
+            "burn_rate": func.round(burn_rate, 2),
+            "remaining_funds": remaining_funds,
+            "funding_end_date": Portfolio.funding_end_date,
+            "days_to_funding_expiration": Portfolio.funding_end_date - as_of,
+            "days_of_funding_remaining": func.floor(
+                remaining_funds / func.nullif(burn_rate, 0)
+            ),
+        }
+
+        order = columns[sort].desc() if descending else columns[sort].asc()
+
+        return (
+            db.session.query(*[columns[name].label(name) for name in cls.COLUMNS])
+            .outerjoin(funding, funding.c.portfolio_id == Portfolio.id)
+            .outerjoin(spend, spend.c.portfolio_id == Portfolio.id)
+            .filter(Portfolio.deleted == False)
+            .order_by(order.nullslast(), Portfolio.name, Portfolio.id)
+        )
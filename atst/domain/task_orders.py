@@ -1,10 +1,27 @@
 import datetime
 
+from flask import current_app as app
+from sqlalchemy import bindparam, func
+from sqlalchemy.orm import selectinload
+
 from atst.database import db
 from atst.models.clin import CLIN
-from atst.models.task_order import TaskOrder, SORT_ORDERING
+from atst.models.task_order import TaskOrder, SORT_ORDERING, Status
 from . import BaseDomainClass
-from atst.utils import commit_or_raise_already_exists_error
+from atst.utils import (
+    commit_or_raise_already_exists_error,
+    flush_or_raise_already_exists_error,
+    pick,
+)
+
+CLIN_ATTRIBUTES = [
+    "number",
+    "start_date",
+    "end_date",
+    "total_amount",
+    "obligated_amount",
+    "jedi_clin_type",
+]
 
 
 class TaskOrders(BaseDomainClass):
@@ -15,8 +32,9 @@ class TaskOrders(BaseDomainClass):
     def create(cls, portfolio_id, number, clins, pdf):
         task_order = TaskOrder(portfolio_id=portfolio_id, number=number, pdf=pdf)
         db.session.add(task_order)
+        flush_or_raise_already_exists_error(message="task_order")
+        TaskOrders.replace_clins(task_order, clins)
         commit_or_raise_already_exists_error(message="task_order")
-        TaskOrders.create_clins(task_order.id, clins)
         return task_order
 
     @classmethod
@@ -25,10 +43,7 @@ class TaskOrders(BaseDomainClass):
         task_order.pdf = pdf
 
         if len(clins) > 0:
-            for clin in task_order.clins:
-                db.session.delete(clin)
-
-            TaskOrders.create_clins(task_order_id, clins)
+            TaskOrders.replace_clins(task_order, clins)
 
         if number != task_order.number:
             task_order.number = number
@@ -49,18 +64,80 @@ class TaskOrders(BaseDomainClass):
 
     @classmethod
     def create_clins(cls, task_order_id, clin_list):
+        TaskOrders._insert_clins(task_order_id, clin_list)
+        TaskOrders._touch(TaskOrders.get(task_order_id))
+        db.session.commit()
+
+    @classmethod
+    def replace_clins(cls, task_order, clin_list):
+        """
+        Make the task order's CLINs match `clin_list` without committing.
+        Submitted CLINs are matched to existing CLINs by number: unmatched
+        submissions are inserted, matched CLINs are updated if any of their
+        values changed and unmatched CLINs are deleted. Each kind of write is
+        a single statement, executed with executemany for inserts and updates.
+        """
+        existing = {}
+        for clin in sorted(task_order.clins, key=lambda clin: clin.time_created):
+            existing.setdefault(clin.number, []).append(clin)
+
+        inserts = []
+        updates = []
         for clin_data in clin_list:
-            clin = CLIN(
-                task_order_id=task_order_id,
-                number=clin_data["number"],
-                start_date=clin_data["start_date"],
-                end_date=clin_data["end_date"],
-                total_amount=clin_data["total_amount"],
-                obligated_amount=clin_data["obligated_amount"],
-                jedi_clin_type=clin_data["jedi_clin_type"],
+            values = pick(CLIN_ATTRIBUTES, clin_data)
+            matches = existing.get(values["number"])
+            if not matches:
+                inserts.append(values)
+                continue
+
+            clin = matches.pop(0)
+            if TaskOrders._clin_changed(clin, values):
+                updates.append({"clin_id": clin.id, **values})
+
+        deletes = [clin.id for clins in existing.values() for clin in clins]
+
+        clins = CLIN.__table__
+        if deletes:
+            db.session.execute(clins.delete().where(clins.c.id.in_(deletes)))
+        if updates:
+            db.session.execute(
+                clins.update().where(clins.c.id == bindparam("clin_id")), updates
             )
-            db.session.add(clin)
-            db.session.commit()
+        TaskOrders._insert_clins(task_order.id, inserts)
+
+        if inserts or updates or deletes:
+            db.session.expire(task_order, ["clins"])
+            TaskOrders._touch(task_order)
+
+    @classmethod
+    def _insert_clins(cls, task_order_id, clin_list):
+        if clin_list:
+            db.session.execute(
+                CLIN.__table__.insert(),
+                [
+                    {"task_order_id": task_order_id, **pick(CLIN_ATTRIBUTES, clin)}
+                    for clin in clin_list
+                ],
+            )
+
+    @classmethod
+    def _clin_changed(cls, clin, values):
+        for attribute, value in values.items():
+            current = getattr(clin, attribute)
+            if attribute == "jedi_clin_type":
+                current, value = current.name, getattr(value, "name", value)
+            if current != value:
+                return True
+
+        return False
+
+    @classmethod
+    def _touch(cls, task_order):
+        # The bulk CLIN writes skip the CLIN mapper events. Updating the task
+        # order runs its own, which maintain the portfolio's funding end
+        # date and funding summary and invalidate its cached reports.
+        task_order.time_updated = func.now()
+        db.session.add(task_order)
 
     @classmethod
     def sort_by_status(cls, task_orders):
@@ -71,6 +148,34 @@ class TaskOrders(BaseDomainClass):
 
         return by_status
 
+    @classmethod
+    def by_status(cls, portfolio_id):
+        """
+        Return the portfolio's task orders grouped like `sort_by_status`,
+        with their statuses computed by the database.
+        """
+        by_status = {status.value: [] for status in SORT_ORDERING}
+        query = (
+            db.session.query(TaskOrder, TaskOrder.status)
+            .options(selectinload(TaskOrder.clins))
+            .filter(TaskOrder.portfolio_id == portfolio_id)
+            .order_by(TaskOrder.time_created)
+        )
+
+        for task_order, status in query:
+            if status is None:
+                # Only a signed task order without CLINs has no start or end
+                # date to compare with; like a draft, it needs its CLINs.
+                app.logger.warning(
+                    "Task order {} has no status; listing it as a draft".format(
+                        task_order.id
+                    )
+                )
+                status = Status.DRAFT
+            by_status[status.value].append(task_order)
+
+        return by_status
+
     @classmethod
     def delete(cls, task_order_id):
         task_order = TaskOrders.get(task_order_id)
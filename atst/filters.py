@@ -28,7 +28,7 @@ def with_extra_params(url, **params):
     parsed_url = urlparse(url)
     parsed_params = parse_qs(parsed_url.query)
     new_params = {**parsed_params, **params}
-    parsed_url = parsed_url._replace(query=urlencode(new_params))
+    parsed_url = parsed_url._replace(query=urlencode(new_params, doseq=True))
     return urlunparse(parsed_url)
 
 
@@ -1,21 +1,35 @@
+from celery import chain
 from flask import current_app as app
 import pendulum
+import time
 
 from atst.database import db
 from atst.queue import celery
-from atst.models import EnvironmentRole, JobFailure
+from atst.models import Application, EnvironmentRole, JobAttemptStatus, JobFailure
 from atst.domain.csp.cloud.exceptions import GeneralCSPException
 from atst.domain.csp.cloud import CloudProviderInterface
 from atst.domain.applications import Applications
+from atst.domain.cost_exports import CostExports
 from atst.domain.environments import Environments
-from atst.domain.portfolios import Portfolios
+from atst.domain.portfolios import Portfolios, PortfolioFundingSummaries
 from atst.domain.environment_roles import EnvironmentRoles
-from atst.models.utils import claim_for_update
+from atst.domain.job_failures import JobFailures, write_telemetry
+from atst.models.utils import claim_for_update, claim_many_for_update
 from atst.utils.localization import translate
-from atst.domain.csp.cloud.models import ApplicationCSPPayload
+from atst.domain.csp.cloud.models import (
+    ApplicationCSPPayload,
+    ApplicationOperationCSPResult,
+    ApplicationVerificationCSPPayload,
+    PortfolioPoliciesCSPPayload,
+)
 
 
-class RecordFailure(celery.Task):
+class RecordAttempt(celery.Task):
+    """
+    Base class of every task in this module: records each attempt, with its
+    outcome and duration, through `JobFailures.record_attempt`.
+    """
+
     _ENTITIES = [
         "portfolio_id",
         "application_id",
@@ -23,28 +37,88 @@ class RecordFailure(celery.Task):
         "environment_role_id",
     ]
 
+    _ENTITY_LISTS = {"application_ids": "application"}
+
     def _derive_entity_info(self, kwargs):
-        matches = [e for e in self._ENTITIES if e in kwargs.keys()]
+        """
+        Return the entities a task was run for: the first of `_ENTITIES`
+        given in its kwargs, or every id of a bulk task's `_ENTITY_LISTS`
+        kwarg.
+        """
+        matches = [e for e in self._ENTITIES if kwargs.get(e) is not None]
         if matches:
             match = matches[0]
-            return {"entity": match.replace("_id", ""), "entity_id": kwargs[match]}
-        else:
-            return None
+            return [{"entity": match.replace("_id", ""), "entity_id": kwargs[match]}]
+
+        for key, entity in self._ENTITY_LISTS.items():
+            if kwargs.get(key):
+                return [
+                    {"entity": entity, "entity_id": entity_id}
+                    for entity_id in kwargs[key]
+                ]
+
+        return []
+
+    def __call__(self, *args, **kwargs):
+        self.request.started_at = time.monotonic()
+        return super().__call__(*args, **kwargs)
+
+    def _attempt_info(self, task_id, exc=None):
+        started_at = getattr(self.request, "started_at", None)
+        return {
+            "task_id": task_id,
+            "task_name": self.name,
+            "attempt": self.request.retries or 0,
+            "duration": time.monotonic() - started_at if started_at else None,
+            "exception_type": type(exc).__name__ if exc is not None else None,
+            "csp_operation": getattr(exc, "csp_operation", None),
+        }
+
+    def _record_attempt(self, status, task_id, kwargs, exc=None):
+        infos = self._derive_entity_info(kwargs) or [{}]
+        for info in infos:
+            entity_id = info.get("entity_id")
+            JobFailures.record_attempt(
+                status=status,
+                entity=info.get("entity"),
+                entity_id=str(entity_id) if entity_id is not None else None,
+                **self._attempt_info(task_id, exc=exc),
+            )
+
+    def on_success(self, retval, task_id, args, kwargs):
+        self._record_attempt(JobAttemptStatus.SUCCEEDED, task_id, kwargs)
+
+    def on_retry(self, exc, task_id, args, kwargs, einfo):
+        self._record_attempt(JobAttemptStatus.RETRIED, task_id, kwargs, exc=exc)
 
     def on_failure(self, exc, task_id, args, kwargs, einfo):
-        info = self._derive_entity_info(kwargs)
-        if info:
-            failure = JobFailure(**info, task_id=task_id)
-            db.session.add(failure)
-            db.session.commit()
+        self._record_attempt(JobAttemptStatus.FAILED, task_id, kwargs, exc=exc)
+
+
+class RecordFailure(RecordAttempt):
+    """
+    Base class of the provisioning tasks: also records a `JobFailure` for
+    each entity a task was run for when it fails for good.
+    """
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        infos = self._derive_entity_info(kwargs)
+        if infos:
+            attempt_info = self._attempt_info(task_id, exc=exc)
+            write_telemetry(
+                JobFailure.__table__.insert(),
+                [{**info, **attempt_info} for info in infos],
+            )
 
+        super().on_failure(exc, task_id, args, kwargs, einfo)
 
-@celery.task(ignore_result=True)
+
+@celery.task(ignore_result=True, base=RecordAttempt)
 def send_mail(recipients, subject, body):
     app.mailer.send(recipients, subject, body)
 
 
-@celery.task(ignore_result=True)
+@celery.task(ignore_result=True, base=RecordAttempt)
 def send_notification_mail(recipients, subject, body):
     app.logger.info(
         "Sending a notification to these recipients: {}\n\nSubject: {}\n\n{}".format(
@@ -54,7 +128,63 @@ def send_notification_mail(recipients, subject, body):
     app.mailer.send(recipients, subject, body)
 
 
+@celery.task(ignore_result=True, base=RecordAttempt)
+def ingest_cost_export(path, period_start, period_end, format="csv"):
+    with open(path, newline="") as export:
+        result = CostExports.ingest(
+            export,
+            pendulum.parse(period_start).date(),
+            pendulum.parse(period_end).date(),
+            format=format,
+        )
+    app.logger.info(
+        "Ingested cost export {}: {} rows, {} skipped".format(
+            path, result.rows, result.skipped
+        )
+    )
+
+
+def _application_payload(application):
+    csp_details = application.portfolio.csp_data
+    return ApplicationCSPPayload(
+        tenant_id=csp_details.get("tenant_id"),
+        display_name=application.name,
+        parent_id=csp_details.get("root_management_group_id"),
+    )
+
+
+def _record_application_result(application, app_result):
+    """
+    Save the outcome of creating an application's management group. While the
+    CSP is still working on it, the operation is kept in the application's
+    `csp_data` and the number of seconds to wait before checking again is
+    returned.
+    """
+    if isinstance(app_result, ApplicationOperationCSPResult):
+        poll_after = pendulum.now().add(seconds=app_result.retry_after)
+        application.csp_data = {
+            **(application.csp_data or {}),
+            "operation_url": app_result.operation_url,
+            "poll_after": poll_after.isoformat(),
+        }
+        db.session.add(application)
+        return app_result.retry_after
+
+    application.cloud_id = app_result.id
+    application.csp_data = {
+        key: value
+        for key, value in (application.csp_data or {}).items()
+        if key not in ("operation_url", "poll_after")
+    }
+    db.session.add(application)
+
+
 def do_create_application(csp: CloudProviderInterface, application_id=None):
+    """
+    Start creating the application's management group, or check on a
+    creation that is already under way. Returns the number of seconds to wait
+    before checking again while the CSP is still working on it.
+    """
     application = Applications.get(application_id)
 
     with claim_for_update(application) as application:
@@ -62,18 +192,105 @@ def do_create_application(csp: CloudProviderInterface, application_id=None):
         if application.cloud_id:
             return
 
-        csp_details = application.portfolio.csp_data
-        parent_id = csp_details.get("root_management_group_id")
-        tenant_id = csp_details.get("tenant_id")
-        payload = ApplicationCSPPayload(
-            tenant_id=tenant_id, display_name=application.name, parent_id=parent_id
+        operation_url = (application.csp_data or {}).get("operation_url")
+
+        if operation_url:
+            app_result = csp.create_application_verification(
+                ApplicationVerificationCSPPayload(
+                    tenant_id=application.portfolio.csp_data.get("tenant_id"),
+                    operation_url=operation_url,
+                )
+            )
+        else:
+            app_result = csp.create_application(_application_payload(application))
+
+        retry_after = _record_application_result(application, app_result)
+        db.session.commit()
+
+        return retry_after
+
+
+def do_create_applications(csp: CloudProviderInterface, application_ids=None):
+    """
+    Start creating the management groups of several applications with one
+    bulk CSP call. Creations the CSP is still working on are handed to
+    `create_application` to check on later, as are applications whose
+    creation was already under way. Successful results are saved even if
+    others failed; the first failure is then re-raised so that the task is
+    retried for the applications that are still pending.
+    """
+    failures = []
+    with claim_many_for_update(
+        Application, application_ids, where=Application.cloud_id.is_(None)
+    ) as applications:
+        in_progress = [
+            application
+            for application in applications
+            if not application.cloud_id
+            and (application.csp_data or {}).get("operation_url")
+        ]
+        to_create = [
+            application
+            for application in applications
+            if not application.cloud_id
+            and not (application.csp_data or {}).get("operation_url")
+        ]
+
+        results = (
+            csp.create_applications(
+                [_application_payload(application) for application in to_create]
+            )
+            if to_create
+            else []
         )
 
-        app_result = csp.create_application(payload)
-        application.cloud_id = app_result.id
-        db.session.add(application)
+        scheduled = [(application, 0) for application in in_progress]
+        for application, app_result in zip(to_create, results):
+            if isinstance(app_result, Exception):
+                failures.append(app_result)
+                continue
+
+            retry_after = _record_application_result(application, app_result)
+            if retry_after:
+                scheduled.append((application, retry_after))
+
         db.session.commit()
 
+    for application, retry_after in scheduled:
+        create_application.apply_async(
+            kwargs={"application_id": application.id}, countdown=retry_after
+        )
+
+    if failures:
+        raise failures[0]
+
+
+def do_create_portfolio_policies(csp: CloudProviderInterface, portfolio_id=None):
+    """
+    Define and assign the portfolio policies on the portfolio's root
+    management group. Every policy is attempted; if any of them failed, the
+    first failure is re-raised so that the task is retried. Definitions and
+    assignments are idempotent, so a retry may repeat the ones that succeeded.
+    """
+    portfolio = Portfolios.get_for_update(portfolio_id)
+    csp_data = portfolio.csp_data or {}
+    if csp_data.get("policies_assigned"):
+        return
+
+    results = csp.create_portfolio_policies(
+        PortfolioPoliciesCSPPayload(
+            tenant_id=csp_data.get("tenant_id"),
+            management_group_id=csp_data.get("root_management_group_id"),
+        )
+    )
+    failures = [result for result in results if isinstance(result, Exception)]
+    if failures:
+        raise failures[0]
+
+    portfolio.csp_data = {**csp_data, "policies_assigned": True}
+    db.session.add(portfolio)
+    db.session.commit()
+
 
 def do_create_environment(csp: CloudProviderInterface, environment_id=None):
     environment = Environments.get(environment_id)
@@ -114,6 +331,10 @@ def do_create_atat_admin_user(csp: CloudProviderInterface, environment_id=None):
     environment = Environments.get(environment_id)
 
     with claim_for_update(environment) as environment:
+
+        if environment.root_user_info is not None:
+            return
+
         atat_root_creds = csp.root_creds()
 
         atat_remote_root_user = csp.create_atat_admin_user(
@@ -128,6 +349,48 @@ def render_email(template_path, context):
     return app.jinja_env.get_template(template_path).render(context)
 
 
+def _funding_expiration_notice_days():
+    notice_days = str(app.config.get("FUNDING_EXPIRATION_NOTICE_DAYS", "30,7,1"))
+    return sorted(int(days) for days in notice_days.split(","))
+
+
+def do_send_funding_expiration_notifications(portfolio_ids):
+    """
+    Notify the owners of the given portfolios that still need a notice.
+    Each portfolio is checked again, and locked, right before its owner is
+    notified, so a batch that is redelivered or overlaps with a later run
+    does not send the same notice twice.
+    """
+    today = pendulum.today(tz="UTC").date()
+    notice_days = _funding_expiration_notice_days()
+    for portfolio_id in portfolio_ids:
+        if not Portfolios.get_portfolios_pending_funding_expiration_notice(
+            notice_days, today, portfolio_id=portfolio_id, lock=True
+        ):
+            db.session.commit()
+            continue
+
+        portfolio = Portfolios.get_with_owners([portfolio_id])[0]
+        if portfolio.owner is None:
+            db.session.commit()
+            continue
+
+        days = (portfolio.funding_end_date - today).days
+        body = render_email(
+            "emails/portfolio/funding_expiration.txt",
+            {"portfolio": portfolio, "days": days},
+        )
+        app.mailer.send(
+            [portfolio.owner.email],
+            translate("email.funding_expiration", {"days": days}),
+            body,
+        )
+        Portfolios.record_funding_expiration_notice(
+            portfolio, min((n for n in notice_days if days <= n), default=days)
+        )
+        db.session.commit()
+
+
 def do_provision_user(csp: CloudProviderInterface, environment_role_id=None):
     environment_role = EnvironmentRoles.get_by_id(environment_role_id)
 
@@ -143,27 +406,130 @@ def do_provision_user(csp: CloudProviderInterface, environment_role_id=None):
         db.session.commit()
 
 
+def do_provision_users(csp: CloudProviderInterface, environment_id=None):
+    """
+    Provision every pending environment role in an environment with a single
+    bulk CSP call. Roles that were provisioned are marked completed even if
+    others failed; the first failure is then re-raised so that the task is
+    retried for the roles that are still pending.
+    """
+    environment = Environments.get(environment_id)
+    environment_role_ids = EnvironmentRoles.get_environment_roles_pending_creation(
+        environment_id
+    )
+    if not environment_role_ids:
+        return
+
+    failures = []
+    # another task may have provisioned some of the roles since they were read
+    with claim_many_for_update(
+        EnvironmentRole,
+        environment_role_ids,
+        where=EnvironmentRole.status == EnvironmentRole.Status.PENDING,
+    ) as environment_roles:
+        if not environment_roles:
+            return
+
+        results = csp.create_or_update_users(
+            environment.csp_credentials,
+            [
+                (environment_role, environment_role.role)
+                for environment_role in environment_roles
+            ],
+        )
+        for environment_role, result in zip(environment_roles, results):
+            if isinstance(result, Exception):
+                failures.append(result)
+                continue
+
+            environment_role.csp_user_id = result
+            environment_role.status = EnvironmentRole.Status.COMPLETED
+            db.session.add(environment_role)
+
+        db.session.commit()
+
+    if failures:
+        raise failures[0]
+
+
+class CSPOperationRecorder(object):
+    """
+    Wraps a cloud provider so that an exception raised by one of its methods
+    carries the method's name as `csp_operation`, for `RecordFailure`.
+    """
+
+    def __init__(self, csp):
+        self._csp = csp
+
+    def __getattr__(self, name):
+        attr = getattr(self._csp, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            try:
+                return attr(*args, **kwargs)
+            except Exception as exc:
+                if not getattr(exc, "csp_operation", None):
+                    exc.csp_operation = name
+                raise
+
+        return call
+
+
 def do_work(fn, task, csp, **kwargs):
     try:
-        fn(csp, **kwargs)
+        return fn(CSPOperationRecorder(csp), **kwargs)
     except GeneralCSPException as e:
         raise task.retry(exc=e)
 
 
 def do_provision_portfolio(csp: CloudProviderInterface, portfolio_id=None):
+    """
+    Advance the portfolio through as many consecutive stages as possible.
+    Returns the number of seconds to wait before the next stage, if the CSP
+    asked for one.
+    """
     portfolio = Portfolios.get_for_update(portfolio_id)
     fsm = Portfolios.get_or_create_state_machine(portfolio)
-    fsm.trigger_next_transition()
+    return fsm.advance()
 
 
 @celery.task(bind=True, base=RecordFailure)
 def provision_portfolio(self, portfolio_id=None):
-    do_work(do_provision_portfolio, self, app.csp.cloud, portfolio_id=portfolio_id)
+    retry_after = do_work(
+        do_provision_portfolio, self, app.csp.cloud, portfolio_id=portfolio_id
+    )
+    if retry_after:
+        provision_portfolio.apply_async(
+            kwargs={"portfolio_id": portfolio_id}, countdown=retry_after
+        )
 
 
 @celery.task(bind=True, base=RecordFailure)
 def create_application(self, application_id=None):
-    do_work(do_create_application, self, app.csp.cloud, application_id=application_id)
+    retry_after = do_work(
+        do_create_application, self, app.csp.cloud, application_id=application_id
+    )
+    if retry_after:
+        # check on the management group later instead of holding this worker
+        create_application.apply_async(
+            kwargs={"application_id": application_id}, countdown=retry_after
+        )
+
+
+@celery.task(bind=True, base=RecordFailure)
+def create_applications(self, application_ids=None):
+    do_work(
+        do_create_applications, self, app.csp.cloud, application_ids=application_ids
+    )
+
+
+@celery.task(bind=True, base=RecordFailure)
+def create_portfolio_policies(self, portfolio_id=None):
+    do_work(
+        do_create_portfolio_policies, self, app.csp.cloud, portfolio_id=portfolio_id
+    )
 
 
 @celery.task(bind=True, base=RecordFailure)
@@ -178,37 +544,82 @@ def create_atat_admin_user(self, environment_id=None):
     )
 
 
-@celery.task(bind=True)
+@celery.task(bind=True, base=RecordAttempt)
 def provision_user(self, environment_role_id=None):
     do_work(
         do_provision_user, self, app.csp.cloud, environment_role_id=environment_role_id
     )
 
 
-@celery.task(bind=True)
-def dispatch_provision_portfolio(self):
+@celery.task(bind=True, base=RecordFailure)
+def provision_users(self, environment_id=None):
+    do_work(do_provision_users, self, app.csp.cloud, environment_id=environment_id)
+
+
+def environment_pipeline(environment_id):
     """
-    Iterate over portfolios with a corresponding State Machine that have not completed.
+    Chain the provisioning steps for a single environment so that each step
+    is scheduled as soon as the previous one succeeds. Every step is
+    idempotent, so a chain may safely overlap with the reconciliation sweeps.
     """
-    for portfolio_id in Portfolios.get_portfolios_pending_provisioning():
-        provision_portfolio.delay(portfolio_id=portfolio_id)
+    return chain(
+        create_environment.si(environment_id=environment_id),
+        create_atat_admin_user.si(environment_id=environment_id),
+        dispatch_provision_user.si(environment_id=environment_id),
+    )
 
 
-@celery.task(bind=True)
-def dispatch_create_application(self):
-    for application_id in Applications.get_applications_pending_creation():
-        create_application.delay(application_id=application_id)
+@celery.task(bind=True, base=RecordAttempt)
+def dispatch_provision_portfolio(self, portfolio_id=None):
+    """
+    Start provisioning portfolios whose State Machine has not started yet,
+    oldest first. When `portfolio_id` is given, only that portfolio is
+    considered. At most PORTFOLIO_PROVISIONING_CONCURRENCY portfolios are
+    provisioned at once, counting those already in progress; the rest are
+    picked up by a later run. A portfolio whose State Machine has not changed
+    state for PORTFOLIO_PROVISIONING_TIMEOUT seconds no longer counts as in
+    progress and is provisioned again, in case its next step was lost.
+    """
+    concurrency = int(app.config.get("PORTFOLIO_PROVISIONING_CONCURRENCY", 10))
+    timeout = int(app.config.get("PORTFOLIO_PROVISIONING_TIMEOUT", 3600))
+    stalled_before = pendulum.now("UTC").subtract(seconds=timeout)
+    in_progress = Portfolios.count_portfolios_provisioning(stalled_before)
+    limit = concurrency - in_progress
+    if limit <= 0:
+        return
+
+    for id_ in Portfolios.get_portfolios_pending_provisioning(
+        portfolio_id, limit=limit, stalled_before=stalled_before
+    ):
+        provision_portfolio.delay(portfolio_id=id_)
 
 
-@celery.task(bind=True)
-def dispatch_create_environment(self):
-    for environment_id in Environments.get_environments_pending_creation(
-        pendulum.now()
+@celery.task(bind=True, base=RecordAttempt)
+def dispatch_create_application(self, application_id=None):
+    """
+    Create the pending applications of each portfolio with one bulk task.
+    """
+    for ids in Applications.get_applications_pending_creation_by_portfolio(
+        application_id
+    ).values():
+        create_applications.delay(application_ids=ids)
+
+
+@celery.task(bind=True, base=RecordAttempt)
+def dispatch_create_portfolio_policies(self, portfolio_id=None):
+    for id_ in Portfolios.get_portfolios_pending_policies(portfolio_id):
+        create_portfolio_policies.delay(portfolio_id=id_)
+
+
+@celery.task(bind=True, base=RecordAttempt)
+def dispatch_create_environment(self, environment_id=None):
+    for id_ in Environments.get_environments_pending_creation(
+        pendulum.now(), environment_id
     ):
-        create_environment.delay(environment_id=environment_id)
+        environment_pipeline(environment_id=id_).delay()
 
 
-@celery.task(bind=True)
+@celery.task(bind=True, base=RecordAttempt)
 def dispatch_create_atat_admin_user(self):
     for environment_id in Environments.get_environments_pending_atat_user_creation(
         pendulum.now()
@@ -216,9 +627,49 @@ def dispatch_create_atat_admin_user(self):
         create_atat_admin_user.delay(environment_id=environment_id)
 
 
-@celery.task(bind=True)
-def dispatch_provision_user(self):
-    for (
-        environment_role_id
-    ) in EnvironmentRoles.get_environment_roles_pending_creation():
-        provision_user.delay(environment_role_id=environment_role_id)
+@celery.task(bind=True, base=RecordAttempt)
+def dispatch_provision_user(self, environment_id=None):
+    for id_ in EnvironmentRoles.get_environments_with_roles_pending_creation(
+        environment_id
+    ):
+        provision_users.delay(environment_id=id_)
+
+
+@celery.task(bind=True, base=RecordAttempt)
+def send_funding_expiration_notifications(self, portfolio_ids):
+    do_send_funding_expiration_notifications(portfolio_ids=portfolio_ids)
+
+
+@celery.task(bind=True, base=RecordAttempt)
+def dispatch_send_funding_expiration_notifications(self):
+    """
+    Notify the owners of portfolios whose funding ends within one of the
+    FUNDING_EXPIRATION_NOTICE_DAYS thresholds, once per threshold and
+    funding end date, so that a missed day is caught up on the next run.
+    Meant to run once a day; the notifications are sent by one task per
+    FUNDING_EXPIRATION_NOTIFICATION_BATCH_SIZE portfolios.
+    """
+    batch_size = int(app.config.get("FUNDING_EXPIRATION_NOTIFICATION_BATCH_SIZE", 100))
+
+    portfolio_ids = Portfolios.get_portfolios_pending_funding_expiration_notice(
+        _funding_expiration_notice_days(), pendulum.today(tz="UTC").date()
+    )
+    for i in range(0, len(portfolio_ids), batch_size):
+        send_funding_expiration_notifications.delay(
+            portfolio_ids=portfolio_ids[i : i + batch_size]
+        )
+
+
+@celery.task(bind=True, base=RecordAttempt)
+def refresh_funding_summary(self, portfolio_id=None):
+    PortfolioFundingSummaries.refresh(Portfolios.get_for_update(portfolio_id))
+
+
+@celery.task(bind=True, base=RecordAttempt)
+def dispatch_refresh_funding_summaries(self):
+    """
+    Recompute the funding summaries that went stale at midnight, since
+    whether a task order is active depends on the date.
+    """
+    for id_ in PortfolioFundingSummaries.get_portfolios_pending_refresh():
+        refresh_funding_summary.delay(portfolio_id=id_)
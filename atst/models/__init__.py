@@ -5,14 +5,18 @@ from .application_role import ApplicationRole, Status as ApplicationRoleStatus
 from .attachment import Attachment
 from .audit_event import AuditEvent
 from .clin import CLIN, JEDICLINType
+from .daily_spend import DailySpend
 from .environment import Environment
 from .environment_role import EnvironmentRole, CSPRole
-from .job_failure import JobFailure
+from .funding_expiration_notice import FundingExpirationNotice
+from .job_failure import JobFailure, JobAttempt, JobAttemptStatus
 from .notification_recipient import NotificationRecipient
 from .permissions import Permissions
 from .permission_set import PermissionSet
 from .portfolio import Portfolio
+from .portfolio_funding_summary import PortfolioFundingSummary
 from .portfolio_state_machine import PortfolioStateMachine, FSMStates
+from .portfolio_state_transition import PortfolioStateTransition
 from .portfolio_invitation import PortfolioInvitation
 from .portfolio_role import PortfolioRole, Status as PortfolioRoleStatus
 from .task_order import TaskOrder
@@ -1,5 +1,6 @@
 from sqlalchemy import and_, Column, ForeignKey, String, UniqueConstraint, TIMESTAMP
 from sqlalchemy.orm import relationship, synonym
+from sqlalchemy_json import NestedMutableJson
 
 from atst.models.base import Base
 from atst.models.application_role import ApplicationRole
@@ -41,6 +42,7 @@ class Application(
     )
 
     cloud_id = Column(String)
+    csp_data = Column(NestedMutableJson, nullable=True)
     claimed_until = Column(TIMESTAMP(timezone=True))
 
     @property
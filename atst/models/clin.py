@@ -1,7 +1,8 @@
 from enum import Enum
-from sqlalchemy import Column, Date, Enum as SQLAEnum, ForeignKey, Numeric, String
+from sqlalchemy import Column, Date, Enum as SQLAEnum, ForeignKey, Numeric, String, and_
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship
-from datetime import date
+from pendulum import today
 
 from atst.models.base import Base
 import atst.models.mixins as mixins
@@ -20,7 +21,7 @@ class CLIN(Base, mixins.TimestampsMixin):
 
     id = types.Id()
 
-    task_order_id = Column(ForeignKey("task_orders.id"), nullable=False)
+    task_order_id = Column(ForeignKey("task_orders.id"), index=True, nullable=False)
     task_order = relationship("TaskOrder")
 
     number = Column(String, nullable=False)
@@ -63,8 +64,20 @@ class CLIN(Base, mixins.TimestampsMixin):
             if c.name not in ["id"]
         }
 
-    @property
+    @hybrid_property
     def is_active(self):
+        todays_date = today(tz="UTC").date()
         return (
-            self.start_date <= date.today() <= self.end_date
+            self.start_date <= todays_date <= self.end_date
         ) and self.task_order.signed_at
+
+    @is_active.expression
+    def is_active(cls):
+        # TaskOrder imports CLIN, so it is reached through the relationship
+        TaskOrder = cls.task_order.property.mapper.class_
+        todays_date = today(tz="UTC").date()
+        return and_(
+            cls.start_date <= todays_date,
+            cls.end_date >= todays_date,
+            cls.task_order.has(TaskOrder.signed_at.isnot(None)),
+        )
@@ -0,0 +1,47 @@
+from sqlalchemy import (
+    Column,
+    Date,
+    Enum as SQLAEnum,
+    ForeignKey,
+    Index,
+    Integer,
+    Numeric,
+    UniqueConstraint,
+)
+from sqlalchemy.orm import relationship
+
+from atst.models.base import Base
+from atst.models.clin import JEDICLINType
+import atst.models.mixins as mixins
+
+
+class DailySpend(Base, mixins.TimestampsMixin):
+    """
+    An environment's spend against a JEDI CLIN for one day, aggregated from
+    CSP cost exports.
+    """
+
+    __tablename__ = "daily_spend"
+
+    id = Column(Integer(), primary_key=True)
+
+    environment_id = Column(
+        ForeignKey("environments.id", ondelete="CASCADE"), nullable=False
+    )
+    environment = relationship("Environment")
+
+    jedi_clin_type = Column(SQLAEnum(JEDICLINType, native_enum=False), nullable=False)
+    date = Column(Date, nullable=False)
+    amount = Column(Numeric(scale=2), nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint(
+            "environment_id",
+            "jedi_clin_type",
+            "date",
+            name="daily_spend_environment_id_jedi_clin_type_date_key",
+        ),
+    )
+
+
+Index("daily_spend_date", DailySpend.date)
@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Date, ForeignKey, Integer
+from sqlalchemy.dialects.postgresql import UUID
+
+from atst.models.base import Base
+import atst.models.mixins as mixins
+
+
+class FundingExpirationNotice(Base, mixins.TimestampsMixin):
+    """
+    The last funding expiration notice sent to a portfolio's owner: the
+    funding end date it was about and the FUNDING_EXPIRATION_NOTICE_DAYS
+    threshold it was sent for.
+    """
+
+    __tablename__ = "funding_expiration_notices"
+
+    portfolio_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("portfolios.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    funding_end_date = Column(Date, nullable=False)
+    days = Column(Integer(), nullable=False)
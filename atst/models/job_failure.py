@@ -1,5 +1,7 @@
+from enum import Enum
+
 from celery.result import AsyncResult
-from sqlalchemy import Column, String, Integer
+from sqlalchemy import Column, String, Integer, Float, Index, Enum as SQLAEnum
 
 from atst.models.base import Base
 import atst.models.mixins as mixins
@@ -12,6 +14,11 @@ class JobFailure(Base, mixins.TimestampsMixin):
     task_id = Column(String(), nullable=False)
     entity = Column(String(), nullable=False)
     entity_id = Column(String(), nullable=False)
+    task_name = Column(String())
+    exception_type = Column(String())
+    attempt = Column(Integer())
+    duration = Column(Float())
+    csp_operation = Column(String())
 
     @property
     def task(self):
@@ -19,3 +26,31 @@ class JobFailure(Base, mixins.TimestampsMixin):
             self._task = AsyncResult(self.task_id)
 
         return self._task
+
+
+class JobAttemptStatus(Enum):
+    SUCCEEDED = "succeeded"
+    RETRIED = "retried"
+    FAILED = "failed"
+
+
+class JobAttempt(Base, mixins.TimestampsMixin):
+    __tablename__ = "job_attempts"
+
+    id = Column(Integer(), primary_key=True)
+    task_id = Column(String(), nullable=False)
+    task_name = Column(String(), nullable=False)
+    status = Column(SQLAEnum(JobAttemptStatus, native_enum=False), nullable=False)
+    attempt = Column(Integer(), nullable=False, default=0)
+    duration = Column(Float())
+    exception_type = Column(String())
+    csp_operation = Column(String())
+    entity = Column(String())
+    entity_id = Column(String())
+
+
+Index(
+    "job_attempts_task_name_time_created",
+    JobAttempt.task_name,
+    JobAttempt.time_created,
+)
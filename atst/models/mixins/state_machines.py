@@ -105,17 +105,21 @@ class FSMMixin:
         {"trigger": "fail", "source": "*", "dest": FSMStates.FAILED,},
     ]
 
-    def fail_stage(self, stage):
-        fail_trigger = "fail" + stage
-        if fail_trigger in self.machine.get_triggers(self.current_state.name):
-            self.trigger(fail_trigger)
+    def available_triggers(self, state=None):
+        state = state or self.current_state
+        return self.machine.get_triggers(state.name)
+
+    def fail_stage(self, stage, error=None):
+        fail_trigger = "fail_" + stage
+        if fail_trigger in self.available_triggers():
+            self.trigger(fail_trigger, error=error)
             app.logger.info(
                 f"calling fail trigger '{fail_trigger}' for '{self.__repr__()}'"
             )
 
     def finish_stage(self, stage):
         finish_trigger = "finish_" + stage
-        if finish_trigger in self.machine.get_triggers(self.current_state.name):
+        if finish_trigger in self.available_triggers():
             app.logger.info(
                 f"calling finish trigger '{finish_trigger}' for '{self.__repr__()}'"
             )
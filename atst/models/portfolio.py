@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String
+from sqlalchemy import Column, Date, String
 from sqlalchemy.orm import relationship
 from sqlalchemy.types import ARRAY
 from itertools import chain
@@ -36,6 +36,10 @@ class Portfolio(
 
     csp_data = Column(NestedMutableJson, nullable=True)
 
+    # Latest end date of the CLINs of the portfolio's signed task orders.
+    # Maintained by `atst.domain.portfolios.funding_summaries`.
+    funding_end_date = Column(Date, index=True)
+
     applications = relationship(
         "Application",
         back_populates="portfolio",
@@ -0,0 +1,53 @@
+from sqlalchemy import Column, Date, ForeignKey, Integer, Numeric
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import relationship
+from pendulum import today
+
+from atst.models.base import Base
+
+
+class PortfolioFundingSummary(Base):
+    """
+    Funding figures for a portfolio's active task orders, computed on
+    `computed_on`. Since whether a task order is active depends on the date,
+    a summary is only valid on the day it was computed.
+
+    `funding_start_date` is the earliest start of an active task order, but
+    the end of the portfolio's funding is read from `Portfolio.funding_end_date`:
+    the latest CLIN end date of every signed task order, including ones that
+    have not started yet. A portfolio with funding lined up past its active
+    task orders is therefore reported as funded until that later date, unlike
+    `Portfolio.funding_duration`, which only looks at active task orders.
+    """
+
+    __tablename__ = "portfolio_funding_summaries"
+
+    portfolio_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("portfolios.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    portfolio = relationship("Portfolio")
+
+    computed_on = Column(Date, nullable=False)
+    obligated_funds = Column(Numeric(scale=2), nullable=False)
+    total_funds = Column(Numeric(scale=2), nullable=False)
+    active_task_orders = Column(Integer(), nullable=False)
+    active_clins = Column(Integer(), nullable=False)
+    funding_start_date = Column(Date)
+
+    @property
+    def funding_end_date(self):
+        if self.funding_start_date:
+            return self.portfolio.funding_end_date
+
+    @property
+    def funding_duration(self):
+        return (self.funding_start_date, self.funding_end_date)
+
+    @property
+    def days_to_funding_expiration(self):
+        if self.funding_end_date:
+            return (self.funding_end_date - today(tz="UTC").date()).days
+        else:
+            return 0
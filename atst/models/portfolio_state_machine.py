@@ -1,7 +1,9 @@
-import importlib
+from collections import namedtuple
+from functools import lru_cache, partial
 
-from sqlalchemy import Column, ForeignKey, Enum as SQLAEnum
-from sqlalchemy.orm import relationship, reconstructor
+import pendulum
+from sqlalchemy import Column, ForeignKey, Enum as SQLAEnum, Index, func
+from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID
 
 from pydantic import ValidationError as PydanticValidationError
@@ -10,16 +12,102 @@ from transitions.extensions.states import add_state_features, Tags
 
 from flask import current_app as app
 
+from atst.domain.csp.cloud import AzureCloudProvider, MockCloudProvider
 from atst.domain.csp.cloud.exceptions import ConnectionException, UnknownServerException
+from atst.domain.csp.cloud.models import (
+    BillingInstructionCSPPayload,
+    BillingInstructionCSPResult,
+    BillingProfileCreationCSPPayload,
+    BillingProfileCreationCSPResult,
+    BillingProfileTenantAccessCSPPayload,
+    BillingProfileTenantAccessCSPResult,
+    BillingProfileVerificationCSPPayload,
+    BillingProfileVerificationCSPResult,
+    TaskOrderBillingCreationCSPPayload,
+    TaskOrderBillingCreationCSPResult,
+    TaskOrderBillingVerificationCSPPayload,
+    TaskOrderBillingVerificationCSPResult,
+    TenantCSPPayload,
+    TenantCSPResult,
+)
 from atst.database import db
 from atst.models.types import Id
 from atst.models.base import Base
+from atst.models.portfolio_state_transition import PortfolioStateTransition
 import atst.models.mixins as mixins
-from atst.models.mixins.state_machines import FSMStates, AzureStages, _build_transitions
+from atst.models.mixins.state_machines import (
+    FSMMixin,
+    FSMStates,
+    AzureStages,
+    _build_transitions,
+)
+
+
+StageCSPClasses = namedtuple(
+    "StageCSPClasses", ["payload", "result", "method", "retry_after"], defaults=(None,)
+)
+
+STAGE_CSP_CLASSES = {
+    AzureStages.TENANT: StageCSPClasses(
+        TenantCSPPayload, TenantCSPResult, "create_tenant"
+    ),
+    AzureStages.BILLING_PROFILE_CREATION: StageCSPClasses(
+        BillingProfileCreationCSPPayload,
+        BillingProfileCreationCSPResult,
+        "create_billing_profile_creation",
+        retry_after="billing_profile_retry_after",
+    ),
+    AzureStages.BILLING_PROFILE_VERIFICATION: StageCSPClasses(
+        BillingProfileVerificationCSPPayload,
+        BillingProfileVerificationCSPResult,
+        "create_billing_profile_verification",
+    ),
+    AzureStages.BILLING_PROFILE_TENANT_ACCESS: StageCSPClasses(
+        BillingProfileTenantAccessCSPPayload,
+        BillingProfileTenantAccessCSPResult,
+        "create_billing_profile_tenant_access",
+    ),
+    AzureStages.TASK_ORDER_BILLING_CREATION: StageCSPClasses(
+        TaskOrderBillingCreationCSPPayload,
+        TaskOrderBillingCreationCSPResult,
+        "create_task_order_billing_creation",
+        retry_after="task_order_retry_after",
+    ),
+    AzureStages.TASK_ORDER_BILLING_VERIFICATION: StageCSPClasses(
+        TaskOrderBillingVerificationCSPPayload,
+        TaskOrderBillingVerificationCSPResult,
+        "create_task_order_billing_verification",
+    ),
+    AzureStages.BILLING_INSTRUCTION: StageCSPClasses(
+        BillingInstructionCSPPayload,
+        BillingInstructionCSPResult,
+        "create_billing_instruction",
+    ),
+}
+
+
+def _validate_stage_csp_classes(stage_csp_classes, csp_stages, providers):
+    """
+    Make sure that every stage can be dispatched: it needs a payload class,
+    a result class and a method implemented by each cloud provider.
+    """
+    missing_stages = [
+        stage.name for stage in csp_stages if stage not in stage_csp_classes
+    ]
+    if missing_stages:
+        raise ValueError(f"No CSP classes registered for stages {missing_stages}")
+
+    for stage, csp_classes in stage_csp_classes.items():
+        for provider in providers:
+            if not callable(getattr(provider, csp_classes.method, None)):
+                raise ValueError(
+                    f"{provider.__name__} does not implement {csp_classes.method} for stage {stage.name}"
+                )
 
 
-def _stage_to_classname(stage):
-    return "".join(map(lambda word: word.capitalize(), stage.split("_")))
+_validate_stage_csp_classes(
+    STAGE_CSP_CLASSES, AzureStages, [AzureCloudProvider, MockCloudProvider]
+)
 
 
 def get_stage_csp_class(stage, class_type):
@@ -28,13 +116,10 @@ def get_stage_csp_class(stage, class_type):
     class_type is either 'payload' or 'result'
 
     """
-    cls_name = f"{_stage_to_classname(stage)}CSP{class_type.capitalize()}"
     try:
-        return getattr(
-            importlib.import_module("atst.domain.csp.cloud.models"), cls_name
-        )
-    except AttributeError:
-        print("could not import CSP Result class <%s>" % cls_name)
+        return getattr(STAGE_CSP_CLASSES[AzureStages[stage.upper()]], class_type)
+    except KeyError:
+        app.logger.info(f"could not resolve CSP {class_type} class for stage {stage}")
 
 
 @add_state_features(Tags)
@@ -42,6 +127,38 @@ class StateMachineWithTags(Machine):
     pass
 
 
+@lru_cache(maxsize=None)
+def compiled_machine():
+    """
+    The states and transitions are the same for every portfolio, so the
+    machine is built once per process and shared by all state machine rows.
+    No model is attached to it: each row passes itself as the model when it
+    triggers an event, and the row's `state` column holds its current state.
+    """
+    machine = StateMachineWithTags(
+        model=None,
+        send_event=True,
+        initial=FSMStates.UNSTARTED,
+        auto_transitions=False,
+        before_state_change="record_transition",
+        after_state_change="after_state_change",
+    )
+    states, transitions = _build_transitions(AzureStages)
+    machine.add_states(FSMMixin.system_states + states)
+    machine.add_transitions(FSMMixin.system_transitions + transitions)
+    return machine
+
+
+@lru_cache(maxsize=None)
+def compiled_triggers():
+    """
+    The triggers available from each state of the compiled machine, by state
+    name, so that looking them up does not walk every event of the machine.
+    """
+    machine = compiled_machine()
+    return {name: machine.get_triggers(name) for name in machine.states}
+
+
 class PortfolioStateMachine(
     Base,
     mixins.TimestampsMixin,
@@ -64,7 +181,44 @@ class PortfolioStateMachine(
 
     def __init__(self, portfolio, csp=None, **kwargs):
         self.portfolio = portfolio
-        self.attach_machine()
+        self.state = FSMStates.UNSTARTED
+
+    state_transitions = relationship(
+        "PortfolioStateTransition",
+        order_by="PortfolioStateTransition.transitioned_at",
+        lazy="dynamic",
+    )
+
+    def record_transition(self, event):
+        """
+        Called before every state change. The transition is added to the
+        session so that it is committed together with the new state.
+        """
+        if self.id is None:
+            db.session.add(self)
+            db.session.flush()
+
+        transitioned_at = pendulum.now("UTC")
+        entered_at = (
+            db.session.query(func.max(PortfolioStateTransition.transitioned_at))
+            .filter(PortfolioStateTransition.portfolio_state_machine_id == self.id)
+            .scalar()
+        )
+        error = event.kwargs.get("error")
+        db.session.add(
+            PortfolioStateTransition(
+                portfolio_state_machine_id=self.id,
+                portfolio_id=self.portfolio_id,
+                source=event.transition.source,
+                dest=event.transition.dest,
+                trigger=event.event.name,
+                transitioned_at=transitioned_at,
+                duration=(transitioned_at - entered_at).total_seconds()
+                if entered_at
+                else None,
+                error=str(error) if error is not None else None,
+            )
+        )
 
     def after_state_change(self, event):
         db.session.add(self)
@@ -73,22 +227,33 @@ class PortfolioStateMachine(
     def __repr__(self):
         return f"<PortfolioStateMachine(state='{self.current_state.name}', portfolio='{self.portfolio.name}'"
 
-    @reconstructor
-    def attach_machine(self):
-        """
-        This is called as a result of a sqlalchemy query.
-        Attach a machine depending on the current state.
-        """
-        self.machine = StateMachineWithTags(
-            model=self,
-            send_event=True,
-            initial=self.current_state if self.state else FSMStates.UNSTARTED,
-            auto_transitions=False,
-            after_state_change="after_state_change",
+    def __getattr__(self, name):
+        # Events are only bound to a state machine row when one is triggered,
+        # e.g. `state_machine.create_tenant(**kwargs)`, so loading rows does
+        # not touch the machine at all.
+        if not name.startswith("_"):
+            event = compiled_machine().events.get(name)
+            if event is not None:
+                return partial(event.trigger, self)
+
+        raise AttributeError(
+            f"'{type(self).__name__}' object has no attribute '{name}'"
         )
-        states, transitions = _build_transitions(AzureStages)
-        self.machine.add_states(self.system_states + states)
-        self.machine.add_transitions(self.system_transitions + transitions)
+
+    @property
+    def machine(self):
+        return compiled_machine()
+
+    def available_triggers(self, state=None):
+        state = state or self.current_state
+        return compiled_triggers()[state.name]
+
+    def trigger(self, trigger_name, *args, **kwargs):
+        try:
+            event = self.machine.events[trigger_name]
+        except KeyError:
+            raise AttributeError(f"Do not know event named '{trigger_name}'.")
+        return event.trigger(self, *args, **kwargs)
 
     @property
     def current_state(self):
@@ -102,7 +267,7 @@ class PortfolioStateMachine(
         if state_obj.is_system:
             if self.current_state in (FSMStates.UNSTARTED, FSMStates.STARTING):
                 # call the first trigger availabe for these two system states
-                trigger_name = self.machine.get_triggers(self.current_state.name)[0]
+                trigger_name = self.available_triggers()[0]
                 self.trigger(trigger_name, **kwargs)
 
             elif self.current_state == FSMStates.STARTED:
@@ -110,7 +275,7 @@ class PortfolioStateMachine(
                 create_trigger = next(
                     filter(
                         lambda trigger: trigger.startswith("create_"),
-                        self.machine.get_triggers(FSMStates.STARTED.name),
+                        self.available_triggers(FSMStates.STARTED),
                     ),
                     None,
                 )
@@ -128,26 +293,57 @@ class PortfolioStateMachine(
             create_trigger = next(
                 filter(
                     lambda trigger: trigger.startswith("create_"),
-                    self.machine.get_triggers(self.state.name),
+                    self.available_triggers(),
                 ),
                 None,
             )
             if create_trigger is not None:
                 self.trigger(create_trigger, **kwargs)
 
+    @property
+    def retry_after(self):
+        """
+        The number of seconds the CSP asked us to wait before the stage
+        following the current one can be attempted, if any.
+        """
+        state_obj = self.machine.get_state(self.state)
+        if state_obj.is_system or not state_obj.is_CREATED:
+            return None
+
+        csp_classes = STAGE_CSP_CLASSES[AzureStages[state_obj.tags[0]]]
+        if csp_classes.retry_after is None or not self.portfolio.csp_data:
+            return None
+
+        retry_after = self.portfolio.csp_data.get(csp_classes.retry_after)
+        return int(retry_after) if retry_after else None
+
+    def advance(self, **kwargs):
+        """
+        Trigger transitions until the state machine stops moving or the stage
+        it just completed asks for a delay before the next one can start.
+        Returns that delay, in seconds, if there is one.
+        """
+        while True:
+            previous_state = self.current_state
+            self.trigger_next_transition(**kwargs)
+            if self.current_state == previous_state:
+                return None
+
+            retry_after = self.retry_after
+            if retry_after:
+                return retry_after
+
     def after_in_progress_callback(self, event):
         stage = self.current_state.name.split("_IN_PROGRESS")[0].lower()
+        csp_classes = STAGE_CSP_CLASSES[AzureStages[stage.upper()]]
 
-        # Accumulate payload w/ creds
-        payload = event.kwargs.get("csp_data")
+        # Accumulate payload w/ creds, on top of what earlier stages returned
+        payload = dict(self.portfolio.csp_data or {})
+        payload.update(event.kwargs.get("csp_data") or {})
         payload["creds"] = event.kwargs.get("creds")
 
-        payload_data_cls = get_stage_csp_class(stage, "payload")
-        if not payload_data_cls:
-            app.logger.info(f"could not resolve payload data class for stage {stage}")
-            self.fail_stage(stage)
         try:
-            payload_data = payload_data_cls(**payload)
+            payload_data = csp_classes.payload(**payload)
         except PydanticValidationError as exc:
             app.logger.error(
                 f"Payload Validation Error in {self.__repr__()}:", exc_info=1
@@ -155,14 +351,14 @@ class PortfolioStateMachine(
             app.logger.info(exc.json())
             print(exc.json())
             app.logger.info(payload)
-            self.fail_stage(stage)
+            self.fail_stage(stage, error=exc)
+            return
 
         # TODO: Determine best place to do this, maybe @reconstructor
         self.csp = app.csp.cloud
 
         try:
-            func_name = f"create_{stage}"
-            response = getattr(self.csp, func_name)(payload_data)
+            response = getattr(self.csp, csp_classes.method)(payload_data)
             if self.portfolio.csp_data is None:
                 self.portfolio.csp_data = {}
             self.portfolio.csp_data.update(response.dict())
@@ -184,12 +380,12 @@ class PortfolioStateMachine(
             app.logger.info(exc.json())
             print(exc.json())
             app.logger.info(payload_data)
-            self.fail_stage(stage)
+            self.fail_stage(stage, error=exc)
         except (ConnectionException, UnknownServerException) as exc:
             app.logger.error(
                 f"CSP api call. Caught exception for {self.__repr__()}.", exc_info=1,
             )
-            self.fail_stage(stage)
+            self.fail_stage(stage, error=exc)
 
         self.finish_stage(stage)
 
@@ -208,3 +404,6 @@ class PortfolioStateMachine(
     @property
     def application_id(self):
         return None
+
+
+Index("portfolio_state_machines_state", PortfolioStateMachine.state)
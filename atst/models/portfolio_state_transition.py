@@ -0,0 +1,45 @@
+from sqlalchemy import Column, Float, ForeignKey, Index, String, TIMESTAMP
+from sqlalchemy.dialects.postgresql import UUID
+
+from atst.models.base import Base
+from atst.models.types import Id
+
+
+class PortfolioStateTransition(Base):
+    """
+    An append-only record of one transition of a portfolio state machine.
+    `duration` is the number of seconds the state machine spent in the
+    `source` state, when it is known.
+    """
+
+    __tablename__ = "portfolio_state_transitions"
+
+    id = Id()
+
+    portfolio_state_machine_id = Column(
+        UUID(as_uuid=True), ForeignKey("portfolio_state_machines.id"), nullable=False
+    )
+    portfolio_id = Column(UUID(as_uuid=True), ForeignKey("portfolios.id"))
+
+    source = Column(String(), nullable=False)
+    dest = Column(String(), nullable=False)
+    trigger = Column(String(), nullable=False)
+    transitioned_at = Column(TIMESTAMP(timezone=True), nullable=False)
+    duration = Column(Float())
+    error = Column(String())
+
+    def __repr__(self):
+        return f"<PortfolioStateTransition(source='{self.source}', dest='{self.dest}', trigger='{self.trigger}')>"
+
+
+Index(
+    "portfolio_state_transitions_source_transitioned_at",
+    PortfolioStateTransition.source,
+    PortfolioStateTransition.transitioned_at,
+)
+
+Index(
+    "portfolio_state_transitions_machine_transitioned_at",
+    PortfolioStateTransition.portfolio_state_machine_id,
+    PortfolioStateTransition.transitioned_at,
+)
@@ -1,7 +1,20 @@
 from enum import Enum
 from decimal import Decimal
 
-from sqlalchemy import Column, DateTime, ForeignKey, String
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Enum as SQLAEnum,
+    ForeignKey,
+    String,
+    and_,
+    case,
+    exists,
+    func,
+    not_,
+    select,
+    type_coerce,
+)
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship
 
@@ -9,6 +22,7 @@ from atst.models.base import Base
 import atst.models.types as types
 import atst.models.mixins as mixins
 from atst.models.attachment import Attachment
+from atst.models.clin import CLIN
 from pendulum import today
 
 
@@ -34,7 +48,7 @@ class TaskOrder(Base, mixins.TimestampsMixin):
 
     id = types.Id()
 
-    portfolio_id = Column(ForeignKey("portfolios.id"), nullable=False)
+    portfolio_id = Column(ForeignKey("portfolios.id"), index=True, nullable=False)
     portfolio = relationship("Portfolio")
 
     pdf_attachment_id = Column(ForeignKey("attachments.id"))
@@ -91,15 +105,28 @@ class TaskOrder(Base, mixins.TimestampsMixin):
     def clins_are_completed(self):
         return all([len(self.clins), (clin.is_completed for clin in self.clins)])
 
-    @property
+    @hybrid_property
     def is_completed(self):
         return all([self.pdf, self.number, self.clins_are_completed])
 
-    @property
+    @is_completed.expression
+    def is_completed(cls):
+        return and_(
+            cls.pdf_attachment_id.isnot(None),
+            cls.number.isnot(None),
+            cls.number != "",
+            exists().where(CLIN.task_order_id == cls.id),
+        )
+
+    @hybrid_property
     def is_signed(self):
         return self.signed_at is not None
 
-    @property
+    @is_signed.expression
+    def is_signed(cls):
+        return cls.signed_at.isnot(None)
+
+    @hybrid_property
     def status(self):
         todays_date = today(tz="UTC").date()
 
@@ -114,14 +141,55 @@ class TaskOrder(Base, mixins.TimestampsMixin):
         elif self.start_date <= todays_date <= self.end_date:
             return Status.ACTIVE
 
-    @property
+    @status.expression
+    def status(cls):
+        todays_date = today(tz="UTC").date()
+
+        return type_coerce(
+            case(
+                [
+                    (
+                        and_(not_(cls.is_completed), not_(cls.is_signed)),
+                        Status.DRAFT.name,
+                    ),
+                    (not_(cls.is_signed), Status.UNSIGNED.name),
+                    (cls.start_date > todays_date, Status.UPCOMING.name),
+                    (cls.end_date < todays_date, Status.EXPIRED.name),
+                    (
+                        and_(
+                            cls.start_date <= todays_date, cls.end_date >= todays_date
+                        ),
+                        Status.ACTIVE.name,
+                    ),
+                ]
+            ),
+            SQLAEnum(Status, native_enum=False),
+        )
+
+    @hybrid_property
     def start_date(self):
         return min((c.start_date for c in self.clins), default=None)
 
-    @property
+    @start_date.expression
+    def start_date(cls):
+        return (
+            select([func.min(CLIN.start_date)])
+            .where(CLIN.task_order_id == cls.id)
+            .as_scalar()
+        )
+
+    @hybrid_property
     def end_date(self):
         return max((c.end_date for c in self.clins), default=None)
 
+    @end_date.expression
+    def end_date(cls):
+        return (
+            select([func.max(CLIN.end_date)])
+            .where(CLIN.task_order_id == cls.id)
+            .as_scalar()
+        )
+
     @property
     def days_to_expiration(self):
         if self.end_date:
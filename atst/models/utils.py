@@ -48,3 +48,58 @@ def claim_for_update(resource, minutes=30):
             Model.claimed_until != None
         ).update({"claimed_until": None}, synchronize_session="fetch")
         db.session.commit()
+
+
+@contextmanager
+def claim_many_for_update(Model, ids, minutes=30, where=None):
+    """
+    Claim mutually exclusive expiring holds on several resources at once.
+    Resources that are already claimed, or that no longer match `where`, are
+    skipped, so the caller may receive fewer resources than it asked for
+    (possibly none).
+
+    Args:
+        Model:      A SQLAlchemy model class with a `claimed_until` attribute.
+        ids:        The ids of the resources to claim.
+        minutes:    The maximum amount of time, in minutes, to hold the claims.
+        where:      An optional condition the resources must still meet when
+                    they are claimed, e.g. that they still need the work the
+                    caller is about to do. It is checked in the same UPDATE
+                    as the claim, after any concurrent claim was released.
+    """
+    claim_until = func.now() + func.cast(
+        sql.functions.concat(minutes, " MINUTES"), Interval
+    )
+
+    # Claim every resource that is not already claimed in a single UPDATE
+    # and collect the ids that were actually claimed.
+    claimed_ids = [
+        id_
+        for id_, in db.session.execute(
+            Model.__table__.update()
+            .where(
+                and_(
+                    Model.id.in_(ids),
+                    or_(Model.claimed_until == None, Model.claimed_until <= func.now()),
+                    *([where] if where is not None else []),
+                )
+            )
+            .values(claimed_until=claim_until)
+            .returning(Model.id)
+        )
+    ]
+
+    claimed = (
+        db.session.query(Model).filter(Model.id.in_(claimed_ids)).all()
+        if claimed_ids
+        else []
+    )
+
+    try:
+        yield claimed
+    finally:
+        if claimed_ids:
+            db.session.query(Model).filter(Model.id.in_(claimed_ids)).update(
+                {"claimed_until": None}, synchronize_session="fetch"
+            )
+        db.session.commit()
@@ -1,38 +1,137 @@
-from celery import Celery
+from celery import Celery, Task
+from celery.schedules import crontab
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.state import InstanceState
 
+from atst.database import db
 
-celery = Celery(__name__)
+
+class ContextTask(Task):
+    """
+    Base class of every task: runs the task in the Flask app's context. Worker
+    processes push a long-lived app context at startup; it is reused instead
+    of building a new one for every task, but each task is still handed a
+    fresh database session.
+    """
+
+    def __call__(self, *args, **kwargs):
+        app = getattr(self.app, "flask_app", None)
+        if app is None:
+            return self.run(*args, **kwargs)
+
+        if has_app_context() and current_app._get_current_object() is app:
+            try:
+                return self.run(*args, **kwargs)
+            finally:
+                db.session.remove()
+
+        with app.app_context():
+            return self.run(*args, **kwargs)
+
+
+# Task classes defined by subclassing `celery.Task`, such as those in
+# `atst.jobs`, are built on ContextTask too.
+celery = Celery(__name__, task_cls=ContextTask)
+
+PENDING_TASKS_KEY = "pending_tasks"
+
+
+def enqueue_after_commit(task_name, **kwargs):
+    """
+    Schedule a celery task to be sent once the current database transaction
+    commits. Tasks are referenced by name so that domain classes do not need
+    to import `atst.jobs`. Pending tasks are discarded if the transaction is
+    rolled back.
+
+    Model instances passed as keyword arguments are replaced by their primary
+    key just before the transaction commits, once the session has been
+    flushed, so rows created in the current transaction can be referenced
+    before their server-generated id is known.
+    """
+    if not current_app.config.get("ENQUEUE_ON_COMMIT"):
+        return
+
+    db.session.info.setdefault(PENDING_TASKS_KEY, []).append((task_name, kwargs))
+
+
+def _resolve_task_kwargs(kwargs):
+    resolved = {}
+    for key, value in kwargs.items():
+        state = inspect(value, raiseerr=False)
+        if isinstance(state, InstanceState):
+            value = state.identity[0]
+        resolved[key] = value
+
+    return resolved
+
+
+@event.listens_for(Session, "before_commit")
+def _resolve_pending_tasks(session):
+    if not session.info.get(PENDING_TASKS_KEY):
+        return
+
+    # Pending instances only get their primary key when flushed, and the
+    # session cannot be flushed any more once it has committed. Flushing
+    # may enqueue further tasks, so the list is read afterwards.
+    session.flush()
+    session.info[PENDING_TASKS_KEY] = [
+        (task_name, _resolve_task_kwargs(kwargs))
+        for task_name, kwargs in session.info[PENDING_TASKS_KEY]
+    ]
+
+
+@event.listens_for(Session, "after_commit")
+def _send_pending_tasks(session):
+    for task_name, kwargs in session.info.pop(PENDING_TASKS_KEY, []):
+        celery.send_task(task_name, kwargs=kwargs)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_tasks(session):
+    session.info.pop(PENDING_TASKS_KEY, None)
 
 
 def update_celery(celery, app):
     celery.conf.update(app.config)
+    # The provisioning beat entries are reconciliation sweeps; domain writes
+    # enqueue the relevant task directly via `enqueue_after_commit`.
+    sweep_interval = int(app.config.get("PROVISIONING_SWEEP_INTERVAL", 60))
     celery.conf.CELERYBEAT_SCHEDULE = {
         "beat-dispatch_provision_portfolio": {
             "task": "atst.jobs.dispatch_provision_portfolio",
-            "schedule": 60,
+            "schedule": sweep_interval,
         },
         "beat-dispatch_create_application": {
             "task": "atst.jobs.dispatch_create_application",
-            "schedule": 60,
+            "schedule": sweep_interval,
+        },
+        "beat-dispatch_create_portfolio_policies": {
+            "task": "atst.jobs.dispatch_create_portfolio_policies",
+            "schedule": sweep_interval,
         },
         "beat-dispatch_create_environment": {
             "task": "atst.jobs.dispatch_create_environment",
-            "schedule": 60,
+            "schedule": sweep_interval,
         },
         "beat-dispatch_create_atat_admin_user": {
             "task": "atst.jobs.dispatch_create_atat_admin_user",
-            "schedule": 60,
+            "schedule": sweep_interval,
         },
         "beat-dispatch_provision_user": {
             "task": "atst.jobs.dispatch_provision_user",
-            "schedule": 60,
+            "schedule": sweep_interval,
+        },
+        "beat-dispatch_refresh_funding_summaries": {
+            "task": "atst.jobs.dispatch_refresh_funding_summaries",
+            "schedule": crontab(minute=0, hour=0),
+        },
+        "beat-dispatch_send_funding_expiration_notifications": {
+            "task": "atst.jobs.dispatch_send_funding_expiration_notifications",
+            "schedule": crontab(minute=0, hour=0),
         },
     }
 
-    class ContextTask(celery.Task):
-        def __call__(self, *args, **kwargs):
-            with app.app_context():
-                return self.run(*args, **kwargs)
-
-    celery.Task = ContextTask
+    celery.flask_app = app
     return celery
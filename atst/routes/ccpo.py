@@ -1,7 +1,14 @@
+import csv
+import itertools
+from io import StringIO
+
+import pendulum
 from flask import (
     Blueprint,
+    Response,
     render_template,
     redirect,
+    stream_with_context,
     url_for,
     request,
     current_app as app,
@@ -10,6 +17,8 @@ from atst.domain.users import Users
 from atst.domain.audit_log import AuditLog
 from atst.domain.common import Paginator
 from atst.domain.exceptions import NotFoundError
+from atst.domain.job_failures import JobFailures
+from atst.domain.spend_analytics import SpendAnalytics
 from atst.domain.authz.decorator import user_can_access_decorator as user_can
 from atst.forms.ccpo_user import CCPOUserForm
 from atst.models.permissions import Permissions
@@ -20,6 +29,8 @@ from atst.utils.flash import formatted_flash as flash
 bp = Blueprint("ccpo", __name__)
 bp.context_processor(atat_context_processor)
 
+MAX_JOB_FAILURE_DAYS = 90
+
 
 @bp.route("/activity-history")
 @user_can(Permissions.VIEW_AUDIT_LOG, message="view activity log")
@@ -32,6 +43,65 @@ def activity_history():
         return redirect("/")
 
 
+@bp.route("/job-failures")
+@user_can(Permissions.VIEW_AUDIT_LOG, message="view job failures")
+def job_failures():
+    days = request.args.get("days", 7, type=int)
+    days = min(max(days, 1), MAX_JOB_FAILURE_DAYS)
+    since = pendulum.now().subtract(days=days)
+    return render_template(
+        "ccpo/job_failures.html",
+        days=days,
+        failure_rates=JobFailures.failure_rates(since),
+        operation_failures=JobFailures.operation_failures(since),
+        hot_entities=JobFailures.hot_entities(since),
+    )
+
+
+def _spend_analytics_query():
+    sort = request.args.get("sort", "burn_rate")
+    if sort not in SpendAnalytics.SORTS:
+        sort = "burn_rate"
+    descending = request.args.get("direction", "desc") != "asc"
+    query = SpendAnalytics.portfolio_spend(sort=sort, descending=descending)
+    return query, sort, descending
+
+
+@bp.route("/spend-analytics")
+@user_can(Permissions.VIEW_AUDIT_LOG, message="view spend analytics")
+def spend_analytics():
+    query, sort, descending = _spend_analytics_query()
+    pagination_opts = Paginator.get_pagination_opts(request, default_per_page=50)
+    return render_template(
+        "ccpo/spend_analytics.html",
+        portfolios=Paginator.paginate(query, pagination_opts),
+        sort=sort,
+        direction="desc" if descending else "asc",
+        burn_rate_days=SpendAnalytics.BURN_RATE_DAYS,
+    )
+
+
+@bp.route("/spend-analytics.csv")
+@user_can(Permissions.VIEW_AUDIT_LOG, message="export spend analytics")
+def spend_analytics_csv():
+    query, _, _ = _spend_analytics_query()
+
+    def rows():
+        line = StringIO()
+        writer = csv.writer(line)
+        for row in itertools.chain([SpendAnalytics.COLUMNS], query.yield_per(500)):
+            writer.writerow(row)
+            yield line.getvalue()
+            line.seek(0)
+            line.truncate()
+
+    return Response(
+        stream_with_context(rows()),
+        mimetype="text/csv",
+        headers={"Content-Disposition": "attachment; filename=spend_analytics.csv"},
+    )
+
+
 @bp.route("/ccpo-users")
 @user_can(Permissions.VIEW_CCPO_USER, message="view ccpo users")
 def users():
@@ -5,7 +5,7 @@ from flask import redirect, render_template, url_for, request as http_request, g
 from .blueprint import portfolios_bp
 from atst.forms.portfolio import PortfolioCreationForm
 from atst.domain.reports import Reports
-from atst.domain.portfolios import Portfolios
+from atst.domain.portfolios import Portfolios, PortfolioFundingSummaries
 from atst.models.permissions import Permissions
 from atst.domain.authz.decorator import user_can_access_decorator as user_can
 from atst.utils.flash import formatted_flash as flash
@@ -40,16 +40,13 @@ def reports(portfolio_id):
     if any(map(lambda clin: clin["remaining"] < 0, current_obligated_funds)):
         flash("insufficient_funds")
 
+    funding_summary = PortfolioFundingSummaries.get(portfolio)
     # wrapped in str() because the sum of obligated funds returns a Decimal object
-    total_portfolio_value = str(
-        sum(
-            task_order.total_obligated_funds
-            for task_order in portfolio.active_task_orders
-        )
-    )
+    total_portfolio_value = str(funding_summary.obligated_funds)
     return render_template(
         "portfolios/reports/index.html",
         portfolio=portfolio,
+        funding_summary=funding_summary,
         total_portfolio_value=total_portfolio_value,
         current_obligated_funds=current_obligated_funds,
         expired_task_orders=Reports.expired_task_orders(portfolio),
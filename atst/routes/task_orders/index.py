@@ -27,8 +27,8 @@ def view_task_order(task_order_id):
 @user_can(Permissions.VIEW_PORTFOLIO_FUNDING, message="view portfolio funding")
 def portfolio_funding(portfolio_id):
     portfolio = Portfolios.get(g.current_user, portfolio_id)
-    task_orders = TaskOrders.sort_by_status(portfolio.task_orders)
-    to_count = len(portfolio.task_orders)
+    task_orders = TaskOrders.by_status(portfolio.id)
+    to_count = sum(len(to_list) for to_list in task_orders.values())
     # TODO: Get expended amount from the CSP
     return render_template(
         "task_orders/index.html", task_orders=task_orders, to_count=to_count
@@ -44,6 +44,14 @@ def commit_or_raise_already_exists_error(message):
         raise AlreadyExistsError(message)
 
 
+def flush_or_raise_already_exists_error(message):
+    try:
+        db.session.flush()
+    except IntegrityError:
+        db.session.rollback()
+        raise AlreadyExistsError(message)
+
+
 def sha256_hex(string):
     hsh = hashlib.sha256(string.encode())
     return hsh.digest().hex()
@@ -2,7 +2,13 @@
 import logging
 
 from atst.app import celery, make_app, make_config
-from celery.signals import after_setup_task_logger
+from atst.database import db
+from atst.domain.job_failures import JobFailures
+from celery.signals import (
+    after_setup_task_logger,
+    worker_process_init,
+    worker_process_shutdown,
+)
 
 from atst.utils.logging import JsonFormatter
 
@@ -17,3 +23,22 @@ def setup_task_logger(*args, **kwargs):
         logger = logging.getLogger()
         for handler in logger.handlers:
             handler.setFormatter(JsonFormatter(source="queue"))
+
+
+@worker_process_init.connect
+def setup_worker_process(*args, **kwargs):
+    """
+    Runs once in each forked worker process. Connections inherited from the
+    parent process must not be shared, so the engine's pool is reset and a
+    connection is opened up front; the pool, the app context pushed above
+    and the CSP clients hanging off `app.csp` then live for the lifetime of
+    the worker process.
+    """
+    db.engine.dispose()
+    with db.engine.connect():
+        pass
+
+
+@worker_process_shutdown.connect
+def flush_job_attempts(*args, **kwargs):
+    JobFailures.flush_attempts()
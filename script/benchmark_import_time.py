@@ -0,0 +1,75 @@
+"""
+Reports module import times for the application, using `python -X importtime`.
+
+Prints the cumulative import time of `atst.app` and the slowest modules it
+imports directly, then the cost of importing every Azure SDK module
+AzureSDKProvider can load. Since those are imported lazily, the second
+figure is only paid by processes that call all of the Azure services.
+
+    python script/benchmark_import_time.py [number of packages to list]
+"""
+# Add root application dir to the python path
+import os
+import subprocess
+import sys
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(parent_dir)
+
+from atst.domain.csp.cloud.azure_cloud_provider import AzureSDKProvider
+
+
+def import_times(statement):
+    """
+    Run `statement` in a fresh interpreter and return a list of
+    (module, self microseconds, cumulative microseconds) tuples.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=parent_dir,
+        env={**os.environ, "PYTHONPATH": parent_dir},
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        # keep the indentation, which shows how deeply nested the import is
+        times.append((name[1:].rstrip(), int(self_us), int(cumulative_us)))
+
+    return times
+
+
+def at_depth(times, depth):
+    # nested imports are indented two spaces per level under their importer
+    indent = "  " * depth
+    return [
+        (name.strip(), cumulative)
+        for name, _, cumulative in times
+        if name.startswith(indent) and not name.startswith(indent + " ")
+    ]
+
+
+def run(count=15):
+    app_times = import_times("import atst.app")
+    app_total = dict(at_depth(app_times, 0)).get("atst.app", 0)
+    print(f"atst.app: {app_total / 1000:.1f}ms cumulative\n")
+
+    print(f"Slowest {count} imports made by atst.app:")
+    for name, cumulative in sorted(at_depth(app_times, 1), key=lambda t: -t[1])[:count]:
+        print(f"  {cumulative / 1000:8.1f}ms  {name}")
+
+    azure_modules = {module for module, _ in AzureSDKProvider.MODULES.values()}
+    azure_times = import_times(
+        "; ".join(f"import {module}" for module in sorted(azure_modules))
+    )
+    azure_total = sum(cumulative for _, cumulative in at_depth(azure_times, 0))
+    print(f"\nAll Azure SDK modules: {azure_total / 1000:.1f}ms cumulative")
+
+
+if __name__ == "__main__":
+    run(*[int(arg) for arg in sys.argv[1:2]])
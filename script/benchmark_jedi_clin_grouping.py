@@ -0,0 +1,128 @@
+"""
+Times Reports.obligated_funds_by_JEDI_clin for a portfolio with many CLINs.
+
+Compares the grouped query with the previous implementation, which loaded
+every CLIN through `portfolio.active_clins` (and each CLIN's task order) and
+grouped them with itertools.groupby without sorting, so interleaved CLIN
+types overwrote each other's totals. Prints both timings and obligated
+totals. All rows are created in a transaction that is rolled back at the
+end.
+
+    python script/benchmark_jedi_clin_grouping.py [number of CLINs] [CLINs per task order]
+"""
+# Add root application dir to the python path
+import logging
+import os
+import random
+import sys
+import timeit
+from datetime import date, timedelta
+from itertools import groupby
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(parent_dir)
+
+from atst.app import make_config, make_app
+from atst.database import db
+from atst.domain.reports import Reports
+from atst.models import CLIN, JEDICLINType, Portfolio, TaskOrder
+import tests.factories as factories
+
+
+def previous_obligated_funds(portfolio):
+    obligated = {}
+    for jedi_clin, clins in groupby(
+        portfolio.active_clins, key=lambda clin: clin.jedi_clin_type
+    ):
+        obligated[jedi_clin.name] = sum(clin.obligated_amount for clin in clins)
+    return obligated
+
+
+def current_obligated_funds(portfolio):
+    return {
+        clin["name"]: clin["obligated"]
+        for clin in Reports.obligated_funds_by_JEDI_clin(portfolio)
+    }
+
+
+def create_portfolio(clin_count, clins_per_task_order):
+    rng = random.Random(0)
+    today = date.today()
+    portfolio = factories.PortfolioFactory.create()
+    task_order_ids = []
+    for _ in range(0, clin_count, clins_per_task_order):
+        task_order = TaskOrder(
+            portfolio_id=portfolio.id,
+            number=factories.random_task_order_number(),
+            signed_at=today - timedelta(days=1),
+        )
+        db.session.add(task_order)
+        db.session.flush()
+        task_order_ids.append(task_order.id)
+
+    db.session.bulk_insert_mappings(
+        CLIN,
+        [
+            {
+                "task_order_id": task_order_ids[i // clins_per_task_order],
+                "number": factories.random_clin_number(),
+                "start_date": today - timedelta(days=rng.randint(0, 30)),
+                "end_date": today + timedelta(days=rng.randint(-5, 365)),
+                "total_amount": 100000,
+                "obligated_amount": rng.randint(100, 50000),
+                "jedi_clin_type": rng.choice(list(JEDICLINType)),
+            }
+            for i in range(clin_count)
+        ],
+    )
+    db.session.flush()
+    return portfolio.id
+
+
+def run(clin_count, clins_per_task_order, repeat=5):
+    portfolio_id = create_portfolio(clin_count, clins_per_task_order)
+
+    def timed(fn):
+        def load_and_run():
+            # start from an empty identity map, as a request would
+            db.session.expire_all()
+            return fn(db.session.query(Portfolio).get(portfolio_id))
+
+        best = min(timeit.repeat(load_and_run, number=1, repeat=repeat))
+        return best, load_and_run()
+
+    previous_time, previous = timed(previous_obligated_funds)
+    current_time, current = timed(current_obligated_funds)
+
+    print(
+        f"{clin_count} CLINs in {-(-clin_count // clins_per_task_order)} task orders"
+        f" (best of {repeat})"
+    )
+    print(f"  portfolio.active_clins + groupby: {previous_time:.3f}s")
+    print(f"  grouped query:                    {current_time:.3f}s")
+    print(f"  {'JEDI CLIN':<12} {'groupby':>14} {'grouped query':>14}")
+    for name in sorted(current):
+        print(f"  {name:<12} {previous.get(name, 0):>14} {current[name]:>14}")
+
+
+if __name__ == "__main__":
+    config = make_config({"DEBUG": False})
+    app = make_app(config)
+    app.logger.setLevel(logging.WARNING)
+    args = [int(arg) for arg in sys.argv[1:3]]
+    clin_count = args[0] if args else 5000
+    clins_per_task_order = args[1] if len(args) > 1 else 20
+
+    with app.app_context():
+        connection = db.engine.connect()
+        transaction = connection.begin()
+        db.session = db.create_scoped_session(options=dict(bind=connection, binds={}))
+        for cls in factories.__dict__.values():
+            if isinstance(cls, type) and cls.__module__ == "tests.factories":
+                cls._meta.sqlalchemy_session = db.session
+        try:
+            run(clin_count, clins_per_task_order)
+        finally:
+            db.session.remove()
+            transaction.rollback()
+            connection.close()
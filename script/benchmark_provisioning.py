@@ -0,0 +1,255 @@
+"""
+Measures provisioning throughput of the background jobs against a
+MockCloudProvider with a seeded, latency-profiled configuration.
+
+Creates portfolios through the domain classes, as the application would,
+whose applications, environments and environment roles all still need
+provisioning, then runs the provisioning steps of atst.jobs
+in-process, round after round, until nothing is left to provision. Each
+round finds pending work with the same queries as the dispatch tasks, and
+a step that raises a CSP error is tried again next round, as a Celery retry
+would be. CSP latency is simulated on a virtual clock, so the run reports
+both wall-clock time spent in ATAT code and the total CSP time a single
+serial worker would have waited for. Everything is created in a transaction that is rolled back at
+the end.
+
+    python script/benchmark_provisioning.py [portfolios] [seed]
+"""
+# Add root application dir to the python path
+import logging
+import os
+import random
+import string
+import sys
+import time
+from decimal import Decimal
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(parent_dir)
+
+import pendulum
+
+from atst.app import make_config, make_app
+from atst.database import db
+from atst.domain.csp.cloud.mock_cloud_provider import (
+    MockCloudProfile,
+    MockCloudProvider,
+)
+from atst.domain.application_roles import ApplicationRoles
+from atst.domain.applications import Applications
+from atst.domain.csp.cloud.exceptions import GeneralCSPException
+from atst.domain.environment_roles import EnvironmentRoles
+from atst.domain.environments import Environments
+from atst.domain.portfolios import Portfolios, PortfolioStateMachines
+from atst.domain.task_orders import TaskOrders
+from atst.domain.users import Users
+from atst.jobs import (
+    do_create_applications,
+    do_create_atat_admin_user,
+    do_create_environment,
+    do_provision_users,
+)
+from atst.models import EnvironmentRole, FSMStates, JEDICLINType
+from atst.models.environment_role import CSPRole
+
+APPLICATIONS_PER_PORTFOLIO = 3
+ENVIRONMENTS_PER_APPLICATION = 2
+USERS_PER_ENVIRONMENT = 4
+MAX_ROUNDS = 10
+
+# seconds of simulated latency per CSP operation
+LATENCIES = {
+    "authorize": (0.05, 0.2),
+    "create_application": (1, 3),
+    "create_environment": (2, 6),
+    "create_environment_baseline": (1, 3),
+    "create_atat_admin_user": (1, 3),
+    "create_or_update_users": (1, 4),
+}
+
+# lower than the provider's defaults, so a run is dominated by successes
+FAILURE_RATES = {
+    "NETWORK_FAILURE_PCT": 2,
+    "SERVER_FAILURE_PCT": 1,
+    "ENV_CREATE_FAILURE_PCT": 3,
+    "ATAT_ADMIN_CREATE_FAILURE_PCT": 3,
+    "UNAUTHORIZED_RATE": 1,
+}
+
+
+def use_session(session):
+    db.session = session
+
+
+def random_digits(count):
+    return "".join(random.choices(string.digits, k=count))
+
+
+def create_user():
+    return Users.create(
+        random_digits(10),
+        first_name="Benchmark",
+        last_name="User",
+        email="benchmark@example.com",
+    )
+
+
+def create_portfolios(count):
+    """
+    Returns the number of environment roles created and the creation order
+    of the applications and environments, so that pending work can be
+    processed in the same order on every run.
+    """
+    clin = {
+        "number": "0001",
+        "start_date": pendulum.today().subtract(days=1).date(),
+        "end_date": pendulum.today().add(days=30).date(),
+        "total_amount": Decimal("1000000"),
+        "obligated_amount": Decimal("500000"),
+        "jedi_clin_type": JEDICLINType.JEDI_CLIN_1,
+    }
+    environment_roles = 0
+    order = {}
+    for n in range(count):
+        owner = create_user()
+        portfolio = Portfolios.create(
+            owner, {"name": f"Benchmark portfolio {n}", "defense_component": ["army"]},
+        )
+        portfolio.csp_data = {"tenant_id": "tenant", "root_management_group_id": "root"}
+        # the portfolio itself has finished provisioning
+        state_machine = PortfolioStateMachines.create(portfolio)
+        state_machine.state = FSMStates.COMPLETED
+        TaskOrders.create(portfolio.id, random_digits(13), [clin], None)
+
+        for a in range(APPLICATIONS_PER_PORTFOLIO):
+            application = Applications.create(
+                owner,
+                portfolio,
+                f"Benchmark application {a}",
+                "",
+                environment_names=[
+                    f"environment {e}" for e in range(ENVIRONMENTS_PER_APPLICATION)
+                ],
+            )
+            order[application.id] = len(order)
+            application_roles = []
+            for _ in range(USERS_PER_ENVIRONMENT):
+                user = create_user()
+                ApplicationRoles.create(user, application, [])
+                # as when an invitation is accepted, enable the stored role
+                application_role = ApplicationRoles.get(user.id, application.id)
+                ApplicationRoles.enable(application_role, user)
+                application_roles.append(application_role)
+            for environment in application.environments:
+                order[environment.id] = len(order)
+                for application_role in application_roles:
+                    db.session.add(
+                        EnvironmentRoles.create(
+                            application_role, environment, CSPRole.ADMIN
+                        )
+                    )
+                    environment_roles += 1
+    db.session.commit()
+    return environment_roles, order
+
+
+def _first(item):
+    return item[0] if isinstance(item, list) else item
+
+
+def run(app, portfolio_count, seed):
+    csp = MockCloudProvider(
+        app.config,
+        profile=MockCloudProfile(
+            seed=seed,
+            latencies=LATENCIES,
+            failure_rates=FAILURE_RATES,
+            virtual_time=True,
+        ),
+    )
+    app.csp.cloud = csp
+    environment_roles, order = create_portfolios(portfolio_count)
+
+    # (pending work, step) in pipeline order
+    stages = [
+        (
+            lambda: [
+                sorted(ids, key=order.get)
+                for ids in Applications.get_applications_pending_creation_by_portfolio().values()
+            ],
+            lambda ids: do_create_applications(csp, application_ids=ids),
+        ),
+        (
+            lambda: Environments.get_environments_pending_creation(pendulum.now()),
+            lambda id_: do_create_environment(csp, environment_id=id_),
+        ),
+        (
+            lambda: Environments.get_environments_pending_atat_user_creation(
+                pendulum.now()
+            ),
+            lambda id_: do_create_atat_admin_user(csp, environment_id=id_),
+        ),
+        (
+            EnvironmentRoles.get_environments_with_roles_pending_creation,
+            lambda id_: do_provision_users(csp, environment_id=id_),
+        ),
+    ]
+
+    failures = 0
+    start = time.perf_counter()
+    for round_ in range(1, MAX_ROUNDS + 1):
+        steps = 0
+        for pending, step in stages:
+            for item in sorted(pending(), key=lambda item: order[_first(item)]):
+                steps += 1
+                try:
+                    step(item)
+                except GeneralCSPException:
+                    db.session.rollback()
+                    failures += 1
+        if not steps:
+            break
+    elapsed = time.perf_counter() - start
+
+    provisioned = (
+        db.session.query(EnvironmentRole)
+        .filter(EnvironmentRole.status == EnvironmentRole.Status.COMPLETED)
+        .count()
+    )
+
+    print(f"{portfolio_count} portfolios, seed {seed}, {round_} rounds")
+    print(f"  failed attempts:     {failures}")
+    print(f"  environment roles provisioned: {provisioned}/{environment_roles}")
+    print(f"  wall clock:          {elapsed:8.2f}s")
+    print(f"  simulated CSP time:  {csp.clock.now:8.2f}s")
+    print(f"  roles per wall second: {provisioned / elapsed:8.1f}")
+    print(f"  {'operation':<28} {'calls':>5} {'simulated s':>10}")
+    for operation in sorted(csp.operation_calls):
+        print(
+            f"  {operation or '-':<28} {csp.operation_calls[operation]:5d}"
+            f" {csp.operation_seconds[operation]:10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    config = make_config(
+        {"DEBUG": False, "DEBUG_MAILER": True, "ENQUEUE_ON_COMMIT": False}
+    )
+    app = make_app(config)
+    app.logger.setLevel(logging.WARNING)
+    args = [int(arg) for arg in sys.argv[1:3]]
+    portfolio_count = args[0] if args else 10
+    seed = args[1] if len(args) > 1 else 0
+
+    # a request context lets the environment-ready emails build their URLs
+    with app.test_request_context():
+        connection = db.engine.connect()
+        transaction = connection.begin()
+        session = db.create_scoped_session(options=dict(bind=connection, binds={}))
+        use_session(session)
+        try:
+            run(app, portfolio_count, seed)
+        finally:
+            session.remove()
+            transaction.rollback()
+            connection.close()
@@ -0,0 +1,80 @@
+"""
+Times loading portfolio state machine rows from the database.
+
+Compares the current behaviour, where rows share a machine compiled once
+per process, with building a dedicated machine for every row as it is
+loaded (the previous `@reconstructor` behaviour). All rows are created in
+a transaction that is rolled back at the end.
+
+    python script/benchmark_state_machine_load.py [number of rows]
+"""
+# Add root application dir to the python path
+import os
+import sys
+import timeit
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(parent_dir)
+
+from atst.app import make_config, make_app
+from atst.database import db
+from atst.models import FSMStates, PortfolioStateMachine
+from atst.models.mixins.state_machines import AzureStages, _build_transitions
+from atst.models.portfolio_state_machine import StateMachineWithTags
+
+
+def build_dedicated_machine(state_machine):
+    machine = StateMachineWithTags(
+        model=state_machine,
+        send_event=True,
+        initial=state_machine.current_state,
+        auto_transitions=False,
+        after_state_change="after_state_change",
+    )
+    states, transitions = _build_transitions(AzureStages)
+    machine.add_states(state_machine.system_states + states)
+    machine.add_transitions(state_machine.system_transitions + transitions)
+    return machine
+
+
+def load_rows(per_row=None):
+    db.session.expire_all()
+    rows = db.session.query(PortfolioStateMachine).all()
+    for row in rows:
+        if per_row:
+            per_row(row)
+        row.current_state
+    return rows
+
+
+def run(count, repeat=5):
+    db.session.bulk_insert_mappings(
+        PortfolioStateMachine, [{"state": FSMStates.UNSTARTED}] * count
+    )
+    db.session.flush()
+
+    shared = min(timeit.repeat(load_rows, number=1, repeat=repeat))
+    dedicated = min(
+        timeit.repeat(
+            lambda: load_rows(build_dedicated_machine), number=1, repeat=repeat
+        )
+    )
+
+    print(f"loading {count} state machine rows (best of {repeat})")
+    print(f"  machine built per row:  {dedicated:.3f}s")
+    print(f"  shared machine:         {shared:.3f}s")
+
+
+if __name__ == "__main__":
+    config = make_config({"DEBUG": False})
+    app = make_app(config)
+    with app.app_context():
+        connection = db.engine.connect()
+        transaction = connection.begin()
+        db.session = db.create_scoped_session(options=dict(bind=connection, binds={}))
+        try:
+            run(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
+        finally:
+            db.session.remove()
+            transaction.rollback()
+            connection.close()
@@ -0,0 +1,35 @@
+"""
+Loads a CSP cost export into the daily spend table read by the reports
+pages when SPEND_DATA_SOURCE is "cost_exports". Spend already loaded for the
+export period is replaced.
+
+    python script/ingest_cost_export.py <export file> <period start> <period end> [csv|jsonl]
+"""
+# Add root application dir to the python path
+import os
+import sys
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(parent_dir)
+
+import pendulum
+
+from atst.app import make_config, make_app
+from atst.domain.cost_exports import CostExports
+
+
+if __name__ == "__main__":
+    config = make_config({"DISABLE_CRL_CHECK": True, "DEBUG": False})
+    app = make_app(config)
+
+    path, period_start, period_end = sys.argv[1:4]
+    format = sys.argv[4] if len(sys.argv) > 4 else "csv"
+
+    with app.app_context(), open(path, newline="") as export:
+        result = CostExports.ingest(
+            export,
+            pendulum.parse(period_start).date(),
+            pendulum.parse(period_end).date(),
+            format=format,
+        )
+        print(f"Read {result.rows} rows, skipped {result.skipped}.")
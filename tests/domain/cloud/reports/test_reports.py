@@ -1,4 +1,7 @@
-from atst.domain.csp.reports import MockReportingProvider
+import copy
+
+from atst.domain.csp.reports import ColumnarReportingProvider, MockReportingProvider
+from atst.domain.csp.spend_store import ColumnarSpendStore
 from tests.factories import PortfolioFactory
 
 
@@ -21,38 +24,153 @@ def test_get_environment_monthly_totals():
 
 
 def test_get_application_monthly_totals():
-    portfolio = PortfolioFactory.create(
-        applications=[
-            {"name": "Test Application", "environments": [{"name": "Z"}, {"name": "A"}]}
-        ],
-    )
-    application = {
-        "name": "Test Application",
-        "environments": [
-            {
-                "name": "Z",
-                "spending": {
-                    "this_month": {"JEDI_CLIN_1": 50, "JEDI_CLIN_2": 50},
-                    "last_month": {"JEDI_CLIN_1": 150, "JEDI_CLIN_2": 150},
-                    "total": {"JEDI_CLIN_1": 250, "JEDI_CLIN_2": 250},
-                },
+    fixture_environments = [
+        {
+            "name": "Z",
+            "spending": {
+                "this_month": {"JEDI_CLIN_1": 50, "JEDI_CLIN_2": 50},
+                "last_month": {"JEDI_CLIN_1": 150, "JEDI_CLIN_2": 150},
+                "total": {"JEDI_CLIN_1": 250, "JEDI_CLIN_2": 250},
             },
-            {
-                "name": "A",
-                "spending": {
-                    "this_month": {"JEDI_CLIN_1": 100, "JEDI_CLIN_2": 100},
-                    "last_month": {"JEDI_CLIN_1": 200, "JEDI_CLIN_2": 200},
-                    "total": {"JEDI_CLIN_1": 1000, "JEDI_CLIN_2": 1000},
-                },
+        },
+        {
+            "name": "A",
+            "spending": {
+                "this_month": {"JEDI_CLIN_1": 100, "JEDI_CLIN_2": 100},
+                "last_month": {"JEDI_CLIN_1": 200, "JEDI_CLIN_2": 200},
+                "total": {"JEDI_CLIN_1": 1000, "JEDI_CLIN_2": 1000},
             },
-        ],
-    }
+        },
+    ]
 
     totals = MockReportingProvider._get_application_monthly_totals(
-        portfolio, application
+        "Test Application", fixture_environments, ["Z", "A", "B"]
     )
     assert totals["name"] == "Test Application"
     assert totals["this_month"] == 300
     assert totals["last_month"] == 700
     assert totals["total"] == 2500
-    assert [env["name"] for env in totals["environments"]] == ["A", "Z"]
+    assert [env["name"] for env in totals["environments"]] == ["A", "B", "Z"]
+    assert totals["environments"][1] == {"name": "B"}
+
+
+def test_get_portfolio_monthly_spending(monkeypatch):
+    fixture_data = {
+        "Test Portfolio": {
+            "applications": [
+                {
+                    "name": "Application 1",
+                    "environments": [
+                        {
+                            "name": "Environment 1",
+                            "spending": {
+                                "this_month": {"JEDI_CLIN_1": 10},
+                                "last_month": {"JEDI_CLIN_1": 20},
+                                "total": {"JEDI_CLIN_1": 30},
+                            },
+                        },
+                        {
+                            "name": "Deleted Environment",
+                            "spending": {
+                                "this_month": {"JEDI_CLIN_1": 1000},
+                                "last_month": {"JEDI_CLIN_1": 1000},
+                                "total": {"JEDI_CLIN_1": 1000},
+                            },
+                        },
+                    ],
+                },
+                {"name": "Deleted Application", "environments": []},
+            ]
+        }
+    }
+    monkeypatch.setattr(MockReportingProvider, "FIXTURE_SPEND_DATA", fixture_data)
+    snapshot = copy.deepcopy(fixture_data)
+    portfolio = PortfolioFactory.create(
+        name="Test Portfolio",
+        applications=[
+            {"name": "Application 2", "environments": [{"name": "Environment 2"}],},
+            {
+                "name": "Application 1",
+                "environments": [{"name": "Environment 1"}, {"name": "Environment 3"},],
+            },
+        ],
+    )
+
+    spending = MockReportingProvider.get_portfolio_monthly_spending(portfolio)
+    assert spending == MockReportingProvider.get_portfolio_monthly_spending(portfolio)
+    assert spending == [
+        {
+            "name": "Application 1",
+            "this_month": 10,
+            "last_month": 20,
+            "total": 30,
+            "environments": [
+                {
+                    "name": "Environment 1",
+                    "this_month": 10,
+                    "last_month": 20,
+                    "total": 30,
+                },
+                {"name": "Environment 3"},
+            ],
+        },
+        {
+            "name": "Application 2",
+            "this_month": 0,
+            "last_month": 0,
+            "total": 0,
+            "environments": [{"name": "Environment 2"}],
+        },
+    ]
+    # the shared fixture data is left as it was
+    assert fixture_data == snapshot
+
+
+def fixture_portfolio(name):
+    return PortfolioFactory.create(
+        name=name,
+        applications=[
+            {
+                "name": application["name"],
+                "environments": [
+                    {"name": env["name"]} for env in application["environments"]
+                ]
+                + [{"name": "No Spending"}],
+            }
+            for application in MockReportingProvider.FIXTURE_SPEND_DATA[name][
+                "applications"
+            ]
+        ]
+        + [{"name": "New Application", "environments": [{"name": "Dev"}]}],
+    )
+
+
+def test_columnar_provider_matches_mock_provider():
+    columnar = ColumnarReportingProvider.from_fixture()
+
+    for name in MockReportingProvider.FIXTURE_SPEND_DATA:
+        portfolio = fixture_portfolio(name)
+        assert columnar.get_portfolio_monthly_spending(
+            portfolio
+        ) == MockReportingProvider.get_portfolio_monthly_spending(portfolio)
+        assert columnar.get_spending_by_JEDI_clin(
+            portfolio
+        ) == MockReportingProvider.get_spending_by_JEDI_clin(portfolio)
+
+
+def test_columnar_provider_without_spend_data():
+    columnar = ColumnarReportingProvider(ColumnarSpendStore())
+    portfolio = PortfolioFactory.create(
+        applications=[{"name": "App", "environments": [{"name": "Env"}]}]
+    )
+
+    assert columnar.get_portfolio_monthly_spending(portfolio) == [
+        {
+            "name": "App",
+            "this_month": 0,
+            "last_month": 0,
+            "total": 0,
+            "environments": [{"name": "Env"}],
+        }
+    ]
+    assert columnar.get_spending_by_JEDI_clin(portfolio) == {}
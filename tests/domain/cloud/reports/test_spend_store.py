@@ -0,0 +1,99 @@
+from decimal import Decimal
+
+import pytest
+
+from atst.domain.csp import spend_store
+from atst.domain.csp.spend_store import ColumnarSpendStore, SpendRecord
+
+
+@pytest.fixture(params=["numpy", "python"])
+def backend(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(spend_store, "numpy", None)
+
+
+@pytest.fixture
+def store():
+    return ColumnarSpendStore(
+        [
+            SpendRecord("P1", "App 1", "Env 1", "JEDI_CLIN_1", "this_month", 10),
+            SpendRecord("P1", "App 1", "Env 1", "JEDI_CLIN_2", "this_month", 5.25),
+            SpendRecord("P1", "App 1", "Env 2", "JEDI_CLIN_1", "this_month", 1),
+            SpendRecord("P1", "App 2", "Env 1", "JEDI_CLIN_1", "total", 100),
+            SpendRecord("P2", "App 1", "Env 1", "JEDI_CLIN_1", "this_month", 1000),
+            SpendRecord("P1", "App 1", "Env 1", "JEDI_CLIN_1", "this_month", 0.1),
+        ]
+    )
+
+
+def test_totals_groups_by_columns(backend, store):
+    assert store.totals(("clin", "period"), portfolio="P1") == {
+        ("JEDI_CLIN_1", "this_month"): Decimal("11.10"),
+        ("JEDI_CLIN_2", "this_month"): Decimal("5.25"),
+        ("JEDI_CLIN_1", "total"): Decimal("100"),
+    }
+
+
+def test_totals_with_several_filters(backend, store):
+    assert store.totals(("environment",), portfolio="P1", application="App 1") == {
+        ("Env 1",): Decimal("15.35"),
+        ("Env 2",): Decimal("1"),
+    }
+
+
+def test_totals_without_grouping(backend, store):
+    assert store.totals((), portfolio="P2") == {(): Decimal("1000")}
+
+
+def test_totals_for_unknown_value(backend, store):
+    assert store.totals(("clin",), portfolio="P3") == {}
+    assert store.totals(("clin",), portfolio="P2", application="App 2") == {}
+
+
+def test_totals_when_group_key_would_overflow(store, monkeypatch):
+    pytest.importorskip("numpy")
+    expected = store.totals(("application", "environment", "clin"), portfolio="P1")
+
+    monkeypatch.setattr(spend_store, "MAX_GROUP_KEY", 1)
+
+    assert store.totals(("application", "environment", "clin"), portfolio="P1") == (
+        expected
+    )
+    assert expected == {
+        ("App 1", "Env 1", "JEDI_CLIN_1"): Decimal("10.10"),
+        ("App 1", "Env 1", "JEDI_CLIN_2"): Decimal("5.25"),
+        ("App 1", "Env 2", "JEDI_CLIN_1"): Decimal("1"),
+        ("App 2", "Env 1", "JEDI_CLIN_1"): Decimal("100"),
+    }
+
+
+def test_from_spend_data():
+    store = ColumnarSpendStore.from_spend_data(
+        {
+            "P1": {
+                "applications": [
+                    {
+                        "name": "App 1",
+                        "environments": [
+                            {
+                                "name": "Env 1",
+                                "spending": {
+                                    "this_month": {"JEDI_CLIN_1": 1, "JEDI_CLIN_2": 2},
+                                    "total": {"JEDI_CLIN_1": 3},
+                                },
+                            }
+                        ],
+                    }
+                ]
+            }
+        }
+    )
+
+    assert len(store) == 3
+    assert store.categories["clin"].values == ["JEDI_CLIN_1", "JEDI_CLIN_2"]
+    assert store.totals(("period",)) == {
+        ("this_month",): Decimal("3"),
+        ("total",): Decimal("3"),
+    }
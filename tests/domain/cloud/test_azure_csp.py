@@ -1,5 +1,7 @@
 import pytest
 import json
+import threading
+import time
 from uuid import uuid4
 from unittest.mock import Mock, patch
 
@@ -7,9 +9,15 @@ from tests.factories import ApplicationFactory, EnvironmentFactory
 from tests.mock_azure import AUTH_CREDENTIALS, mock_azure
 
 from atst.domain.csp.cloud import AzureCloudProvider
+from atst.domain.csp.cloud.credential_cache import CredentialCache
+from atst.domain.csp.cloud.exceptions import UnknownServerException
+from atst.domain.csp.cloud.polling import DeferredPolling
 from atst.domain.csp.cloud.models import (
+    AZURE_MGMNT_PATH,
     ApplicationCSPPayload,
     ApplicationCSPResult,
+    ApplicationOperationCSPResult,
+    ApplicationVerificationCSPPayload,
     BillingInstructionCSPPayload,
     BillingInstructionCSPResult,
     BillingProfileCreationCSPPayload,
@@ -18,6 +26,7 @@ from atst.domain.csp.cloud.models import (
     BillingProfileTenantAccessCSPResult,
     BillingProfileVerificationCSPPayload,
     BillingProfileVerificationCSPResult,
+    PortfolioPoliciesCSPPayload,
     TaskOrderBillingCreationCSPPayload,
     TaskOrderBillingCreationCSPResult,
     TaskOrderBillingVerificationCSPPayload,
@@ -114,6 +123,76 @@ def test_create_application_succeeds(mock_azure: AzureCloudProvider):
     assert result.id == "Test Id"
 
 
+def test_create_application_does_not_wait_for_management_group(
+    mock_azure: AzureCloudProvider,
+):
+    application = ApplicationFactory.create()
+    create_or_update = (
+        mock_azure.sdk.managementgroups.ManagementGroupsAPI.return_value.management_groups.create_or_update
+    )
+    create_or_update.return_value.status.return_value = DeferredPolling.ACCEPTED
+    create_or_update.return_value.result.return_value = {
+        "Location": "https://management.azure.com/operationResults/1",
+        "Retry-After": "30",
+    }
+    mock_azure = mock_get_secret(mock_azure, lambda *a, **k: json.dumps(MOCK_CREDS))
+
+    payload = ApplicationCSPPayload(
+        tenant_id="1234", display_name=application.name, parent_id=str(uuid4())
+    )
+    result = mock_azure.create_application(payload)
+
+    assert isinstance(create_or_update.call_args[1]["polling"], DeferredPolling)
+    assert result == ApplicationOperationCSPResult(
+        operation_url="https://management.azure.com/operationResults/1", retry_after=30,
+    )
+
+
+def test_create_application_verification(mock_azure: AzureCloudProvider):
+    mock_azure = mock_get_secret(mock_azure, lambda *a, **k: json.dumps(MOCK_CREDS))
+    mock_azure._get_sp_token = lambda creds: "TOKEN"
+    payload = ApplicationVerificationCSPPayload(
+        tenant_id="1234",
+        operation_url="https://management.azure.com/operationResults/1",
+    )
+
+    mock_azure.sdk.requests.get.return_value = Mock(
+        status_code=202, headers={"retry-after": "15"}
+    )
+    result = mock_azure.create_application_verification(payload)
+    assert result.operation_url == payload.operation_url
+    assert result.retry_after == 15
+
+    mock_azure.sdk.requests.get.return_value = Mock(status_code=200)
+    mock_azure.sdk.requests.get.return_value.json.return_value = {
+        "id": "Test Id",
+        "status": "Succeeded",
+    }
+    result = mock_azure.create_application_verification(payload)
+    assert result == ApplicationCSPResult(id="Test Id")
+
+    mock_azure.sdk.requests.get.return_value = Mock(status_code=500, text="error")
+    with pytest.raises(UnknownServerException):
+        mock_azure.create_application_verification(payload)
+
+
+def test_deferred_polling_returns_without_waiting():
+    from msrest.polling import LROPoller
+
+    accepted = Mock(status_code=202, headers={"location": "url", "retry-after": "30"})
+    poller = LROPoller(Mock(), accepted, Mock(), DeferredPolling())
+    assert poller.done()
+    assert poller.status() == DeferredPolling.ACCEPTED
+    assert ApplicationOperationCSPResult.from_headers(
+        poller.result()
+    ) == ApplicationOperationCSPResult(operation_url="url", retry_after=30)
+
+    created = Mock(status_code=201)
+    poller = LROPoller(Mock(), created, lambda response: "group", DeferredPolling())
+    assert poller.status() == DeferredPolling.SUCCEEDED
+    assert poller.result() == "group"
+
+
 def test_create_atat_admin_user_succeeds(mock_azure: AzureCloudProvider):
     environment_id = str(uuid4())
 
@@ -153,6 +232,86 @@ def test_create_policy_definition_succeeds(mock_azure: AzureCloudProvider):
     )
 
 
+def test_create_applications_reports_each_result(mock_azure: AzureCloudProvider):
+    mock_azure.provisioning_concurrency = 2
+    running = []
+    most_running = []
+    lock = threading.Lock()
+
+    def create_application(payload):
+        with lock:
+            running.append(payload)
+            most_running.append(len(running))
+        time.sleep(0.01)
+        with lock:
+            running.remove(payload)
+        if payload.display_name == "broken":
+            raise UnknownServerException("broken")
+        return ApplicationCSPResult(id=f"{AZURE_MGMNT_PATH}{payload.display_name}")
+
+    mock_azure.create_application = create_application
+    names = ["one", "broken", "three", "four", "five"]
+    payloads = [
+        ApplicationCSPPayload(tenant_id="1234", display_name=name, parent_id="parent")
+        for name in names
+    ]
+
+    results = mock_azure.create_applications(payloads)
+
+    assert [type(result) for result in results] == [
+        ApplicationCSPResult,
+        UnknownServerException,
+        ApplicationCSPResult,
+        ApplicationCSPResult,
+        ApplicationCSPResult,
+    ]
+    assert results[3].id.endswith("four")
+    assert max(most_running) <= 2
+
+
+def test_create_portfolio_policies(mock_azure: AzureCloudProvider):
+    mock_azure = mock_get_secret(mock_azure, lambda *a, **k: json.dumps(MOCK_CREDS))
+    policy_client = mock_azure.sdk.policy.PolicyClient.return_value
+    create_assignment = policy_client.policy_assignments.create
+    create_assignment.side_effect = [Mock(), UnknownServerException("failed")]
+    management_group_id = str(uuid4())
+
+    results = mock_azure.create_portfolio_policies(
+        PortfolioPoliciesCSPPayload(
+            tenant_id="1234", management_group_id=management_group_id
+        )
+    )
+
+    policies = mock_azure.policy_manager.portfolio_definitions
+    assert len(results) == len(policies) == 2
+    # the assignments run concurrently, so either policy may be the one that failed
+    assert [isinstance(result, UnknownServerException) for result in results].count(
+        True
+    ) == 1
+    assert (
+        policy_client.policy_definitions.create_or_update_at_management_group.call_count
+        == len(policies)
+    )
+    for call in create_assignment.call_args_list:
+        assert call[1]["scope"] == f"{AZURE_MGMNT_PATH}{management_group_id}"
+        assert len(call[1]["policy_assignment_name"]) == 24
+
+
+def test_create_portfolio_policies_raises_unexpected_errors(
+    mock_azure: AzureCloudProvider,
+):
+    mock_azure = mock_get_secret(mock_azure, lambda *a, **k: json.dumps(MOCK_CREDS))
+    policy_client = mock_azure.sdk.policy.PolicyClient.return_value
+    policy_client.policy_assignments.create.side_effect = TypeError("bug")
+
+    with pytest.raises(TypeError):
+        mock_azure.create_portfolio_policies(
+            PortfolioPoliciesCSPPayload(
+                tenant_id="1234", management_group_id=str(uuid4())
+            )
+        )
+
+
 def test_create_tenant(mock_azure: AzureCloudProvider):
     mock_azure.sdk.adal.AuthenticationContext.return_value.context.acquire_token_with_client_credentials.return_value = {
         "accessToken": "TOKEN"
@@ -435,3 +594,147 @@ def test_create_billing_instruction(mock_azure: AzureCloudProvider):
     result = mock_azure.create_billing_instruction(payload)
     body: BillingInstructionCSPResult = result.get("body")
     assert body.reported_clin_name == "TO1:CLIN001"
+
+
+def test_credential_objects_are_reused(mock_azure: AzureCloudProvider):
+    first = mock_azure._get_credential_obj(AUTH_CREDENTIALS, resource="resource")
+    second = mock_azure._get_credential_obj(AUTH_CREDENTIALS, resource="resource")
+
+    assert first is second
+    mock_azure.sdk.credentials.ServicePrincipalCredentials.assert_called_once()
+
+
+def test_credential_cache_keys_hash_the_secret(mock_azure: AzureCloudProvider):
+    mock_azure._get_credential_obj(AUTH_CREDENTIALS)
+    rotated = {**AUTH_CREDENTIALS, "secret_key": "rotated"}  # pragma: allowlist secret
+    mock_azure._get_credential_obj(rotated)
+
+    assert mock_azure.sdk.credentials.ServicePrincipalCredentials.call_count == 2
+    for key in mock_azure._credentials._entries:
+        assert AUTH_CREDENTIALS["secret_key"] not in key
+        assert "rotated" not in key
+
+
+def test_sdk_clients_are_reused(mock_azure: AzureCloudProvider):
+    credentials = mock_azure._get_credential_obj(AUTH_CREDENTIALS)
+    client_cls = mock_azure.sdk.managementgroups.ManagementGroupsAPI
+
+    first = mock_azure._get_client(client_cls, credentials)
+    second = mock_azure._get_client(client_cls, credentials)
+
+    assert first is second
+    client_cls.assert_called_once_with(credentials)
+
+
+def test_sp_tokens_are_reused_until_expiry(mock_azure: AzureCloudProvider):
+    acquire = (
+        mock_azure.sdk.adal.AuthenticationContext.return_value.acquire_token_with_client_credentials
+    )
+    acquire.return_value = {"accessToken": "TOKEN", "expiresIn": 3599}
+
+    assert mock_azure._get_sp_token(creds) == "TOKEN"
+    assert mock_azure._get_sp_token(creds) == "TOKEN"
+    acquire.assert_called_once()
+
+    other_tenant = {**creds, "home_tenant_id": "other_tenant_id"}
+    mock_azure._get_sp_token(other_tenant)
+    assert acquire.call_count == 2
+
+
+def test_sp_tokens_are_refreshed_before_expiry(mock_azure: AzureCloudProvider):
+    now = [0]
+    mock_azure._tokens = CredentialCache(refresh_margin=300, clock=lambda: now[0])
+    acquire = (
+        mock_azure.sdk.adal.AuthenticationContext.return_value.acquire_token_with_client_credentials
+    )
+    acquire.return_value = {"accessToken": "TOKEN", "expiresIn": 3599}
+    mock_azure._get_sp_token(creds)
+
+    now[0] = 3000
+    acquire.return_value = {"accessToken": "NEW_TOKEN", "expiresIn": 3599}
+    assert mock_azure._get_sp_token(creds) == "TOKEN"
+
+    now[0] = 3300
+    assert mock_azure._get_sp_token(creds) == "NEW_TOKEN"
+    assert acquire.call_count == 2
+
+
+def test_sp_token_failures_are_not_cached(mock_azure: AzureCloudProvider):
+    acquire = (
+        mock_azure.sdk.adal.AuthenticationContext.return_value.acquire_token_with_client_credentials
+    )
+    acquire.return_value = {"error": "invalid_client"}
+
+    assert mock_azure._get_sp_token(creds) is None
+    assert mock_azure._get_sp_token(creds) is None
+    assert acquire.call_count == 2
+
+
+def test_get_secret_reads_through_cache(mock_azure: AzureCloudProvider):
+    secret_client = mock_azure.sdk.secrets.SecretClient.return_value
+    secret_client.get_secret.return_value.value = "value"
+
+    assert mock_azure.get_secret("key") == "value"
+    assert mock_azure.get_secret("key") == "value"
+    secret_client.get_secret.assert_called_once_with("key")
+
+    stats = mock_azure._secrets.stats
+    assert (stats.hits, stats.misses) == (1, 1)
+
+
+def test_set_secret_writes_through_cache(mock_azure: AzureCloudProvider):
+    secret_client = mock_azure.sdk.secrets.SecretClient.return_value
+
+    mock_azure.set_secret("key", "new value")
+
+    secret_client.set_secret.assert_called_once_with("key", "new value")
+    assert mock_azure.get_secret("key") == "new value"
+    secret_client.get_secret.assert_not_called()
+
+
+def test_update_tenant_creds_refreshes_cached_creds(mock_azure: AzureCloudProvider):
+    secret_client = mock_azure.sdk.secrets.SecretClient.return_value
+    secret_client.get_secret.return_value.value = json.dumps(MOCK_CREDS)
+    mock_azure._source_tenant_creds("tenant_id")
+
+    new_creds = {**MOCK_CREDS, "tenant_sp_key": "rotated"}
+    mock_azure.update_tenant_creds("tenant_id", new_creds)
+
+    assert mock_azure._source_tenant_creds("tenant_id").tenant_sp_key == "rotated"
+    secret_client.get_secret.assert_called_once()
+
+
+def test_invalidate_secret_forces_keyvault_read(mock_azure: AzureCloudProvider):
+    secret_client = mock_azure.sdk.secrets.SecretClient.return_value
+    secret_client.get_secret.return_value.value = "value"
+    mock_azure.get_secret("key")
+
+    mock_azure.invalidate_secret("key")
+    mock_azure.get_secret("key")
+
+    assert secret_client.get_secret.call_count == 2
+
+
+def test_failed_secret_reads_are_not_cached(mock_azure: AzureCloudProvider):
+    secret_client = mock_azure.sdk.secrets.SecretClient.return_value
+    secret_client.get_secret.side_effect = mock_azure.sdk.exceptions.HttpResponseError()
+
+    assert mock_azure.get_secret("key") is None
+    assert mock_azure.get_secret("key") is None
+    assert secret_client.get_secret.call_count == 2
+
+
+def test_sdk_modules_are_imported_on_first_access():
+    from atst.domain.csp.cloud.azure_cloud_provider import AzureSDKProvider
+
+    sdk = AzureSDKProvider()
+    assert "adal" not in vars(sdk)
+
+    import adal
+
+    assert sdk.adal is adal
+    assert "adal" in vars(sdk)
+    assert sdk.cloud.name == "AzureCloud"
+
+    with pytest.raises(AttributeError):
+        sdk.not_a_service
@@ -0,0 +1,78 @@
+import threading
+import time
+
+from atst.domain.csp.cloud.credential_cache import CredentialCache
+
+
+def test_get_builds_value_once():
+    cache = CredentialCache()
+    calls = []
+
+    def factory():
+        calls.append(1)
+        return object()
+
+    assert cache.get("key", factory) is cache.get("key", factory)
+    assert len(calls) == 1
+
+
+def test_get_expiring_refreshes_within_margin():
+    now = [0]
+    cache = CredentialCache(refresh_margin=10, clock=lambda: now[0])
+    tokens = iter(["first", "second"])
+
+    def factory():
+        return next(tokens), 60
+
+    assert cache.get_expiring("key", factory) == "first"
+    now[0] = 49
+    assert cache.get_expiring("key", factory) == "first"
+    now[0] = 50
+    assert cache.get_expiring("key", factory) == "second"
+
+
+def test_invalidate_drops_entry():
+    cache = CredentialCache()
+    cache.get("key", object)
+    assert "key" in cache
+
+    cache.invalidate("key")
+    assert "key" not in cache
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = CredentialCache(max_entries=2)
+    cache.get("first", object)
+    cache.get("second", object)
+    cache.get("first", object)
+    cache.get("third", object)
+
+    assert "first" in cache
+    assert "second" not in cache
+    assert "third" in cache
+    assert len(cache) == 2
+
+
+def test_concurrent_callers_share_one_build():
+    cache = CredentialCache()
+    calls = []
+
+    def factory():
+        calls.append(1)
+        time.sleep(0.05)
+        return "token", 3600
+
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(cache.get_expiring("key", factory))
+        )
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["token"] * 8
+    assert len(calls) == 1
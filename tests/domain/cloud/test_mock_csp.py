@@ -1,6 +1,8 @@
 import pytest
 
 from atst.domain.csp import MockCloudProvider
+from atst.domain.csp.cloud.exceptions import GeneralCSPException
+from atst.domain.csp.cloud.mock_cloud_provider import MockCloudProfile
 
 from tests.factories import EnvironmentFactory, EnvironmentRoleFactory, UserFactory
 
@@ -36,5 +38,88 @@ def test_create_or_update_user(mock_csp: MockCloudProvider):
     assert isinstance(csp_user_id, str)
 
 
+def test_create_or_update_users(mock_csp: MockCloudProvider):
+    env_roles = [EnvironmentRoleFactory.create() for _ in range(2)]
+    results = mock_csp.create_or_update_users(
+        CREDENTIALS, [(env_role, "csp_role_id") for env_role in env_roles]
+    )
+    assert len(results) == 2
+    assert all(isinstance(csp_user_id, str) for csp_user_id in results)
+
+
 def test_disable_user(mock_csp: MockCloudProvider):
     assert mock_csp.disable_user(CREDENTIALS, "csp_user_id")
+
+
+def _outcomes(csp, count=50):
+    outcomes = []
+    for _ in range(count):
+        try:
+            outcomes.append(csp.create_atat_admin_user(CREDENTIALS, "env_id")["id"])
+        except GeneralCSPException as exc:
+            outcomes.append(type(exc))
+    return outcomes
+
+
+def test_seeded_profile_is_repeatable():
+    def make_csp():
+        return MockCloudProvider(
+            config={}, profile=MockCloudProfile(seed=7, virtual_time=True)
+        )
+
+    first, second = make_csp(), make_csp()
+
+    assert _outcomes(first) == _outcomes(second)
+    assert first.clock.now == second.clock.now > 0
+
+
+def test_virtual_time_does_not_sleep(monkeypatch):
+    monkeypatch.setattr("time.sleep", lambda seconds: pytest.fail("slept"))
+    csp = MockCloudProvider(
+        config={},
+        with_failure=False,
+        profile=MockCloudProfile(
+            seed=1,
+            virtual_time=True,
+            latencies={"authorize": 0.5, "create_atat_admin_user": (2, 4)},
+        ),
+    )
+
+    csp.create_atat_admin_user(CREDENTIALS, "env_id")
+
+    assert csp.operation_calls == {"authorize": 1, "create_atat_admin_user": 1}
+    assert csp.operation_seconds["authorize"] == 0.5
+    assert 2 <= csp.operation_seconds["create_atat_admin_user"] <= 4
+    assert csp.clock.now == sum(csp.operation_seconds.values())
+
+
+def test_profile_latency_can_be_a_distribution():
+    profile = MockCloudProfile(
+        latencies={"create_tenant": lambda rng: rng.expovariate(1.0)}
+    )
+    csp = MockCloudProvider(config={}, profile=MockCloudProfile(virtual_time=True))
+
+    assert profile.latency("create_tenant", csp._random) >= 0
+    assert profile.latency("unlisted", csp._random) is None
+
+
+def test_profile_failure_rates():
+    csp = MockCloudProvider(
+        config={},
+        with_delay=False,
+        profile=MockCloudProfile(
+            failure_rates={
+                "NETWORK_FAILURE_PCT": 0,
+                "SERVER_FAILURE_PCT": 0,
+                "ATAT_ADMIN_CREATE_FAILURE_PCT": 0,
+                "UNAUTHORIZED_RATE": 0,
+            }
+        ),
+    )
+
+    assert all(isinstance(outcome, str) for outcome in _outcomes(csp))
+
+    with pytest.raises(ValueError):
+        MockCloudProvider(
+            config={}, profile=MockCloudProfile(failure_rates={"TYPO_PCT": 1})
+        )
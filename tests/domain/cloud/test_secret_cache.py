@@ -0,0 +1,39 @@
+from atst.domain.csp.cloud.secret_cache import SecretCache
+
+
+def test_secrets_expire_after_ttl():
+    now = [0]
+    cache = SecretCache(ttl=60, clock=lambda: now[0])
+    cache.set("key", "first")
+
+    now[0] = 59
+    assert cache.get("key", lambda: "second") == "first"
+    now[0] = 60
+    assert cache.get("key", lambda: "second") == "second"
+
+
+def test_secrets_are_encrypted_in_memory():
+    cache = SecretCache()
+    cache.set("key", "plaintext")
+
+    token, _ = cache._entries["key"]
+    assert b"plaintext" not in token
+    assert cache.get("key", lambda: None) == "plaintext"
+
+
+def test_zero_ttl_disables_caching():
+    cache = SecretCache(ttl=0)
+    cache.set("key", "value")
+
+    assert cache.get("key", lambda: "fetched") == "fetched"
+    assert cache.stats.size == 0
+
+
+def test_stats():
+    cache = SecretCache()
+    cache.get("key", lambda: "value")
+    cache.get("key", lambda: "value")
+    cache.set("other", "value")
+    cache.invalidate()
+
+    assert cache.stats == (1, 1, 1, 2, 0)
@@ -1,3 +1,4 @@
+import pendulum
 from datetime import datetime, timedelta
 import pytest
 from uuid import uuid4
@@ -214,3 +215,26 @@ def test_get_applications_pending_creation():
     uuids = Applications.get_applications_pending_creation()
 
     assert [app_ready.id] == uuids
+
+
+def test_get_applications_pending_creation_skips_scheduled_polls():
+    portfolio = PortfolioFactory.create(state="COMPLETED")
+    app_polling = ApplicationFactory.create(
+        portfolio=portfolio,
+        csp_data={
+            "operation_url": "url",
+            "poll_after": pendulum.now().add(seconds=30).isoformat(),
+        },
+    )
+    app_lost = ApplicationFactory.create(
+        portfolio=portfolio,
+        csp_data={
+            "operation_url": "url",
+            "poll_after": pendulum.now().subtract(minutes=10).isoformat(),
+        },
+    )
+
+    uuids = Applications.get_applications_pending_creation()
+
+    assert app_polling.id not in uuids
+    assert app_lost.id in uuids
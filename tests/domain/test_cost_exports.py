@@ -0,0 +1,184 @@
+import io
+import json
+from datetime import date
+from decimal import Decimal
+
+import pendulum
+import pytest
+
+from atst.domain.cost_exports import CostExportReportingProvider, CostExports
+from atst.models import DailySpend, JEDICLINType
+
+from tests.factories import ApplicationFactory, EnvironmentFactory
+
+
+PERIOD = (date(2020, 1, 1), date(2020, 1, 31))
+
+
+def _csv(*rows):
+    lines = ["Date,EnvironmentId,JEDICLIN,CostInBillingCurrency"] + [
+        ",".join(str(value) for value in row) for row in rows
+    ]
+    return io.StringIO("\n".join(lines) + "\n")
+
+
+def _spend(session):
+    return {
+        (spend.environment.cloud_id, spend.jedi_clin_type.name, spend.date): (
+            spend.amount
+        )
+        for spend in session.query(DailySpend)
+    }
+
+
+@pytest.fixture
+def environments():
+    application = ApplicationFactory.create()
+    return [
+        EnvironmentFactory.create(application=application, cloud_id=cloud_id)
+        for cloud_id in ("env-1", "env-2")
+    ]
+
+
+def test_ingest_aggregates_daily_spend(session, environments):
+    result = CostExports.ingest(
+        _csv(
+            ("01/02/2020", "env-1", "JEDI_CLIN_1", "10.50"),
+            ("01/02/2020", "env-1", "JEDI_CLIN_1", "1.25"),
+            ("01/02/2020", "env-1", "JEDI_CLIN_2", "3"),
+            ("01/03/2020", "env-2", "JEDI_CLIN_1", "7"),
+            ("01/03/2020", "unknown", "JEDI_CLIN_1", "100"),
+            ("01/03/2020", "env-2", "NOT_A_CLIN", "100"),
+            ("02/01/2020", "env-2", "JEDI_CLIN_1", "100"),
+        ),
+        *PERIOD,
+    )
+
+    assert result.rows == 7
+    assert result.skipped == 3
+    assert _spend(session) == {
+        ("env-1", "JEDI_CLIN_1", date(2020, 1, 2)): Decimal("11.75"),
+        ("env-1", "JEDI_CLIN_2", date(2020, 1, 2)): Decimal("3"),
+        ("env-2", "JEDI_CLIN_1", date(2020, 1, 3)): Decimal("7"),
+    }
+
+
+def test_ingest_is_idempotent_by_period(session, environments):
+    export = (("01/02/2020", "env-1", "JEDI_CLIN_1", "10"),)
+    CostExports.ingest(_csv(*export), *PERIOD)
+    CostExports.ingest(_csv(*export), *PERIOD)
+    assert _spend(session) == {
+        ("env-1", "JEDI_CLIN_1", date(2020, 1, 2)): Decimal("10")
+    }
+
+    # an export for another period leaves January alone
+    CostExports.ingest(
+        _csv(("02/02/2020", "env-1", "JEDI_CLIN_1", "5")),
+        date(2020, 2, 1),
+        date(2020, 2, 29),
+    )
+    # a new January export replaces the old one
+    CostExports.ingest(_csv(("01/05/2020", "env-1", "JEDI_CLIN_3", "2")), *PERIOD)
+    assert _spend(session) == {
+        ("env-1", "JEDI_CLIN_1", date(2020, 2, 2)): Decimal("5"),
+        ("env-1", "JEDI_CLIN_3", date(2020, 1, 5)): Decimal("2"),
+    }
+
+
+def test_ingest_only_replaces_environments_in_export(session, environments):
+    CostExports.ingest(
+        _csv(
+            ("01/02/2020", "env-1", "JEDI_CLIN_1", "10"),
+            ("01/02/2020", "env-2", "JEDI_CLIN_1", "20"),
+        ),
+        *PERIOD,
+    )
+
+    # e.g. the export of another tenant, covering the same period
+    CostExports.ingest(_csv(("01/03/2020", "env-2", "JEDI_CLIN_2", "3")), *PERIOD)
+    assert _spend(session) == {
+        ("env-1", "JEDI_CLIN_1", date(2020, 1, 2)): Decimal("10"),
+        ("env-2", "JEDI_CLIN_2", date(2020, 1, 3)): Decimal("3"),
+    }
+
+
+def test_ingest_in_batches(app, session, environments, monkeypatch):
+    monkeypatch.setitem(app.config, "COST_EXPORT_BATCH_SIZE", 1)
+    CostExports.ingest(_csv(("01/02/2020", "env-1", "JEDI_CLIN_1", "100")), *PERIOD)
+
+    CostExports.ingest(
+        _csv(
+            ("01/02/2020", "env-1", "JEDI_CLIN_1", "1"),
+            ("01/03/2020", "env-1", "JEDI_CLIN_1", "2"),
+            ("01/02/2020", "env-1", "JEDI_CLIN_1", "4"),
+        ),
+        *PERIOD,
+    )
+    assert _spend(session) == {
+        ("env-1", "JEDI_CLIN_1", date(2020, 1, 2)): Decimal("5"),
+        ("env-1", "JEDI_CLIN_1", date(2020, 1, 3)): Decimal("2"),
+    }
+
+
+def test_ingest_json_lines(session, environments):
+    export = io.StringIO(
+        "\n".join(
+            json.dumps(row)
+            for row in [
+                {
+                    "Date": "2020-01-02",
+                    "EnvironmentId": "env-1",
+                    "JEDICLIN": "JEDI_CLIN_2",
+                    "CostInBillingCurrency": 2.5,
+                },
+                {
+                    "Date": "2020-01-02",
+                    "EnvironmentId": "env-1",
+                    "JEDICLIN": "JEDI_CLIN_2",
+                    "CostInBillingCurrency": 0.1,
+                },
+            ]
+        )
+    )
+    CostExports.ingest(export, *PERIOD, format="jsonl")
+    assert _spend(session) == {
+        ("env-1", "JEDI_CLIN_2", date(2020, 1, 2)): Decimal("2.60")
+    }
+
+
+def test_ingest_rejects_unknown_format():
+    with pytest.raises(ValueError):
+        CostExports.ingest(io.StringIO(""), *PERIOD, format="xml")
+
+
+def test_cost_export_reporting_provider(session):
+    environment = EnvironmentFactory.create(name="Env", cloud_id="env-1")
+    portfolio = environment.application.portfolio
+    today = pendulum.today()
+    this_month = today.start_of("month")
+    last_month = this_month.subtract(months=1)
+    CostExports.ingest(
+        _csv(
+            (this_month.to_date_string(), "env-1", "JEDI_CLIN_1", "10"),
+            (last_month.to_date_string(), "env-1", "JEDI_CLIN_1", "20"),
+            (last_month.to_date_string(), "env-1", "JEDI_CLIN_2", "5"),
+            (
+                last_month.subtract(months=1).to_date_string(),
+                "env-1",
+                "JEDI_CLIN_1",
+                "40",
+            ),
+        ),
+        last_month.subtract(months=1).date(),
+        today.date(),
+    )
+
+    provider = CostExportReportingProvider()
+    [application] = provider.get_portfolio_monthly_spending(portfolio)
+    assert application["environments"] == [
+        {"name": "Env", "this_month": 10, "last_month": 25, "total": 75}
+    ]
+    assert provider.get_spending_by_JEDI_clin(portfolio) == {
+        "JEDI_CLIN_1": {"estimated": Decimal("10"), "invoiced": Decimal("70")},
+        "JEDI_CLIN_2": {"invoiced": Decimal("5")},
+    }
@@ -1,5 +1,6 @@
 import pytest
 import pendulum
+from unittest.mock import Mock
 from uuid import uuid4
 
 from atst.domain.environments import Environments
@@ -119,6 +120,38 @@ def test_update_does_not_duplicate_names_within_application():
         Environments.update(dupe_env, name)
 
 
+def test_create_enqueues_environment_creation(app, monkeypatch):
+    monkeypatch.setitem(app.config, "ENQUEUE_ON_COMMIT", True)
+    send_task = Mock()
+    monkeypatch.setattr("atst.queue.celery.send_task", send_task)
+    application = ApplicationFactory.create()
+
+    environment = Environments.create(
+        application.portfolio.owner, application, "New Environment"
+    )
+
+    send_task.assert_called_once_with(
+        "atst.jobs.dispatch_create_environment",
+        kwargs={"environment_id": environment.id},
+    )
+
+
+def test_failed_create_does_not_enqueue_environment_creation(app, monkeypatch):
+    monkeypatch.setitem(app.config, "ENQUEUE_ON_COMMIT", True)
+    send_task = Mock()
+    monkeypatch.setattr("atst.queue.celery.send_task", send_task)
+    environment = EnvironmentFactory.create()
+
+    with pytest.raises(AlreadyExistsError):
+        Environments.create(
+            environment.application.portfolio.owner,
+            environment.application,
+            environment.name,
+        )
+
+    send_task.assert_not_called()
+
+
 class EnvQueryTest:
     @property
     def NOW(self):
@@ -174,6 +207,15 @@ class TestGetEnvironmentsPendingCreate(EnvQueryTest):
         )
         assert len(Environments.get_environments_pending_creation(self.NOW)) == 0
 
+    def test_filtered_by_environment_id(self, session):
+        portfolio = self.create_portfolio_with_clins([(self.YESTERDAY, self.TOMORROW)])
+        self.create_portfolio_with_clins([(self.YESTERDAY, self.TOMORROW)])
+        environment = portfolio.applications[0].environments[0]
+
+        assert Environments.get_environments_pending_creation(
+            self.NOW, environment_id=environment.id
+        ) == [environment.id]
+
 
 class TestGetEnvironmentsPendingAtatUserCreation(EnvQueryTest):
     def test_with_provisioned_environment(self):
@@ -0,0 +1,162 @@
+import pendulum
+import pytest
+
+from atst.domain.job_failures import JobFailures, write_telemetry
+from atst.models import JobAttempt, JobAttemptStatus, JobFailure
+
+
+@pytest.fixture
+def since():
+    return pendulum.now().subtract(days=1)
+
+
+def _attempt(status, task_name="atst.jobs.create_environment", **kwargs):
+    attrs = {
+        "task_id": "task-id",
+        "task_name": task_name,
+        "status": status,
+        "attempt": 0,
+        "duration": 1.0,
+    }
+    attrs.update(kwargs)
+    return attrs
+
+
+@pytest.fixture
+def default_batching(app, monkeypatch):
+    monkeypatch.setitem(app.config, "JOB_ATTEMPT_BATCH_SIZE", 50)
+    monkeypatch.setitem(app.config, "JOB_ATTEMPT_FLUSH_INTERVAL", 60)
+    yield
+    JobFailures.flush_attempts()
+
+
+def test_attempts_are_written_in_batches(session, default_batching):
+    for _ in range(49):
+        JobFailures.record_attempt(**_attempt(JobAttemptStatus.SUCCEEDED))
+    assert session.query(JobAttempt).count() == 0
+
+    JobFailures.record_attempt(**_attempt(JobAttemptStatus.FAILED))
+    assert session.query(JobAttempt).count() == 50
+
+    JobFailures.record_attempt(**_attempt(JobAttemptStatus.SUCCEEDED))
+    assert session.query(JobAttempt).count() == 50
+    JobFailures.flush_attempts()
+    assert session.query(JobAttempt).count() == 51
+
+
+def test_attempts_are_written_after_flush_interval(
+    app, session, default_batching, monkeypatch
+):
+    monkeypatch.setitem(app.config, "JOB_ATTEMPT_FLUSH_INTERVAL", 0.01)
+
+    JobFailures.record_attempt(**_attempt(JobAttemptStatus.SUCCEEDED))
+    JobFailures.record_attempt(**_attempt(JobAttemptStatus.RETRIED))
+    timer = JobFailures._flush_timer
+    assert session.query(JobAttempt).count() == 0
+
+    timer.join(timeout=5)
+    assert JobFailures._flush_timer is None
+    assert session.query(JobAttempt).count() == 2
+
+
+def test_flush_cancels_flush_timer(session, default_batching):
+    JobFailures.record_attempt(**_attempt(JobAttemptStatus.SUCCEEDED))
+    timer = JobFailures._flush_timer
+    assert timer.is_alive()
+
+    JobFailures.flush_attempts()
+    timer.join(timeout=5)
+    assert not timer.is_alive()
+    assert session.query(JobAttempt).count() == 1
+
+
+def test_flush_does_not_commit_the_session(session, default_batching):
+    session.add(JobFailure(task_id="task-id", entity="environment", entity_id="1234"))
+    JobFailures.record_attempt(**_attempt(JobAttemptStatus.FAILED))
+    JobFailures.flush_attempts()
+    session.expunge_all()
+
+    assert session.query(JobAttempt).count() == 1
+    assert session.query(JobFailure).count() == 0
+
+
+def test_attempts_are_kept_when_write_fails(session, default_batching, monkeypatch):
+    def fail(statement, rows):
+        raise Exception("database unavailable")
+
+    JobFailures.record_attempt(**_attempt(JobAttemptStatus.FAILED))
+    monkeypatch.setattr("atst.domain.job_failures.write_telemetry", fail)
+    JobFailures.flush_attempts()
+    assert len(JobFailures._pending_attempts) == 1
+
+    monkeypatch.setattr("atst.domain.job_failures.write_telemetry", write_telemetry)
+    JobFailures.flush_attempts()
+    assert JobFailures._pending_attempts == []
+    assert session.query(JobAttempt).count() == 1
+
+
+def test_failure_rates(session, since):
+    for status in [
+        JobAttemptStatus.SUCCEEDED,
+        JobAttemptStatus.RETRIED,
+        JobAttemptStatus.FAILED,
+    ]:
+        JobFailures.record_attempt(**_attempt(status, duration=2.0))
+    JobFailures.record_attempt(
+        **_attempt(
+            JobAttemptStatus.SUCCEEDED, task_name="atst.jobs.create_user", duration=1.0
+        )
+    )
+
+    rates = JobFailures.failure_rates(since)
+
+    assert [r.task_name for r in rates] == [
+        "atst.jobs.create_environment",
+        "atst.jobs.create_user",
+    ]
+    environment_rate = rates[0]
+    assert environment_rate.attempts == 3
+    assert environment_rate.retried == 1
+    assert environment_rate.failure_rate == 0.5
+    assert environment_rate.average_duration == 2.0
+    assert rates[1].failure_rate == 0.0
+
+
+def test_operation_failures(session, since):
+    for status, operation in [
+        (JobAttemptStatus.FAILED, "create_environment"),
+        (JobAttemptStatus.FAILED, "create_environment"),
+        (JobAttemptStatus.RETRIED, "create_environment"),
+        (JobAttemptStatus.RETRIED, "create_atat_admin_user"),
+        (JobAttemptStatus.SUCCEEDED, "create_atat_admin_user"),
+        (JobAttemptStatus.FAILED, None),
+    ]:
+        JobFailures.record_attempt(**_attempt(status, csp_operation=operation))
+
+    environment, admin_user = JobFailures.operation_failures(since)
+
+    assert environment == ("create_environment", 1, 2, 1.0)
+    assert admin_user == ("create_atat_admin_user", 1, 0, 1.0)
+
+
+def test_hot_entities(session, since):
+    for task_name in ["atst.jobs.create_environment", "atst.jobs.create_user"]:
+        session.add(
+            JobFailure(
+                task_id="task-id",
+                task_name=task_name,
+                entity="environment",
+                entity_id="hot",
+            )
+        )
+    session.add(JobFailure(task_id="task-id", entity="portfolio", entity_id="cold"))
+    session.commit()
+
+    hot, cold = JobFailures.hot_entities(since)
+
+    assert (hot.entity_id, hot.failures) == ("hot", 2)
+    assert sorted(hot.task_names) == [
+        "atst.jobs.create_environment",
+        "atst.jobs.create_user",
+    ]
+    assert (cold.entity_id, cold.failures, cold.task_names) == ("cold", 1, [])
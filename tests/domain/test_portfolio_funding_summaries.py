@@ -0,0 +1,191 @@
+import datetime
+from unittest.mock import Mock, call
+
+import pendulum
+
+from atst.domain.portfolios import PortfolioFundingSummaries
+from atst.models import PortfolioFundingSummary
+
+from tests.factories import (
+    CLINFactory,
+    PortfolioFactory,
+    TaskOrderFactory,
+    random_future_date,
+    random_past_date,
+)
+
+
+def _active_task_order(portfolio, **clin):
+    return TaskOrderFactory.create(
+        portfolio=portfolio,
+        signed_at=random_past_date(),
+        create_clins=[
+            {
+                "start_date": random_past_date(),
+                "end_date": random_future_date(),
+                **clin,
+            }
+        ],
+    )
+
+
+def test_summary_matches_portfolio(session):
+    portfolio = PortfolioFactory.create()
+    _active_task_order(portfolio, obligated_amount=1000, total_amount=5000)
+    _active_task_order(portfolio, obligated_amount=500, total_amount=2000)
+    # expired and unsigned task orders are not counted
+    TaskOrderFactory.create(
+        portfolio=portfolio,
+        signed_at=random_past_date(),
+        create_clins=[
+            {
+                "start_date": random_past_date(year_min=2),
+                "end_date": datetime.date.today() - datetime.timedelta(days=1),
+            }
+        ],
+    )
+    TaskOrderFactory.create(portfolio=portfolio, create_clins=[{}])
+
+    summary = PortfolioFundingSummaries.get(portfolio)
+
+    assert summary.obligated_funds == 1500
+    assert summary.total_funds == 7000
+    assert summary.active_task_orders == 2
+    assert summary.active_clins == len(portfolio.active_clins)
+    assert summary.funding_duration == portfolio.funding_duration
+    assert summary.days_to_funding_expiration == portfolio.days_to_funding_expiration
+
+
+def test_summary_funding_ends_with_upcoming_task_orders(session):
+    portfolio = PortfolioFactory.create()
+    active = _active_task_order(portfolio)
+    upcoming_end_date = active.end_date + datetime.timedelta(days=365)
+    TaskOrderFactory.create(
+        portfolio=portfolio,
+        signed_at=random_past_date(),
+        create_clins=[
+            {
+                "start_date": active.end_date + datetime.timedelta(days=1),
+                "end_date": upcoming_end_date,
+            }
+        ],
+    )
+
+    summary = PortfolioFundingSummaries.get(portfolio)
+
+    assert summary.active_task_orders == 1
+    assert summary.funding_duration == (active.start_date, upcoming_end_date)
+    assert (
+        summary.days_to_funding_expiration
+        == (upcoming_end_date - pendulum.today(tz="UTC").date()).days
+    )
+    # unlike the portfolio's own duration, which only covers active task orders
+    assert portfolio.funding_duration == (active.start_date, active.end_date)
+
+
+def test_summary_for_unfunded_portfolio(session):
+    summary = PortfolioFundingSummaries.get(PortfolioFactory.create())
+
+    assert summary.obligated_funds == 0
+    assert summary.active_task_orders == 0
+    assert summary.funding_duration == (None, None)
+    assert summary.days_to_funding_expiration == 0
+
+
+def test_get_does_not_save_summary(session):
+    portfolio = PortfolioFactory.create()
+    _active_task_order(portfolio, obligated_amount=1000)
+
+    assert PortfolioFundingSummaries.get(portfolio).obligated_funds == 1000
+    assert session.query(PortfolioFundingSummary).count() == 0
+
+
+def test_refreshed_summary_is_reused(session, monkeypatch):
+    portfolio = PortfolioFactory.create()
+    _active_task_order(portfolio, obligated_amount=1000)
+    PortfolioFundingSummaries.refresh(portfolio)
+
+    compute = Mock()
+    monkeypatch.setattr(PortfolioFundingSummaries, "_compute", compute)
+    assert PortfolioFundingSummaries.get(portfolio).obligated_funds == 1000
+    compute.assert_not_called()
+
+
+def test_summary_is_invalidated_by_clin_writes(session):
+    portfolio = PortfolioFactory.create()
+    task_order = _active_task_order(portfolio, obligated_amount=1000)
+    PortfolioFundingSummaries.refresh(portfolio)
+
+    CLINFactory.create(
+        task_order=task_order,
+        obligated_amount=200,
+        start_date=random_past_date(),
+        end_date=random_future_date(),
+    )
+    assert session.query(PortfolioFundingSummary).count() == 0
+    assert PortfolioFundingSummaries.get(portfolio).obligated_funds == 1200
+
+    PortfolioFundingSummaries.refresh(portfolio)
+    clin = task_order.clins[0]
+    clin.obligated_amount = 100
+    session.commit()
+    assert session.query(PortfolioFundingSummary).count() == 0
+    assert PortfolioFundingSummaries.get(portfolio).obligated_funds == 300
+
+
+def test_summary_is_invalidated_by_task_order_writes(session):
+    portfolio = PortfolioFactory.create()
+    task_order = TaskOrderFactory.create(
+        portfolio=portfolio,
+        create_clins=[
+            {
+                "start_date": random_past_date(),
+                "end_date": random_future_date(),
+                "obligated_amount": 1000,
+            }
+        ],
+    )
+    PortfolioFundingSummaries.refresh(portfolio)
+    assert PortfolioFundingSummaries.get(portfolio).active_task_orders == 0
+
+    task_order.signed_at = datetime.datetime.now()
+    session.commit()
+    assert PortfolioFundingSummaries.get(portfolio).active_task_orders == 1
+
+    PortfolioFundingSummaries.refresh(portfolio)
+    session.delete(task_order)
+    session.commit()
+    assert PortfolioFundingSummaries.get(portfolio).active_task_orders == 0
+
+
+def test_funding_writes_enqueue_refresh(app, session, monkeypatch):
+    monkeypatch.setitem(app.config, "ENQUEUE_ON_COMMIT", True)
+    send_task = Mock()
+    monkeypatch.setattr("atst.queue.celery.send_task", send_task)
+    portfolio = PortfolioFactory.create()
+    send_task.reset_mock()
+
+    _active_task_order(portfolio)
+
+    assert (
+        call("atst.jobs.refresh_funding_summary", kwargs={"portfolio_id": portfolio.id})
+        in send_task.call_args_list
+    )
+
+
+def test_stale_summary_is_recomputed_on_read(session):
+    portfolio = PortfolioFactory.create()
+    _active_task_order(portfolio, obligated_amount=1000)
+    PortfolioFundingSummaries.refresh(portfolio)
+    summary = session.query(PortfolioFundingSummary).one()
+    summary.computed_on = pendulum.yesterday(tz="UTC").date()
+    summary.obligated_funds = 0
+    session.commit()
+
+    summary = PortfolioFundingSummaries.get(portfolio)
+    assert summary.computed_on == pendulum.today(tz="UTC").date()
+    assert summary.obligated_funds == 1000
+    assert PortfolioFundingSummaries.get_portfolios_pending_refresh() == [portfolio.id]
+
+    PortfolioFundingSummaries.refresh(portfolio)
+    assert PortfolioFundingSummaries.get_portfolios_pending_refresh() == []
@@ -10,7 +10,13 @@ from tests.factories import (
 from atst.models import FSMStates, PortfolioStateMachine, TaskOrder
 from atst.models.mixins.state_machines import AzureStages, StageStates, compose_state
 from atst.models.portfolio import Portfolio
-from atst.models.portfolio_state_machine import get_stage_csp_class
+from atst.models.portfolio_state_machine import (
+    STAGE_CSP_CLASSES,
+    _validate_stage_csp_classes,
+    compiled_machine,
+    get_stage_csp_class,
+)
+from atst.domain.csp.cloud import MockCloudProvider
 
 # TODO: Write failure case tests
 
@@ -37,6 +43,21 @@ def test_state_machine_trigger_next_transition(portfolio):
     assert sm.current_state == FSMStates.STARTED
 
 
+def test_state_machines_share_compiled_machine(session, portfolio):
+    sm = PortfolioStateMachineFactory.create(portfolio=portfolio)
+    other_sm = PortfolioStateMachineFactory.create()
+    assert sm.machine is other_sm.machine is compiled_machine()
+
+    session.expire_all()
+    loaded = session.query(PortfolioStateMachine).get(sm.id)
+    assert "machine" not in vars(loaded)
+    assert loaded.current_state == FSMStates.UNSTARTED
+
+    loaded.init()
+    assert loaded.current_state == FSMStates.STARTING
+    assert other_sm.current_state == FSMStates.UNSTARTED
+
+
 def test_state_machine_compose_state(portfolio):
     PortfolioStateMachineFactory.create(portfolio=portfolio)
     assert (
@@ -52,6 +73,23 @@ def test_state_machine_valid_data_classes_for_stages(portfolio):
         assert get_stage_csp_class(stage.name.lower(), "result") is not None
 
 
+def test_stage_csp_classes_validation():
+    _validate_stage_csp_classes(STAGE_CSP_CLASSES, AzureStages, [MockCloudProvider])
+
+    incomplete = dict(STAGE_CSP_CLASSES)
+    del incomplete[AzureStages.TENANT]
+    with pytest.raises(ValueError):
+        _validate_stage_csp_classes(incomplete, AzureStages, [MockCloudProvider])
+
+    class IncompleteProvider:
+        pass
+
+    with pytest.raises(ValueError):
+        _validate_stage_csp_classes(
+            STAGE_CSP_CLASSES, AzureStages, [IncompleteProvider]
+        )
+
+
 def test_state_machine_initialization(portfolio):
 
     sm = PortfolioStateMachineFactory.create(portfolio=portfolio)
@@ -82,6 +120,40 @@ def test_state_machine_initialization(portfolio):
         assert ["reset", "fail", create_trigger] == started_triggers
 
 
+def _provisioning_data(portfolio):
+    ppoc = portfolio.owner
+    user_id = f"{ppoc.first_name[0]}{ppoc.last_name}".lower()
+    domain_name = re.sub("[^0-9a-zA-Z]+", "", portfolio.name).lower()
+
+    initial_task_order: TaskOrder = portfolio.task_orders[0]
+    initial_clin = initial_task_order.sorted_clins[0]
+
+    return {
+        "billing_account_name": "billing_account_name",
+        "user_id": user_id,
+        "password": "jklfsdNCVD83nklds2#202",  # pragma: allowlist secret
+        "domain_name": domain_name,
+        "first_name": ppoc.first_name,
+        "last_name": ppoc.last_name,
+        "country_code": "US",
+        "password_recovery_email_address": ppoc.email,
+        "address": {  # TODO: TBD if we're sourcing this from data or config
+            "company_name": "",
+            "address_line_1": "",
+            "city": "",
+            "region": "",
+            "country": "",
+            "postal_code": "",
+        },
+        "billing_profile_display_name": "My Billing Profile",
+        "initial_clin_amount": initial_clin.obligated_amount,
+        "initial_clin_start_date": initial_clin.start_date.strftime("%Y/%m/%d"),
+        "initial_clin_end_date": initial_clin.end_date.strftime("%Y/%m/%d"),
+        "initial_clin_type": initial_clin.number,
+        "initial_task_order_id": initial_task_order.number,
+    }
+
+
 @mock.patch("atst.domain.csp.cloud.MockCloudProvider")
 def test_fsm_transition_start(mock_cloud_provider, portfolio: Portfolio):
     mock_cloud_provider._authorize.return_value = None
@@ -113,46 +185,54 @@ def test_fsm_transition_start(mock_cloud_provider, portfolio: Portfolio):
     else:
         csp_data = {}
 
-    ppoc = portfolio.owner
-    user_id = f"{ppoc.first_name[0]}{ppoc.last_name}".lower()
-    domain_name = re.sub("[^0-9a-zA-Z]+", "", portfolio.name).lower()
-
-    initial_task_order: TaskOrder = portfolio.task_orders[0]
-    initial_clin = initial_task_order.sorted_clins[0]
-
-    portfolio_data = {
-        "user_id": user_id,
-        "password": "jklfsdNCVD83nklds2#202",  # pragma: allowlist secret
-        "domain_name": domain_name,
-        "first_name": ppoc.first_name,
-        "last_name": ppoc.last_name,
-        "country_code": "US",
-        "password_recovery_email_address": ppoc.email,
-        "address": {  # TODO: TBD if we're sourcing this from data or config
-            "company_name": "",
-            "address_line_1": "",
-            "city": "",
-            "region": "",
-            "country": "",
-            "postal_code": "",
-        },
-        "billing_profile_display_name": "My Billing Profile",
-        "initial_clin_amount": initial_clin.obligated_amount,
-        "initial_clin_start_date": initial_clin.start_date.strftime("%Y/%m/%d"),
-        "initial_clin_end_date": initial_clin.end_date.strftime("%Y/%m/%d"),
-        "initial_clin_type": initial_clin.number,
-        "initial_task_order_id": initial_task_order.number,
-    }
-
-    config = {"billing_account_name": "billing_account_name"}
+    portfolio_data = _provisioning_data(portfolio)
 
     for expected_state in expected_states:
-        collected_data = dict(
-            list(csp_data.items()) + list(portfolio_data.items()) + list(config.items())
-        )
+        collected_data = dict(list(csp_data.items()) + list(portfolio_data.items()))
         sm.trigger_next_transition(creds=creds, csp_data=collected_data)
         assert sm.state == expected_state
         if portfolio.csp_data is not None:
             csp_data = portfolio.csp_data
         else:
             csp_data = {}
+
+
+def test_fsm_advance(portfolio):
+    sm = PortfolioStateMachineFactory.create(portfolio=portfolio)
+    creds = {"username": "mock-cloud", "password": "shh"}  # pragma: allowlist secret
+    portfolio_data = _provisioning_data(portfolio)
+
+    # stops once the CSP asks for a delay before verifying the billing profile
+    assert sm.advance(creds=creds, csp_data=portfolio_data) == 10
+    assert sm.state == FSMStates.BILLING_PROFILE_CREATION_CREATED
+
+    assert sm.advance(creds=creds, csp_data=portfolio_data) == 10
+    assert sm.state == FSMStates.TASK_ORDER_BILLING_CREATION_CREATED
+
+    assert sm.advance(creds=creds, csp_data=portfolio_data) is None
+    assert sm.state == FSMStates.BILLING_INSTRUCTION_CREATED
+
+
+def test_fsm_advance_fails_stage_without_payload(portfolio):
+    sm = PortfolioStateMachineFactory.create(portfolio=portfolio)
+
+    assert sm.advance() is None
+    assert sm.state == FSMStates.TENANT_FAILED
+
+
+def test_fsm_records_transitions(portfolio):
+    sm = PortfolioStateMachineFactory.create(portfolio=portfolio)
+    sm.advance()
+
+    transitions = sm.state_transitions.all()
+    assert [(t.source, t.dest, t.trigger) for t in transitions] == [
+        ("UNSTARTED", "STARTING", "init"),
+        ("STARTING", "STARTED", "start"),
+        ("STARTED", "TENANT_IN_PROGRESS", "create_tenant"),
+        ("TENANT_IN_PROGRESS", "TENANT_FAILED", "fail_tenant"),
+    ]
+    assert all(t.portfolio_id == portfolio.id for t in transitions)
+    assert transitions[0].duration is None
+    assert all(t.duration >= 0 for t in transitions[1:])
+    assert transitions[-1].error
+    assert all(t.error is None for t in transitions[:-1])
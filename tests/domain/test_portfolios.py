@@ -1,4 +1,6 @@
+from datetime import timedelta
 import pytest
+from unittest.mock import Mock
 from uuid import uuid4
 
 from atst.domain.exceptions import NotFoundError, UnauthorizedError
@@ -8,6 +10,7 @@ from atst.domain.portfolios import (
     PortfolioDeletionApplicationsExistError,
     PortfolioStateMachines,
 )
+from atst.domain.portfolios.query import PortfoliosQuery
 from atst.domain.portfolio_roles import PortfolioRoles
 from atst.domain.applications import Applications
 from atst.domain.application_roles import ApplicationRoles
@@ -15,7 +18,9 @@ from atst.domain.environments import Environments
 from atst.domain.permission_sets import PermissionSets, PORTFOLIO_PERMISSION_SETS
 from atst.models.application_role import Status as ApplicationRoleStatus
 from atst.models.portfolio_role import Status as PortfolioRoleStatus
-from atst.models import FSMStates
+import pendulum
+
+from atst.models import FSMStates, PortfolioStateTransition
 
 from tests.factories import (
     ApplicationFactory,
@@ -263,6 +268,19 @@ def test_create_state_machine(portfolio):
     assert fsm
 
 
+def test_create_state_machine_enqueues_provisioning(app, monkeypatch, portfolio):
+    monkeypatch.setitem(app.config, "ENQUEUE_ON_COMMIT", True)
+    send_task = Mock()
+    monkeypatch.setattr("atst.queue.celery.send_task", send_task)
+
+    fsm = PortfolioStateMachines.create(portfolio)
+    PortfoliosQuery.add_and_commit(fsm)
+
+    send_task.assert_called_once_with(
+        "atst.jobs.dispatch_provision_portfolio", kwargs={"portfolio_id": portfolio.id},
+    )
+
+
 def test_get_portfolios_pending_provisioning(session):
     for x in range(5):
         portfolio = PortfolioFactory.create()
@@ -270,3 +288,159 @@ def test_get_portfolios_pending_provisioning(session):
         if x == 2:
             sm.state = FSMStates.COMPLETED
     assert len(Portfolios.get_portfolios_pending_provisioning()) == 4
+
+
+def _state_machine_in(session, state):
+    sm = PortfolioStateMachineFactory.create()
+    sm.state = state
+    session.commit()
+    return sm
+
+
+def test_get_portfolios_pending_provisioning_skips_failed_and_limits(session):
+    now = pendulum.now("UTC")
+    pending = []
+    for minutes in (3, 2, 1):
+        sm = PortfolioStateMachineFactory.create()
+        sm.time_created = now.subtract(minutes=minutes)
+        pending.append(sm)
+    for state in [FSMStates.FAILED, FSMStates.TENANT_FAILED]:
+        _state_machine_in(session, state)
+
+    assert Portfolios.get_portfolios_pending_provisioning(limit=2) == [
+        sm.portfolio_id for sm in pending[:2]
+    ]
+
+
+def test_count_portfolios_provisioning(session):
+    for state in [
+        FSMStates.UNSTARTED,
+        FSMStates.STARTING,
+        FSMStates.TENANT_CREATED,
+        FSMStates.BILLING_PROFILE_CREATION_IN_PROGRESS,
+        FSMStates.TENANT_FAILED,
+        FSMStates.COMPLETED,
+    ]:
+        _state_machine_in(session, state)
+
+    an_hour_ago = pendulum.now("UTC").subtract(hours=1)
+    assert Portfolios.count_portfolios_provisioning(an_hour_ago) == 3
+    assert (
+        Portfolios.count_portfolios_provisioning(pendulum.now("UTC").add(hours=1)) == 0
+    )
+
+
+def _add_transition(session, sm, source, dest, transitioned_at, duration=None):
+    session.add(
+        PortfolioStateTransition(
+            portfolio_state_machine_id=sm.id,
+            portfolio_id=sm.portfolio_id,
+            source=source,
+            dest=dest,
+            trigger="trigger",
+            transitioned_at=transitioned_at,
+            duration=duration,
+        )
+    )
+    session.commit()
+
+
+def test_get_state_durations(session):
+    now = pendulum.now("UTC")
+    sm = PortfolioStateMachineFactory.create()
+    for duration in range(1, 21):
+        _add_transition(
+            session, sm, "TENANT_IN_PROGRESS", "TENANT_CREATED", now, duration
+        )
+    _add_transition(
+        session, sm, "STARTED", "TENANT_IN_PROGRESS", now.subtract(days=2), 100
+    )
+
+    (durations,) = PortfolioStateMachines.get_state_durations(now.subtract(days=1))
+
+    assert durations.state == "TENANT_IN_PROGRESS"
+    assert durations.transitions == 20
+    assert durations.average_duration == 10.5
+    assert durations.percentile_duration == pytest.approx(19.05)
+
+
+def test_get_stuck(session):
+    now = pendulum.now("UTC")
+    stuck = PortfolioStateMachineFactory.create()
+    recent = PortfolioStateMachineFactory.create()
+    moved_on = PortfolioStateMachineFactory.create()
+    stuck.state = recent.state = FSMStates.TENANT_IN_PROGRESS
+    moved_on.state = FSMStates.TENANT_CREATED
+    session.commit()
+
+    _add_transition(
+        session, stuck, "STARTED", "TENANT_IN_PROGRESS", now.subtract(hours=2)
+    )
+    _add_transition(session, recent, "STARTED", "TENANT_IN_PROGRESS", now)
+    _add_transition(
+        session, moved_on, "STARTED", "TENANT_IN_PROGRESS", now.subtract(hours=3)
+    )
+    _add_transition(
+        session, moved_on, "TENANT_IN_PROGRESS", "TENANT_CREATED", now.subtract(hours=2)
+    )
+
+    results = PortfolioStateMachines.get_stuck(FSMStates.TENANT_IN_PROGRESS, 30)
+
+    assert [(sm.id, entered_at) for sm, entered_at in results] == [
+        (stuck.id, now.subtract(hours=2))
+    ]
+
+
+def test_get_stuck_without_transitions(session):
+    now = pendulum.now("UTC")
+    stuck = PortfolioStateMachineFactory.create()
+    recent = PortfolioStateMachineFactory.create()
+    stuck.state = recent.state = FSMStates.TENANT_IN_PROGRESS
+    session.commit()
+    stuck.time_updated = now.subtract(hours=1)
+    session.commit()
+
+    results = PortfolioStateMachines.get_stuck(FSMStates.TENANT_IN_PROGRESS, 30)
+
+    assert [(sm.id, entered_at) for sm, entered_at in results] == [
+        (stuck.id, now.subtract(hours=1))
+    ]
+
+
+def test_get_portfolios_pending_funding_expiration_notice(session):
+    today = pendulum.today(tz="UTC").date()
+    notice_days = [30, 7, 1]
+
+    def pending(on=today):
+        return Portfolios.get_portfolios_pending_funding_expiration_notice(
+            notice_days, on
+        )
+
+    portfolio = PortfolioFactory.create(funding_end_date=today + timedelta(days=20))
+    assert pending() == [portfolio.id]
+
+    Portfolios.record_funding_expiration_notice(portfolio, 30)
+    session.commit()
+    assert pending() == []
+
+    # the funding end date moved within the next threshold
+    portfolio.funding_end_date = today + timedelta(days=5)
+    session.commit()
+    assert pending() == [portfolio.id]
+
+    Portfolios.record_funding_expiration_notice(portfolio, 7)
+    session.commit()
+    assert pending() == []
+
+    # funding was extended, so a notice is due again once it is near its end
+    portfolio.funding_end_date = today + timedelta(days=25)
+    session.commit()
+    assert pending() == [portfolio.id]
+
+    Portfolios.record_funding_expiration_notice(portfolio, 30)
+    session.commit()
+    assert pending(today + timedelta(days=10)) == []
+    # a run that was missed is caught up with the next threshold
+    assert pending(today + timedelta(days=20)) == [portfolio.id]
+    # funding that has ended is no longer notified
+    assert pending(today + timedelta(days=26)) == []
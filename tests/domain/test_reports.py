@@ -1,8 +1,177 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest.mock import Mock
+from uuid import uuid4
+
+import pytest
+from redis.exceptions import RedisError
+
+from atst.database import db
+from atst.domain.reports import ReportCache, Reports
+from atst.models import JEDICLINType
+
+from tests.factories import (
+    ApplicationFactory,
+    CLINFactory,
+    PortfolioFactory,
+    TaskOrderFactory,
+)
+
+
 # TODO: Implement when we get real reporting data
 def test_expired_task_orders():
     pass
 
 
-# TODO: Implement when we get real reporting data
 def test_obligated_funds_by_JEDI_clin():
-    pass
+    yesterday = date.today() - timedelta(days=1)
+    tomorrow = date.today() + timedelta(days=1)
+    portfolio = PortfolioFactory.create()
+    task_order = TaskOrderFactory.create(portfolio=portfolio, signed_at=yesterday)
+
+    def clin(jedi_clin_type, obligated_amount, **kwargs):
+        attrs = {
+            "task_order": task_order,
+            "start_date": yesterday,
+            "end_date": tomorrow,
+            **kwargs,
+        }
+        return CLINFactory.create(
+            jedi_clin_type=jedi_clin_type, obligated_amount=obligated_amount, **attrs
+        )
+
+    # interleaved CLIN types are all counted
+    clin(JEDICLINType.JEDI_CLIN_1, 100)
+    clin(JEDICLINType.JEDI_CLIN_2, 20)
+    clin(JEDICLINType.JEDI_CLIN_1, 300)
+    # inactive CLINs are not
+    clin(JEDICLINType.JEDI_CLIN_1, 5000, end_date=yesterday)
+    CLINFactory.create(
+        task_order=TaskOrderFactory.create(portfolio=portfolio),
+        jedi_clin_type=JEDICLINType.JEDI_CLIN_3,
+        start_date=yesterday,
+        end_date=tomorrow,
+    )
+
+    assert Reports.obligated_funds_by_JEDI_clin(portfolio) == [
+        {
+            "name": "JEDI_CLIN_1",
+            "invoiced": 0,
+            "estimated": 0,
+            "obligated": Decimal("400"),
+            "remaining": Decimal("400"),
+        },
+        {
+            "name": "JEDI_CLIN_2",
+            "invoiced": 0,
+            "estimated": 0,
+            "obligated": Decimal("20"),
+            "remaining": Decimal("20"),
+        },
+    ]
+
+
+def test_obligated_funds_by_JEDI_clin_includes_spending():
+    portfolio = PortfolioFactory.create(name="A-Wing")
+    funds = {
+        clin["name"]: clin for clin in Reports.obligated_funds_by_JEDI_clin(portfolio)
+    }
+
+    assert set(funds) == {"JEDI_CLIN_1", "JEDI_CLIN_2"}
+    for clin in funds.values():
+        assert clin["obligated"] == 0
+        assert clin["invoiced"] > 0
+        assert clin["remaining"] == -(clin["invoiced"] + clin["estimated"])
+
+
+@pytest.fixture
+def report_cache(app, monkeypatch):
+    monkeypatch.setitem(app.config, "REPORT_CACHE_BUCKET", 3600)
+    return ReportCache.from_app()
+
+
+def test_report_cache_reuses_results(report_cache):
+    portfolio_id = uuid4()
+    compute = Mock(return_value=[{"name": "a", "amount": Decimal("1.50")}])
+
+    assert report_cache.get(portfolio_id, "report", compute) == compute.return_value
+    assert report_cache.get(portfolio_id, "report", compute) == [
+        {"name": "a", "amount": Decimal("1.50")}
+    ]
+    assert compute.call_count == 1
+
+    report_cache.invalidate(uuid4())
+    report_cache.get(portfolio_id, "report", compute)
+    assert compute.call_count == 1
+
+    report_cache.invalidate(portfolio_id)
+    report_cache.get(portfolio_id, "report", compute)
+    assert compute.call_count == 2
+
+    # invalidating every portfolio, as ingesting cost data does
+    report_cache.invalidate()
+    report_cache.get(portfolio_id, "report", compute)
+    assert compute.call_count == 3
+
+
+def test_report_cache_time_buckets(app):
+    now = [0]
+    cache = ReportCache(app.redis, 60, clock=lambda: now[0])
+    compute = Mock(return_value=1)
+    portfolio_id = uuid4()
+
+    cache.get(portfolio_id, "report", compute)
+    now[0] = 59
+    cache.get(portfolio_id, "report", compute)
+    assert compute.call_count == 1
+
+    now[0] = 60
+    cache.get(portfolio_id, "report", compute)
+    assert compute.call_count == 2
+
+
+def test_report_cache_disabled(app):
+    compute = Mock(return_value=1)
+    cache = ReportCache(app.redis, 0)
+    cache.get("portfolio", "report", compute)
+    cache.get("portfolio", "report", compute)
+    assert compute.call_count == 2
+
+
+def test_report_cache_falls_back_without_redis(app):
+    redis = Mock()
+    redis.mget.side_effect = RedisError
+    cache = ReportCache(redis, 60)
+    assert cache.get("portfolio", "report", lambda: 1) == 1
+
+
+def test_reports_are_invalidated_by_clin_writes(report_cache):
+    yesterday = date.today() - timedelta(days=1)
+    task_order = TaskOrderFactory.create(signed_at=yesterday)
+    portfolio = task_order.portfolio
+    clin = CLINFactory.create(
+        task_order=task_order,
+        jedi_clin_type=JEDICLINType.JEDI_CLIN_1,
+        obligated_amount=100,
+        start_date=yesterday,
+        end_date=date.today(),
+    )
+    [funds] = Reports.obligated_funds_by_JEDI_clin(portfolio)
+    assert funds["obligated"] == Decimal("100")
+
+    clin.obligated_amount = 250
+    db.session.commit()
+    [funds] = Reports.obligated_funds_by_JEDI_clin(portfolio)
+    assert funds["obligated"] == Decimal("250")
+
+
+def test_monthly_spending_is_invalidated_by_application_writes(report_cache):
+    portfolio = PortfolioFactory.create(applications=[{"name": "first"}])
+    assert [app["name"] for app in Reports.monthly_spending(portfolio)] == ["first"]
+
+    ApplicationFactory.create(portfolio=portfolio, name="second")
+    db.session.expire(portfolio)
+    assert [app["name"] for app in Reports.monthly_spending(portfolio)] == [
+        "first",
+        "second",
+    ]
@@ -0,0 +1,124 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+
+from atst.domain.spend_analytics import SpendAnalytics
+from atst.models import DailySpend, JEDICLINType
+
+from tests.factories import (
+    ApplicationFactory,
+    CLINFactory,
+    EnvironmentFactory,
+    PortfolioFactory,
+    TaskOrderFactory,
+)
+
+
+TODAY = date.today()
+
+
+def _funded_portfolio(name, obligated, end_date):
+    portfolio = PortfolioFactory.create(name=name)
+    task_order = TaskOrderFactory.create(
+        portfolio=portfolio, signed_at=TODAY - timedelta(days=1)
+    )
+    CLINFactory.create(
+        task_order=task_order,
+        start_date=TODAY - timedelta(days=60),
+        end_date=end_date,
+        obligated_amount=obligated,
+        total_amount=obligated * 2,
+    )
+    return portfolio
+
+
+def _add_spend(session, portfolio, *spend):
+    environment = EnvironmentFactory.create(
+        application=ApplicationFactory.create(portfolio=portfolio)
+    )
+    for days_ago, amount in spend:
+        session.add(
+            DailySpend(
+                environment_id=environment.id,
+                jedi_clin_type=JEDICLINType.JEDI_CLIN_1,
+                date=TODAY - timedelta(days=days_ago),
+                amount=amount,
+            )
+        )
+    session.flush()
+
+
+def _rows(portfolios, **kwargs):
+    ids = {portfolio.id for portfolio in portfolios}
+    return [
+        row
+        for row in SpendAnalytics.portfolio_spend(as_of=TODAY, **kwargs)
+        if row.portfolio_id in ids
+    ]
+
+
+def test_portfolio_spend_figures(session):
+    portfolio = _funded_portfolio("A-Wing", 9000, TODAY + timedelta(days=100))
+    _add_spend(session, portfolio, (1, 1000), (29, 500), (45, 1500))
+
+    (row,) = _rows([portfolio])
+
+    assert row.name == "A-Wing"
+    assert row.obligated_funds == 9000
+    assert row.total_funds == 18000
+    assert row.total_spend == 3000
+    assert row.burn_rate == Decimal("50.00")
+    assert row.remaining_funds == 6000
+    assert row.funding_end_date == TODAY + timedelta(days=100)
+    assert row.days_to_funding_expiration == 100
+    assert row.days_of_funding_remaining == 120
+
+
+def test_portfolio_spend_without_funding_or_spend(session):
+    portfolio = PortfolioFactory.create()
+    expired = _funded_portfolio("B-Wing", 1000, TODAY - timedelta(days=1))
+
+    rows = {row.portfolio_id: row for row in _rows([portfolio, expired])}
+
+    for row in rows.values():
+        assert row.obligated_funds == 0
+        assert row.total_spend == 0
+        assert row.burn_rate == 0
+        assert row.days_of_funding_remaining is None
+
+    assert rows[portfolio.id].funding_end_date is None
+    assert rows[portfolio.id].days_to_funding_expiration is None
+    # the funding end date is the portfolio's, even once its funding has ended
+    assert rows[expired.id].funding_end_date == TODAY - timedelta(days=1)
+    assert rows[expired.id].days_to_funding_expiration == -1
+
+
+def test_portfolio_spend_sorts_by_burn_rate(session):
+    slow = _funded_portfolio("Slow", 10000, TODAY + timedelta(days=30))
+    fast = _funded_portfolio("Fast", 10000, TODAY + timedelta(days=30))
+    idle = _funded_portfolio("Idle", 10000, TODAY + timedelta(days=30))
+    _add_spend(session, slow, (1, 30))
+    _add_spend(session, fast, (1, 300))
+
+    assert [row.name for row in _rows([slow, fast, idle])] == ["Fast", "Slow", "Idle"]
+    assert [row.name for row in _rows([slow, fast, idle], descending=False)] == [
+        "Idle",
+        "Slow",
+        "Fast",
+    ]
+    # portfolios that are not spending have no projected depletion and sort last
+    assert [
+        row.name for row in _rows([slow, fast, idle], sort="days_of_funding_remaining")
+    ] == ["Slow", "Fast", "Idle"]
+
+
+def test_portfolio_spend_excludes_deleted_portfolios(session):
+    portfolio = PortfolioFactory.create(deleted=True)
+
+    assert _rows([portfolio]) == []
+
+
+def test_portfolio_spend_rejects_unknown_sort():
+    with pytest.raises(ValueError):
+        SpendAnalytics.portfolio_spend(sort="portfolio_id")
@@ -1,7 +1,12 @@
 import pytest
+import re
+from contextlib import contextmanager
 from datetime import date, timedelta
 from decimal import Decimal
 
+from sqlalchemy import event
+
+from atst.database import db
 from atst.domain.exceptions import AlreadyExistsError
 from atst.domain.task_orders import TaskOrders
 from atst.models import Attachment
@@ -157,6 +162,49 @@ def test_task_order_sort_by_status():
     assert list(sorted_by_status.keys()) == [status.value for status in SORT_ORDERING]
 
 
+def test_task_order_by_status():
+    today = date.today()
+    yesterday = today - timedelta(days=1)
+    portfolio = PortfolioFactory.create()
+
+    draft = TaskOrderFactory.create(portfolio=portfolio, pdf=None)
+    active = TaskOrderFactory.create(
+        portfolio=portfolio,
+        signed_at=yesterday,
+        clins=[CLINFactory.create(start_date=yesterday, end_date=today)],
+    )
+    expired = TaskOrderFactory.create(
+        portfolio=portfolio,
+        signed_at=yesterday,
+        clins=[CLINFactory.create(start_date=yesterday, end_date=yesterday)],
+    )
+    TaskOrderFactory.create(pdf=None)
+
+    by_status = TaskOrders.by_status(portfolio.id)
+    assert list(by_status.keys()) == [status.value for status in SORT_ORDERING]
+    assert by_status["Draft"] == [draft]
+    assert by_status["Active"] == [active]
+    assert by_status["Expired"] == [expired]
+    assert by_status["Upcoming"] == by_status["Unsigned"] == []
+
+
+def test_task_order_by_status_lists_task_orders_without_status_as_draft():
+    portfolio = PortfolioFactory.create()
+    draft = TaskOrderFactory.create(portfolio=portfolio, pdf=None)
+    without_clins = TaskOrderFactory.create(
+        portfolio=portfolio, signed_at=date.today(), clins=[]
+    )
+    assert (
+        db.session.query(TaskOrder.status)
+        .filter(TaskOrder.id == without_clins.id)
+        .scalar()
+        is None
+    )
+
+    by_status = TaskOrders.by_status(portfolio.id)
+    assert set(by_status["Draft"]) == {draft, without_clins}
+
+
 def test_create_enforces_unique_number():
     portfolio = PortfolioFactory.create()
     number = "1234567890123"
@@ -178,3 +226,91 @@ def test_allows_alphanumeric_number():
 
     for number in valid_to_numbers:
         assert TaskOrders.create(portfolio.id, number, [], None)
+
+
+@contextmanager
+def clin_statements():
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        match = re.match(r"(INSERT INTO|UPDATE|DELETE FROM) clins\b", statement)
+        if match:
+            statements.append(match.group(1).split()[0])
+
+    engine = db.session.get_bind()
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+def _clin(number, **kwargs):
+    return {
+        "jedi_clin_type": "JEDI_CLIN_1",
+        "number": number,
+        "start_date": date(2020, 1, 1),
+        "end_date": date(2021, 1, 1),
+        "obligated_amount": Decimal("5000"),
+        "total_amount": Decimal("10000"),
+        **kwargs,
+    }
+
+
+def test_update_diffs_clins():
+    task_order = TaskOrderFactory.create(
+        create_clins=[_clin("0001"), _clin("0002"), _clin("0003"), _clin("0004")]
+    )
+    ids = {clin.number: clin.id for clin in task_order.clins}
+
+    with clin_statements() as statements:
+        task_order = TaskOrders.update(
+            task_order_id=task_order.id,
+            number=task_order.number,
+            clins=[
+                _clin("0001"),
+                _clin("0002", obligated_amount=Decimal("6000")),
+                _clin("0003", jedi_clin_type="JEDI_CLIN_2"),
+                _clin("1001"),
+                _clin("1002"),
+            ],
+            pdf=None,
+        )
+
+    assert sorted(statements) == ["DELETE", "INSERT", "UPDATE"]
+    clins = {clin.number: clin for clin in task_order.clins}
+    assert sorted(clins) == ["0001", "0002", "0003", "1001", "1002"]
+    for number in ["0001", "0002", "0003"]:
+        assert clins[number].id == ids[number]
+    assert clins["0002"].obligated_amount == Decimal("6000")
+    assert clins["0003"].jedi_clin_type.name == "JEDI_CLIN_2"
+
+
+def test_update_with_unchanged_clins_does_not_write_them():
+    task_order = TaskOrderFactory.create(create_clins=[_clin("0001"), _clin("0002")])
+
+    with clin_statements() as statements:
+        TaskOrders.update(
+            task_order_id=task_order.id,
+            number=task_order.number,
+            clins=[_clin("0001"), _clin("0002")],
+            pdf=None,
+        )
+
+    assert statements == []
+
+
+def test_update_clins_maintains_funding_end_date(session):
+    task_order = TaskOrderFactory.create(
+        signed_at=date.today(), create_clins=[_clin("0001")]
+    )
+
+    TaskOrders.update(
+        task_order_id=task_order.id,
+        number=task_order.number,
+        clins=[_clin("0001"), _clin("1001", end_date=date(2022, 6, 1))],
+        pdf=None,
+    )
+
+    session.refresh(task_order.portfolio)
+    assert task_order.portfolio.funding_end_date == date(2022, 6, 1)
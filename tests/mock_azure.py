@@ -72,6 +72,13 @@ def mock_secrets():
     return Mock(spec=secrets)
 
 
+def mock_exceptions():
+    # real exception classes, so the provider's except clauses can match them
+    from azure.core import exceptions
+
+    return exceptions
+
+
 def mock_identity():
     import azure.identity as identity
 
@@ -95,6 +102,7 @@ class MockAzureSDK(object):
         # may change to a JEDI cloud
         self.cloud = AZURE_PUBLIC_CLOUD
         self.identity = mock_identity()
+        self.exceptions = mock_exceptions()
 
 
 @pytest.fixture(scope="function")
@@ -20,3 +20,24 @@ def test_is_obligated():
 
 def test_is_completed():
     assert CLINFactory.create().is_completed
+
+
+def test_is_active_expression_matches_property(session):
+    today = datetime.date.today()
+    yesterday = today - datetime.timedelta(days=1)
+    signed = TaskOrderFactory.create(signed_at=yesterday)
+    unsigned = TaskOrderFactory.create()
+    clins = [
+        CLINFactory.create(task_order=signed, start_date=yesterday, end_date=today),
+        CLINFactory.create(task_order=signed, start_date=today, end_date=today),
+        CLINFactory.create(task_order=signed, start_date=yesterday, end_date=yesterday),
+        CLINFactory.create(task_order=unsigned, start_date=yesterday, end_date=today),
+    ]
+
+    active = (
+        session.query(CLIN)
+        .filter(CLIN.id.in_([clin.id for clin in clins]), CLIN.is_active)
+        .all()
+    )
+    assert set(active) == {clin for clin in clins if clin.is_active}
+    assert len(active) == 2
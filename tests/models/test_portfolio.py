@@ -85,3 +85,38 @@ def test_active_task_orders(session):
         portfolio=portfolio, signed_at=random_past_date(), clins=[CLINFactory.create()]
     )
     assert len(portfolio.active_task_orders) == 1
+
+
+def test_funding_end_date_is_maintained(session):
+    portfolio = PortfolioFactory.create()
+    today = datetime.date.today()
+
+    def funding_end_date():
+        session.refresh(portfolio)
+        return portfolio.funding_end_date
+
+    task_order = TaskOrderFactory.create(
+        portfolio=portfolio, create_clins=[{"end_date": today}]
+    )
+    # unsigned task orders do not fund the portfolio
+    assert funding_end_date() is None
+
+    task_order.signed_at = datetime.datetime.now()
+    session.commit()
+    assert funding_end_date() == today
+
+    later = today + datetime.timedelta(days=90)
+    clin = CLINFactory.create(task_order=task_order, end_date=later)
+    assert funding_end_date() == later
+
+    clin.end_date = today + datetime.timedelta(days=60)
+    session.commit()
+    assert funding_end_date() == today + datetime.timedelta(days=60)
+
+    session.delete(clin)
+    session.commit()
+    assert funding_end_date() == today
+
+    session.delete(task_order)
+    session.commit()
+    assert funding_end_date() is None
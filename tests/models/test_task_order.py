@@ -1,6 +1,6 @@
 from werkzeug.datastructures import FileStorage
 import pytest
-from datetime import date
+from datetime import date, timedelta
 from unittest.mock import patch, PropertyMock
 import pendulum
 
@@ -152,6 +152,71 @@ class TestTaskOrderStatus:
         assert to.status == Status.UNSIGNED
 
 
+def _task_orders_in_every_status():
+    today = date.today()
+    yesterday = today - timedelta(days=1)
+    future = today + timedelta(days=100)
+
+    return [
+        TaskOrderFactory.create(pdf=None),
+        TaskOrderFactory.create(clins=[CLINFactory.create()]),
+        TaskOrderFactory.create(
+            signed_at=yesterday,
+            clins=[
+                CLINFactory.create(start_date=yesterday, end_date=today),
+                CLINFactory.create(start_date=future, end_date=future),
+            ],
+        ),
+        TaskOrderFactory.create(
+            signed_at=yesterday,
+            clins=[CLINFactory.create(start_date=future, end_date=future)],
+        ),
+        TaskOrderFactory.create(
+            signed_at=yesterday,
+            clins=[CLINFactory.create(start_date=yesterday, end_date=yesterday)],
+        ),
+    ]
+
+
+def test_status_expression_matches_property(session):
+    task_orders = _task_orders_in_every_status()
+    ids = [task_order.id for task_order in task_orders]
+
+    statuses = dict(
+        session.query(TaskOrder.id, TaskOrder.status).filter(TaskOrder.id.in_(ids))
+    )
+    assert {task_order.id: task_order.status for task_order in task_orders} == statuses
+    assert set(statuses.values()) == {
+        Status.DRAFT,
+        Status.UNSIGNED,
+        Status.ACTIVE,
+        Status.UPCOMING,
+        Status.EXPIRED,
+    }
+
+    active = (
+        session.query(TaskOrder)
+        .filter(TaskOrder.id.in_(ids), TaskOrder.status == Status.ACTIVE)
+        .all()
+    )
+    assert active == [task_order for task_order in task_orders if task_order.is_active]
+
+
+def test_date_expressions_match_properties(session):
+    task_orders = _task_orders_in_every_status()
+    dates = {
+        id_: (start_date, end_date)
+        for id_, start_date, end_date in session.query(
+            TaskOrder.id, TaskOrder.start_date, TaskOrder.end_date
+        ).filter(TaskOrder.id.in_([task_order.id for task_order in task_orders]))
+    }
+
+    assert dates == {
+        task_order.id: (task_order.start_date, task_order.end_date)
+        for task_order in task_orders
+    }
+
+
 class TestBudget:
     def test_total_contract_amount(self):
         to = TaskOrderFactory.create()
@@ -1,9 +1,12 @@
+import csv
+
 from flask import url_for
 
+from atst.domain.spend_analytics import SpendAnalytics
 from atst.domain.users import Users
 from atst.utils.localization import translate
 
-from tests.factories import UserFactory
+from tests.factories import PortfolioFactory, UserFactory
 
 
 def test_ccpo_users(user_session, client):
@@ -13,6 +16,16 @@ def test_ccpo_users(user_session, client):
     assert ccpo.email in response.data.decode()
 
 
+def test_job_failures_clamps_days(user_session, client):
+    user_session(UserFactory.create_ccpo())
+
+    response = client.get(url_for("ccpo.job_failures", days=1000))
+    assert translate("ccpo.job_failures.window", {"days": 90}) in response.data.decode()
+
+    response = client.get(url_for("ccpo.job_failures", days="week"))
+    assert translate("ccpo.job_failures.window", {"days": 7}) in response.data.decode()
+
+
 def test_submit_new_user(user_session, client):
     ccpo = UserFactory.create_ccpo()
     new_user = UserFactory.create()
@@ -62,3 +75,27 @@ def test_remove_access(user_session, client):
 
     response = client.post(url_for("ccpo.remove_access", user_id=user.id))
     assert user not in Users.get_ccpo_users()
+
+
+def test_spend_analytics(user_session, client):
+    ccpo = UserFactory.create_ccpo()
+    portfolio = PortfolioFactory.create(name="Spend Analytics Portfolio")
+    user_session(ccpo)
+    response = client.get(
+        url_for("ccpo.spend_analytics", sort="name", direction="asc", perPage=1000)
+    )
+    assert response.status_code == 200
+    assert portfolio.name in response.data.decode()
+
+
+def test_spend_analytics_csv(user_session, client):
+    ccpo = UserFactory.create_ccpo()
+    portfolio = PortfolioFactory.create(name="Spend Analytics Portfolio")
+    user_session(ccpo)
+    response = client.get(url_for("ccpo.spend_analytics_csv"))
+    assert response.status_code == 200
+    assert response.mimetype == "text/csv"
+    assert response.is_streamed
+    rows = list(csv.reader(response.data.decode().splitlines()))
+    assert rows[0] == SpendAnalytics.COLUMNS
+    assert [str(portfolio.id), portfolio.name] in [row[:2] for row in rows[1:]]
@@ -86,7 +86,9 @@ def test_all_protected_routes_have_access_control(
     user_session(user)
 
     method = "get" if "GET" in rule.methods else "post"
-    getattr(client, method)(route)
+    # read the whole response so that streamed responses release their
+    # request context
+    getattr(client, method)(route, buffered=True)
 
     assert (
         atst.domain.authz.decorator.check_access.call_count == 1
@@ -146,6 +148,36 @@ def test_atst_activity_history_access(get_url_assert_status):
     get_url_assert_status(rando, url, 404)
 
 
+# ccpo.job_failures
+def test_ccpo_job_failures_access(get_url_assert_status):
+    ccpo = user_with(PermissionSets.VIEW_AUDIT_LOG)
+    rando = user_with()
+
+    url = url_for("ccpo.job_failures")
+    get_url_assert_status(ccpo, url, 200)
+    get_url_assert_status(rando, url, 404)
+
+
+# ccpo.spend_analytics
+def test_ccpo_spend_analytics_access(get_url_assert_status):
+    ccpo = user_with(PermissionSets.VIEW_AUDIT_LOG)
+    rando = user_with()
+
+    url = url_for("ccpo.spend_analytics")
+    get_url_assert_status(ccpo, url, 200)
+    get_url_assert_status(rando, url, 404)
+
+
+# ccpo.spend_analytics_csv
+def test_ccpo_spend_analytics_csv_access(get_url_assert_status):
+    ccpo = user_with(PermissionSets.VIEW_AUDIT_LOG)
+    rando = user_with()
+
+    url = url_for("ccpo.spend_analytics_csv")
+    get_url_assert_status(ccpo, url, 200)
+    get_url_assert_status(rando, url, 404)
+
+
 # ccpo.users
 def test_ccpo_users_access(get_url_assert_status):
     ccpo = user_with(PermissionSets.MANAGE_CCPO_USERS)
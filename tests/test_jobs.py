@@ -1,10 +1,18 @@
 import pendulum
 import pytest
 from uuid import uuid4
-from unittest.mock import Mock
+from unittest.mock import Mock, call
 from threading import Thread
 
+from atst.database import db
 from atst.domain.csp.cloud import MockCloudProvider
+from atst.domain.csp.cloud.exceptions import GeneralCSPException
+from atst.domain.csp.cloud.models import (
+    AZURE_MGMNT_PATH,
+    ApplicationCSPResult,
+    ApplicationOperationCSPResult,
+)
+from atst.domain.environment_roles import EnvironmentRoles
 from atst.domain.portfolios import Portfolios
 
 from atst.jobs import (
@@ -12,14 +20,26 @@ from atst.jobs import (
     dispatch_create_environment,
     dispatch_create_application,
     dispatch_create_atat_admin_user,
+    dispatch_create_portfolio_policies,
     dispatch_provision_portfolio,
     dispatch_provision_user,
+    dispatch_refresh_funding_summaries,
+    dispatch_send_funding_expiration_notifications,
+    provision_portfolio,
+    refresh_funding_summary,
+    create_application,
     create_environment,
+    environment_pipeline,
     do_provision_user,
+    do_provision_users,
     do_provision_portfolio,
     do_create_environment,
     do_create_application,
+    do_create_applications,
     do_create_atat_admin_user,
+    do_create_portfolio_policies,
+    do_send_funding_expiration_notifications,
+    do_work,
 )
 from atst.models.utils import claim_for_update
 from atst.domain.exceptions import ClaimFailedException
@@ -30,8 +50,20 @@ from tests.factories import (
     PortfolioStateMachineFactory,
     ApplicationFactory,
     ApplicationRoleFactory,
+    UserFactory,
+)
+from atst.models import (
+    CSPRole,
+    EnvironmentRole,
+    FSMStates,
+    FundingExpirationNotice,
+    ApplicationRoleStatus,
+    JobAttempt,
+    JobAttemptStatus,
+    JobFailure,
+    PortfolioFundingSummary,
+    PortfolioStateMachine,
 )
-from atst.models import CSPRole, EnvironmentRole, ApplicationRoleStatus, JobFailure
 
 
 @pytest.fixture(autouse=True, scope="function")
@@ -88,6 +120,99 @@ def test_environment_role_job_failure(session, celery_app, celery_worker):
     assert job_failure.task == task
 
 
+def test_job_failure_telemetry(session, celery_app, celery_worker):
+    @celery_app.task(bind=True, base=RecordFailure)
+    def _fail_hard(self, environment_id=None):
+        raise ValueError("something bad happened")
+
+    environment = EnvironmentFactory.create()
+    celery_worker.reload()
+
+    task = _fail_hard.apply(kwargs={"environment_id": environment.id})
+    with pytest.raises(ValueError):
+        task.get()
+
+    job_failure = _find_failure(session, "environment", str(environment.id))
+    assert job_failure.task_name == _fail_hard.name
+    assert job_failure.exception_type == "ValueError"
+    assert job_failure.attempt == 0
+    assert job_failure.duration >= 0
+
+    attempt = session.query(JobAttempt).filter_by(task_id=task.id).one()
+    assert attempt.status == JobAttemptStatus.FAILED
+    assert attempt.entity_id == str(environment.id)
+
+
+def test_job_success_telemetry(session, celery_app, celery_worker):
+    @celery_app.task(bind=True, base=RecordFailure)
+    def _succeed(self, environment_id=None):
+        return True
+
+    celery_worker.reload()
+
+    task = _succeed.apply(kwargs={"environment_id": "1234"})
+
+    attempt = session.query(JobAttempt).filter_by(task_id=task.id).one()
+    assert attempt.status == JobAttemptStatus.SUCCEEDED
+    assert attempt.task_name == _succeed.name
+    assert attempt.exception_type is None
+    assert session.query(JobFailure).filter_by(task_id=task.id).count() == 0
+
+
+def test_every_job_records_attempts(session, monkeypatch):
+    monkeypatch.setattr(
+        "atst.jobs.Portfolios.get_portfolios_pending_policies", Mock(return_value=[])
+    )
+
+    task = dispatch_create_portfolio_policies.apply()
+
+    attempt = session.query(JobAttempt).filter_by(task_id=task.id).one()
+    assert attempt.status == JobAttemptStatus.SUCCEEDED
+    assert attempt.task_name == "atst.jobs.dispatch_create_portfolio_policies"
+    assert attempt.entity is None
+    assert session.query(JobFailure).filter_by(task_id=task.id).count() == 0
+
+
+def test_job_failure_records_csp_operation(session, celery_app, celery_worker, csp):
+    csp.create_environment = Mock(side_effect=ValueError("something bad happened"))
+
+    @celery_app.task(bind=True, base=RecordFailure)
+    def _fail_hard(self, environment_id=None):
+        do_work(do_create_environment, self, csp, environment_id=environment_id)
+
+    environment = EnvironmentFactory.create()
+    celery_worker.reload()
+
+    task = _fail_hard.apply(kwargs={"environment_id": environment.id})
+    with pytest.raises(ValueError):
+        task.get()
+
+    job_failure = _find_failure(session, "environment", str(environment.id))
+    assert job_failure.csp_operation == "create_environment"
+    attempt = session.query(JobAttempt).filter_by(task_id=task.id).one()
+    assert attempt.csp_operation == "create_environment"
+
+
+def test_bulk_job_failure_telemetry(session, celery_app, celery_worker):
+    @celery_app.task(bind=True, base=RecordFailure)
+    def _fail_hard(self, application_ids=None):
+        raise ValueError("something bad happened")
+
+    celery_worker.reload()
+
+    task = _fail_hard.apply(kwargs={"application_ids": ["1234", "5678"]})
+    with pytest.raises(ValueError):
+        task.get()
+
+    for application_id in ["1234", "5678"]:
+        job_failure = _find_failure(session, "application", application_id)
+        assert job_failure.task_name == _fail_hard.name
+
+    attempts = session.query(JobAttempt).filter_by(task_id=task.id).all()
+    assert sorted(attempt.entity_id for attempt in attempts) == ["1234", "5678"]
+    assert all(attempt.entity == "application" for attempt in attempts)
+
+
 now = pendulum.now()
 yesterday = now.subtract(days=1)
 tomorrow = now.add(days=1)
@@ -126,6 +251,124 @@ def test_create_application_job_is_idempotent(csp):
     csp.create_application.assert_not_called()
 
 
+def test_create_application_job_does_not_wait_for_csp(session, csp):
+    portfolio = PortfolioFactory.create(
+        csp_data={"tenant_id": str(uuid4()), "root_management_group_id": str(uuid4())}
+    )
+    application = ApplicationFactory.create(portfolio=portfolio, cloud_id=None)
+    operation_url = "https://management.azure.com/operationResults/group"
+    csp.create_application = Mock(
+        return_value=ApplicationOperationCSPResult(
+            operation_url=operation_url, retry_after=30
+        )
+    )
+
+    assert do_create_application(csp, application.id) == 30
+    session.refresh(application)
+    assert application.cloud_id is None
+    assert application.csp_data["operation_url"] == operation_url
+
+    # the next run checks on the operation instead of starting another one
+    assert do_create_application(csp, application.id) is None
+    session.refresh(application)
+    assert application.cloud_id.endswith("/group")
+    assert "operation_url" not in application.csp_data
+    csp.create_application.assert_called_once()
+    csp.create_application_verification.assert_called_once()
+
+
+def test_create_application_schedules_next_check(session, monkeypatch):
+    application = ApplicationFactory.create()
+    monkeypatch.setattr("atst.jobs.do_create_application", Mock(return_value=30))
+    mock = Mock()
+    monkeypatch.setattr("atst.jobs.create_application", mock)
+
+    create_application.run(application_id=application.id)
+
+    mock.apply_async.assert_called_once_with(
+        kwargs={"application_id": application.id}, countdown=30
+    )
+
+
+def test_create_applications_job(session, csp, monkeypatch):
+    portfolio = PortfolioFactory.create(
+        csp_data={"tenant_id": str(uuid4()), "root_management_group_id": str(uuid4())}
+    )
+    created = ApplicationFactory.create(portfolio=portfolio, cloud_id=None)
+    accepted = ApplicationFactory.create(portfolio=portfolio, cloud_id=None)
+    failed = ApplicationFactory.create(portfolio=portfolio, cloud_id=None)
+    polling = ApplicationFactory.create(
+        portfolio=portfolio, cloud_id=None, csp_data={"operation_url": "url"}
+    )
+    applications = [created, accepted, failed, polling]
+
+    def create_applications(payloads):
+        results = {
+            created.name: ApplicationCSPResult(id=f"{AZURE_MGMNT_PATH}created"),
+            accepted.name: ApplicationOperationCSPResult(
+                operation_url="url", retry_after=30
+            ),
+            failed.name: GeneralCSPException("nope"),
+        }
+        return [results[payload.display_name] for payload in payloads]
+
+    csp.create_applications = Mock(side_effect=create_applications)
+    task = Mock()
+    monkeypatch.setattr("atst.jobs.create_application", task)
+
+    with pytest.raises(GeneralCSPException):
+        do_create_applications(csp, [app.id for app in applications])
+
+    for application in applications:
+        session.refresh(application)
+    assert csp.create_applications.call_count == 1
+    assert len(csp.create_applications.call_args[0][0]) == 3
+    assert created.cloud_id
+    assert accepted.csp_data["operation_url"] == "url"
+    assert failed.cloud_id is None and not failed.csp_data
+    assert sorted(
+        task.apply_async.call_args_list, key=lambda call: call[1]["countdown"]
+    ) == [
+        call(kwargs={"application_id": polling.id}, countdown=0),
+        call(kwargs={"application_id": accepted.id}, countdown=30),
+    ]
+
+
+def test_create_portfolio_policies_job(session, csp):
+    root_management_group_id = str(uuid4())
+    portfolio = PortfolioFactory.create(
+        csp_data={
+            "tenant_id": str(uuid4()),
+            "root_management_group_id": root_management_group_id,
+        }
+    )
+
+    do_create_portfolio_policies(csp, portfolio.id)
+    session.refresh(portfolio)
+
+    payload = csp.create_portfolio_policies.call_args[0][0]
+    assert payload.management_group_id == root_management_group_id
+    assert portfolio.csp_data["policies_assigned"]
+
+    do_create_portfolio_policies(csp, portfolio.id)
+    csp.create_portfolio_policies.assert_called_once()
+
+
+def test_create_portfolio_policies_job_retries_failures(session, csp):
+    portfolio = PortfolioFactory.create(
+        csp_data={"tenant_id": str(uuid4()), "root_management_group_id": str(uuid4())}
+    )
+    csp.create_portfolio_policies = Mock(
+        return_value=[{"id": "assignment"}, GeneralCSPException("nope")]
+    )
+
+    with pytest.raises(GeneralCSPException):
+        do_create_portfolio_policies(csp, portfolio.id)
+
+    session.refresh(portfolio)
+    assert not portfolio.csp_data.get("policies_assigned")
+
+
 def test_create_atat_admin_user(csp, session):
     environment = EnvironmentFactory.create(cloud_id="something")
     do_create_atat_admin_user(csp, environment.id)
@@ -134,6 +377,13 @@ def test_create_atat_admin_user(csp, session):
     assert environment.root_user_info
 
 
+def test_create_atat_admin_user_is_idempotent(csp):
+    environment = EnvironmentFactory.create(cloud_id="something", root_user_info={})
+    do_create_atat_admin_user(csp, environment.id)
+
+    csp.create_atat_admin_user.assert_not_called()
+
+
 def test_dispatch_create_environment(session, monkeypatch):
     # Given that I have a portfolio with an active CLIN and two environments,
     # one of which is deleted
@@ -156,14 +406,53 @@ def test_dispatch_create_environment(session, monkeypatch):
     session.commit()
 
     mock = Mock()
-    monkeypatch.setattr("atst.jobs.create_environment", mock)
+    monkeypatch.setattr("atst.jobs.environment_pipeline", mock)
 
     # When dispatch_create_environment is called
     dispatch_create_environment.run()
 
-    # It should cause the create_environment task to be called once with the
+    # It should cause the environment pipeline to be started once with the
     # non-deleted environment
-    mock.delay.assert_called_once_with(environment_id=e1.id)
+    mock.assert_called_once_with(environment_id=e1.id)
+    mock.return_value.delay.assert_called_once_with()
+
+
+def test_dispatch_create_environment_for_one_environment(session, monkeypatch):
+    portfolio = PortfolioFactory.create(
+        applications=[{"environments": [{}, {}]}],
+        task_orders=[
+            {
+                "create_clins": [
+                    {
+                        "start_date": pendulum.now().subtract(days=1),
+                        "end_date": pendulum.now().add(days=1),
+                    }
+                ]
+            }
+        ],
+    )
+    [e1, _e2] = portfolio.applications[0].environments
+
+    mock = Mock()
+    monkeypatch.setattr("atst.jobs.environment_pipeline", mock)
+
+    dispatch_create_environment.run(environment_id=e1.id)
+
+    mock.assert_called_once_with(environment_id=e1.id)
+
+
+def test_environment_pipeline():
+    environment_id = uuid4()
+    pipeline = environment_pipeline(environment_id=environment_id)
+
+    assert [step.task for step in pipeline.tasks] == [
+        "atst.jobs.create_environment",
+        "atst.jobs.create_atat_admin_user",
+        "atst.jobs.dispatch_provision_user",
+    ]
+    for step in pipeline.tasks:
+        assert step.kwargs == {"environment_id": environment_id}
+        assert step.immutable
 
 
 def test_dispatch_create_application(monkeypatch):
@@ -171,14 +460,47 @@ def test_dispatch_create_application(monkeypatch):
     app = ApplicationFactory.create(portfolio=portfolio)
 
     mock = Mock()
-    monkeypatch.setattr("atst.jobs.create_application", mock)
+    monkeypatch.setattr("atst.jobs.create_applications", mock)
 
     # When dispatch_create_application is called
     dispatch_create_application.run()
 
-    # It should cause the create_application task to be called once
+    # It should cause the create_applications task to be called once
     # with the application id
-    mock.delay.assert_called_once_with(application_id=app.id)
+    mock.delay.assert_called_once_with(application_ids=[app.id])
+
+
+def test_dispatch_create_application_batches_by_portfolio(monkeypatch):
+    portfolio = PortfolioFactory.create(state="COMPLETED")
+    first = ApplicationFactory.create(portfolio=portfolio)
+    second = ApplicationFactory.create(portfolio=portfolio)
+    other = ApplicationFactory.create(
+        portfolio=PortfolioFactory.create(state="COMPLETED")
+    )
+
+    mock = Mock()
+    monkeypatch.setattr("atst.jobs.create_applications", mock)
+
+    dispatch_create_application.run()
+
+    batches = [set(call[1]["application_ids"]) for call in mock.delay.call_args_list]
+    assert sorted(batches, key=len) == [{other.id}, {first.id, second.id}]
+
+
+def test_dispatch_create_portfolio_policies(monkeypatch):
+    csp_data = {"tenant_id": str(uuid4()), "root_management_group_id": str(uuid4())}
+    pending = PortfolioFactory.create(state="COMPLETED", csp_data=csp_data)
+    PortfolioFactory.create(
+        state="COMPLETED", csp_data={**csp_data, "policies_assigned": True}
+    )
+    PortfolioFactory.create(state="TENANT_CREATED", csp_data=csp_data)
+
+    mock = Mock()
+    monkeypatch.setattr("atst.jobs.create_portfolio_policies", mock)
+
+    dispatch_create_portfolio_policies.run()
+
+    mock.delay.assert_called_once_with(portfolio_id=pending.id)
 
 
 def test_dispatch_create_atat_admin_user(session, monkeypatch):
@@ -329,13 +651,43 @@ def test_dispatch_provision_user(csp, session, celery_app, celery_worker, monkey
     )
 
     mock = Mock()
-    monkeypatch.setattr("atst.jobs.provision_user", mock)
+    monkeypatch.setattr("atst.jobs.provision_users", mock)
 
     # When I dispatch the user provisioning task
     dispatch_provision_user.run()
 
-    # I expect it to dispatch only one call, to EnvironmentRole D
-    mock.delay.assert_called_once_with(environment_role_id=er_d.id)
+    # I expect it to dispatch only one call, for the environment of EnvironmentRole D
+    mock.delay.assert_called_once_with(environment_id=er_d.environment_id)
+
+
+def test_dispatch_provision_user_for_one_environment(session, monkeypatch):
+    environment = EnvironmentFactory.create(cloud_id="cloud_id", root_user_info={})
+    other_environment = EnvironmentFactory.create(
+        cloud_id="cloud_id", root_user_info={}
+    )
+    env_role = EnvironmentRoleFactory.create(
+        environment=environment,
+        status=EnvironmentRole.Status.PENDING,
+        application_role=ApplicationRoleFactory(status=ApplicationRoleStatus.ACTIVE),
+    )
+    EnvironmentRoleFactory.create(
+        environment=other_environment,
+        status=EnvironmentRole.Status.PENDING,
+        application_role=ApplicationRoleFactory(status=ApplicationRoleStatus.ACTIVE),
+    )
+
+    EnvironmentRoleFactory.create(
+        environment=environment,
+        status=EnvironmentRole.Status.PENDING,
+        application_role=ApplicationRoleFactory(status=ApplicationRoleStatus.ACTIVE),
+    )
+
+    mock = Mock()
+    monkeypatch.setattr("atst.jobs.provision_users", mock)
+
+    dispatch_provision_user.run(environment_id=environment.id)
+
+    mock.delay.assert_called_once_with(environment_id=env_role.environment_id)
 
 
 def test_do_provision_user(csp, session):
@@ -362,6 +714,102 @@ def test_do_provision_user(csp, session):
     assert environment_role.csp_user_id
 
 
+def test_do_provision_users(csp, session):
+    credentials = MockCloudProvider(())._auth_credentials
+    environment = EnvironmentFactory.create(
+        cloud_id="cloud_id", root_user_info={"credentials": credentials}
+    )
+    environment_roles = [
+        EnvironmentRoleFactory.create(
+            environment=environment,
+            status=EnvironmentRole.Status.PENDING,
+            role="ADMIN",
+            application_role=ApplicationRoleFactory(
+                status=ApplicationRoleStatus.ACTIVE
+            ),
+        )
+        for _ in range(3)
+    ]
+
+    do_provision_users(csp=csp, environment_id=environment.id)
+
+    csp.create_or_update_users.assert_called_once()
+    called_credentials, users = csp.create_or_update_users.call_args[0]
+    assert called_credentials == credentials
+    assert {env_role.id for env_role, _ in users} == {
+        env_role.id for env_role in environment_roles
+    }
+    for environment_role in environment_roles:
+        session.refresh(environment_role)
+        assert environment_role.csp_user_id
+        assert environment_role.status == EnvironmentRole.Status.COMPLETED
+        assert environment_role.claimed_until is None
+
+
+def test_do_provision_users_skips_completed_roles(csp, session, monkeypatch):
+    environment = EnvironmentFactory.create(
+        cloud_id="cloud_id",
+        root_user_info={"credentials": MockCloudProvider(())._auth_credentials},
+    )
+    pending, completed = [
+        EnvironmentRoleFactory.create(
+            environment=environment,
+            status=status,
+            application_role=ApplicationRoleFactory(
+                status=ApplicationRoleStatus.ACTIVE
+            ),
+        )
+        for status in [EnvironmentRole.Status.PENDING, EnvironmentRole.Status.COMPLETED]
+    ]
+    # as if another task completed a role after the pending roles were read
+    monkeypatch.setattr(
+        "atst.jobs.EnvironmentRoles.get_environment_roles_pending_creation",
+        Mock(return_value=[pending.id, completed.id]),
+    )
+
+    do_provision_users(csp=csp, environment_id=environment.id)
+
+    _, users = csp.create_or_update_users.call_args[0]
+    assert [env_role.id for env_role, _ in users] == [pending.id]
+
+
+def test_do_provision_users_partial_failure(csp, session):
+    environment = EnvironmentFactory.create(
+        cloud_id="cloud_id", root_user_info={"credentials": {}}
+    )
+    environment_roles = [
+        EnvironmentRoleFactory.create(
+            environment=environment,
+            status=EnvironmentRole.Status.PENDING,
+            application_role=ApplicationRoleFactory(
+                status=ApplicationRoleStatus.ACTIVE
+            ),
+        )
+        for _ in range(2)
+    ]
+    error = GeneralCSPException("could not create user")
+    csp.create_or_update_users = Mock(
+        side_effect=lambda credentials, users: [
+            "csp_user_id" if env_role.id == environment_roles[0].id else error
+            for env_role, _ in users
+        ]
+    )
+
+    with pytest.raises(GeneralCSPException):
+        do_provision_users(csp=csp, environment_id=environment.id)
+
+    succeeded, failed = environment_roles
+    session.refresh(succeeded)
+    session.refresh(failed)
+    assert succeeded.status == EnvironmentRole.Status.COMPLETED
+    assert succeeded.csp_user_id == "csp_user_id"
+    assert failed.status == EnvironmentRole.Status.PENDING
+    assert failed.claimed_until is None
+    assert EnvironmentRoles.get_environment_roles_pending_creation(environment.id) == [
+        failed.id
+    ]
+
+
 def test_dispatch_provision_portfolio(
     csp, session, portfolio, celery_app, celery_worker, monkeypatch
 ):
@@ -372,6 +820,102 @@ def test_dispatch_provision_portfolio(
     mock.delay.assert_called_once_with(portfolio_id=portfolio.id)
 
 
+def test_dispatch_provision_portfolio_limit(session, app, monkeypatch):
+    for _ in range(3):
+        PortfolioStateMachineFactory.create()
+    monkeypatch.setitem(app.config, "PORTFOLIO_PROVISIONING_CONCURRENCY", 2)
+    mock = Mock()
+    monkeypatch.setattr("atst.jobs.provision_portfolio", mock)
+
+    dispatch_provision_portfolio.run()
+
+    assert mock.delay.call_count == 2
+
+
+def _state_machine_in(session, state):
+    sm = PortfolioStateMachineFactory.create()
+    sm.state = state
+    session.commit()
+    return sm
+
+
+def test_dispatch_provision_portfolio_counts_portfolios_in_progress(
+    session, app, monkeypatch
+):
+    _state_machine_in(session, FSMStates.TENANT_CREATED)
+    _state_machine_in(session, FSMStates.TENANT_FAILED)
+    pending = [PortfolioStateMachineFactory.create() for _ in range(3)]
+    monkeypatch.setitem(app.config, "PORTFOLIO_PROVISIONING_CONCURRENCY", 2)
+    mock = Mock()
+    monkeypatch.setattr("atst.jobs.provision_portfolio", mock)
+
+    dispatch_provision_portfolio.run()
+
+    assert mock.delay.call_count == 1
+    assert mock.delay.call_args[1]["portfolio_id"] in [
+        sm.portfolio_id for sm in pending
+    ]
+
+
+def test_dispatch_provision_portfolio_redispatches_stalled_portfolios(
+    session, app, monkeypatch
+):
+    stalled = _state_machine_in(session, FSMStates.BILLING_PROFILE_CREATION_CREATED)
+    recent = _state_machine_in(session, FSMStates.BILLING_PROFILE_CREATION_CREATED)
+    session.execute(
+        PortfolioStateMachine.__table__.update()
+        .where(PortfolioStateMachine.id == stalled.id)
+        .values(time_updated=pendulum.now("UTC").subtract(hours=2))
+    )
+    session.commit()
+    monkeypatch.setitem(app.config, "PORTFOLIO_PROVISIONING_TIMEOUT", 3600)
+    mock = Mock()
+    monkeypatch.setattr("atst.jobs.provision_portfolio", mock)
+
+    dispatch_provision_portfolio.run()
+
+    mock.delay.assert_called_once_with(portfolio_id=stalled.portfolio_id)
+
+
+def test_provision_portfolio_schedules_next_stage(session, portfolio, monkeypatch):
+    task = provision_portfolio
+    monkeypatch.setattr("atst.jobs.do_provision_portfolio", Mock(return_value=10))
+    mock = Mock()
+    monkeypatch.setattr("atst.jobs.provision_portfolio", mock)
+
+    task.run(portfolio_id=portfolio.id)
+
+    mock.apply_async.assert_called_once_with(
+        kwargs={"portfolio_id": portfolio.id}, countdown=10
+    )
+
+
+def test_provision_portfolio_without_delay(session, portfolio, monkeypatch):
+    task = provision_portfolio
+    monkeypatch.setattr("atst.jobs.do_provision_portfolio", Mock(return_value=None))
+    mock = Mock()
+    monkeypatch.setattr("atst.jobs.provision_portfolio", mock)
+
+    task.run(portfolio_id=portfolio.id)
+
+    mock.apply_async.assert_not_called()
+
+
+def test_provision_portfolio_gets_a_fresh_session(app, session, monkeypatch):
+    task_sessions = []
+
+    def do_provision_portfolio(csp, portfolio_id=None):
+        task_sessions.append(db.session())
+
+    monkeypatch.setattr("atst.jobs.do_provision_portfolio", do_provision_portfolio)
+
+    provision_portfolio.apply(kwargs={"portfolio_id": "1234"})
+    provision_portfolio.apply(kwargs={"portfolio_id": "1234"})
+
+    assert len(task_sessions) == 2
+    assert task_sessions[0] is not task_sessions[1]
+
+
 def test_do_provision_portfolio(csp, session, portfolio):
     do_provision_portfolio(csp=csp, portfolio_id=portfolio.id)
     session.refresh(portfolio)
@@ -386,3 +930,88 @@ def test_provision_portfolio_create_tenant(
     # monkeypatch.setattr("atst.jobs.provision_portfolio", mock)
     # dispatch_provision_portfolio.run()
     # mock.delay.assert_called_once_with(portfolio_id=portfolio.id)
+
+
+def test_dispatch_send_funding_expiration_notifications(session, app, monkeypatch):
+    today = pendulum.today(tz="UTC")
+    expiring = [
+        PortfolioFactory.create(funding_end_date=today.add(days=days).date())
+        for days in (1, 5, 20, 30)
+    ]
+    PortfolioFactory.create(funding_end_date=today.add(days=31).date())
+    PortfolioFactory.create(funding_end_date=today.subtract(days=1).date())
+    PortfolioFactory.create(funding_end_date=today.add(days=7).date(), deleted=True)
+
+    monkeypatch.setitem(app.config, "FUNDING_EXPIRATION_NOTICE_DAYS", "30,7,1")
+    monkeypatch.setitem(app.config, "FUNDING_EXPIRATION_NOTIFICATION_BATCH_SIZE", 3)
+    mock = Mock()
+    monkeypatch.setattr("atst.jobs.send_funding_expiration_notifications", mock)
+
+    dispatch_send_funding_expiration_notifications.run()
+
+    batches = [call[1]["portfolio_ids"] for call in mock.delay.call_args_list]
+    assert [len(batch) for batch in batches] == [3, 1]
+    assert set(batches[0] + batches[1]) == {portfolio.id for portfolio in expiring}
+
+
+def test_send_funding_expiration_notifications(session, app, monkeypatch):
+    owner = UserFactory.create()
+    portfolio = PortfolioFactory.create(
+        owner=owner, funding_end_date=pendulum.today(tz="UTC").add(days=5).date(),
+    )
+    mailer = Mock()
+    monkeypatch.setattr(app, "mailer", mailer)
+    monkeypatch.setitem(app.config, "FUNDING_EXPIRATION_NOTICE_DAYS", "30,7,1")
+
+    do_send_funding_expiration_notifications(portfolio_ids=[portfolio.id])
+
+    (recipients, subject, body), _ = mailer.send.call_args
+    assert recipients == [owner.email]
+    assert "5 days" in subject
+    assert portfolio.name in body
+
+    notice = session.query(FundingExpirationNotice).one()
+    assert (notice.portfolio_id, notice.funding_end_date, notice.days) == (
+        portfolio.id,
+        portfolio.funding_end_date,
+        7,
+    )
+
+
+def test_send_funding_expiration_notifications_only_once(session, app, monkeypatch):
+    owner = UserFactory.create()
+    portfolio = PortfolioFactory.create(
+        owner=owner, funding_end_date=pendulum.today(tz="UTC").add(days=5).date(),
+    )
+    mailer = Mock()
+    monkeypatch.setattr(app, "mailer", mailer)
+    monkeypatch.setitem(app.config, "FUNDING_EXPIRATION_NOTICE_DAYS", "30,7,1")
+
+    # e.g. a redelivered batch, or one queued before a later dispatch ran
+    do_send_funding_expiration_notifications(portfolio_ids=[portfolio.id])
+    do_send_funding_expiration_notifications(portfolio_ids=[portfolio.id])
+
+    assert mailer.send.call_count == 1
+
+
+def test_refresh_funding_summary(session):
+    portfolio = PortfolioFactory.create()
+
+    refresh_funding_summary.run(portfolio_id=portfolio.id)
+
+    summary = session.query(PortfolioFundingSummary).one()
+    assert summary.portfolio_id == portfolio.id
+    assert summary.computed_on == pendulum.today(tz="UTC").date()
+
+
+def test_dispatch_refresh_funding_summaries(session, monkeypatch):
+    stale = PortfolioFactory.create()
+    fresh = PortfolioFactory.create()
+    refresh_funding_summary.run(portfolio_id=fresh.id)
+
+    mock = Mock()
+    monkeypatch.setattr("atst.jobs.refresh_funding_summary", mock)
+
+    dispatch_refresh_funding_summaries.run()
+
+    mock.delay.assert_called_once_with(portfolio_id=stale.id)
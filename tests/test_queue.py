@@ -0,0 +1,46 @@
+from unittest.mock import Mock
+
+from atst.database import db
+from atst.models import Environment
+from atst.queue import enqueue_after_commit
+from tests.factories import ApplicationFactory
+
+
+def test_enqueued_instances_are_sent_by_id(app, monkeypatch):
+    monkeypatch.setitem(app.config, "ENQUEUE_ON_COMMIT", True)
+    send_task = Mock()
+    monkeypatch.setattr("atst.queue.celery.send_task", send_task)
+    application = ApplicationFactory.create()
+
+    environment = Environment(
+        application=application, name="pending", creator=application.portfolio.owner
+    )
+    enqueue_after_commit(
+        "atst.jobs.dispatch_create_environment", environment_id=environment
+    )
+    db.session.add(environment)
+    db.session.commit()
+
+    send_task.assert_called_once_with(
+        "atst.jobs.dispatch_create_environment",
+        kwargs={"environment_id": environment.id},
+    )
+
+
+def test_rolled_back_tasks_are_not_sent(app, monkeypatch):
+    monkeypatch.setitem(app.config, "ENQUEUE_ON_COMMIT", True)
+    send_task = Mock()
+    monkeypatch.setattr("atst.queue.celery.send_task", send_task)
+    application = ApplicationFactory.create()
+
+    environment = Environment(
+        application=application, name="pending", creator=application.portfolio.owner
+    )
+    db.session.add(environment)
+    enqueue_after_commit(
+        "atst.jobs.dispatch_create_environment", environment_id=environment
+    )
+    db.session.rollback()
+    db.session.commit()
+
+    send_task.assert_not_called()